@@ -0,0 +1,576 @@
+# bench/bench_end_to_end.py
+# Banco de pruebas de extremo a extremo del circuito firma -> prueba -> mempool
+# -> verificación -> bloque. Levanta los cuatro servicios en local, cada uno en
+# su propio proceso como en docker compose, contra un Redis local (--redis-host)
+# o uno falso en memoria (fakeredis escuchando en un puerto libre), y mide:
+#
+#   - micro: latencia y peticiones/s de cada endpoint de cada servicio en lazo
+#     cerrado (--micro-requests peticiones con --micro-concurrency conexiones).
+#   - carga: /send_transaction en lazo abierto a cada ritmo de --rates durante
+#     --duration s. La latencia se cuenta desde el instante programado del envío
+#     (sin omisión coordinada) hasta la respuesta y hasta que la transacción
+#     llega en un bloque de new_block_channel.
+#
+# Los resultados se guardan en JSON (--output) con el commit, la máquina y la
+# configuración, para compararlos entre versiones:
+#
+#   python bench_end_to_end.py --rates 20 50 100 --duration 20 --output base.json
+#   git checkout otra-rama
+#   python bench_end_to_end.py --rates 20 50 100 --duration 20 --baseline base.json
+#   python bench_end_to_end.py --compare base.json nuevo.json
+#
+# Necesita las dependencias de los cuatro servicios y, sin --redis-host,
+# fakeredis con lupa (scripts Lua del mempool). El Redis falso comparte proceso
+# con el generador de carga: para cifras absolutas conviene un Redis real.
+import argparse
+import collections
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# Fuera de Docker los módulos compartidos están en common/
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+
+import wire  # noqa: E402
+
+# Nombre -> (directorio, script, desplazamiento sobre --base-port), en orden de arranque
+SERVICES = collections.OrderedDict([
+    ("ecdsa", ("ecdsa", "ecdsa_service.py", 1)),
+    ("szsstark", ("szsstark", "szstark_service.py", 2)),
+    ("popv_validator", ("popv_validator", "validator.py", 3)),
+    ("gateway", ("flask", "app.py", 0)),
+])
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(latencies):
+    # Segundos -> resumen en milisegundos
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+# --- Stack local ---
+
+def start_fake_redis():
+    import fakeredis
+
+    class FakeRedisServer(fakeredis.TcpFakeServer):
+        # Sin TCP_NODELAY cada pipeline de varios comandos espera al ACK
+        # retardado (~40 ms) entre respuestas
+        def get_request(self):
+            connection, address = super().get_request()
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection, address
+
+    server = FakeRedisServer(("127.0.0.1", 0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Stack:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.processes = {}
+        self.fake_redis = None
+        self.redis_host = args.redis_host
+        self.redis_port = args.redis_port
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.args.base_port + SERVICES[name][2]}"
+
+    def redis(self):
+        return redis.Redis(host=self.redis_host, port=self.redis_port)
+
+    def start(self):
+        if self.redis_host is None:
+            self.fake_redis = start_fake_redis()
+            self.redis_host, self.redis_port = self.fake_redis.server_address
+        elif self.args.flush_redis:
+            self.redis().flushdb()
+
+        env = dict(os.environ)
+        env.update({
+            # common/ para todos; ecdsa_core y szstark_core para los backends local y process del validador
+            "PYTHONPATH": os.pathsep.join(filter(None, [
+                os.path.join(ROOT, 'common'), os.path.join(ROOT, 'ecdsa'), os.path.join(ROOT, 'szsstark'),
+                os.environ.get("PYTHONPATH")])),
+            "PYTHONUNBUFFERED": "1",
+            "REDIS_HOST": str(self.redis_host),
+            "REDIS_PORT": str(self.redis_port),
+            "ECDSA_SERVICE_URL": self.url("ecdsa"),
+            "SZS_STARK_SERVICE_URL": self.url("szsstark"),
+            "VALIDATOR_SERVICE_URL": self.url("popv_validator"),
+            "BLOCK_STORE_DIR": os.path.join(self.workdir, "blocks"),
+            "ACCOUNT_STATE_DIR": os.path.join(self.workdir, "state"),
+            "CHAIN_INDEX_DIR": os.path.join(self.workdir, "index"),
+            # Los emisores de la carga son cuentas nuevas: sin saldo inicial se
+            # rechazarían todas sus transferencias
+            "ACCOUNT_INITIAL_BALANCE": "1000000",
+            "VALIDATOR_PROCESSOR": self.args.processor,
+            "VERIFIER_BACKEND": self.args.verifier,
+            # Clave obligatoria; común para que el validador acepte las raíces de szsstark
+            # con los backends local y process
+            "STARK_PROOF_KEY": os.environ.get("STARK_PROOF_KEY") or secrets.token_hex(32),
+            "LOG_LEVEL": self.args.log_level,
+        })
+        env.update(self.args.env)
+        for name in SERVICES:
+            self._launch(name, env)
+            self._wait_ready(name)
+
+    def _launch(self, name, env):
+        directory, script, offset = SERVICES[name]
+        port = self.args.base_port + offset
+        command = [sys.executable, script]
+        if name == "gateway" and self.args.gateway_server == "gunicorn":
+            # Como en flask/Dockerfile
+            command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+                       "--worker-class", "gthread", "--threads", "32", "app:app"]
+        log = open(os.path.join(self.workdir, f"{name}.log"), "wb")
+        self.processes[name] = subprocess.Popen(command, cwd=os.path.join(ROOT, directory),
+                                                env=dict(env, SERVICE_PORT=str(port)),
+                                                stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+    def _wait_ready(self, name, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.processes[name].poll() is not None:
+                raise RuntimeError(f"{name} terminó al arrancar:\n{self.log_tail(name)}")
+            try:
+                if requests.get(f"{self.url(name)}/metrics", timeout=1).status_code == 200:
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{name} no respondió en {timeout} s:\n{self.log_tail(name)}")
+
+    def log_tail(self, name, lines=20):
+        with open(os.path.join(self.workdir, f"{name}.log"), "rb") as f:
+            return "\n".join(f.read().decode('utf-8', 'replace').splitlines()[-lines:])
+
+    def stop(self):
+        for process in reversed(list(self.processes.values())):
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.fake_redis is not None:
+            self.fake_redis.shutdown()
+            self.fake_redis.server_close()
+
+
+class BlockListener:
+    # Instante de llegada de cada transacción (por firma) en new_block_channel
+    def __init__(self, r):
+        self.included = {} # firma -> (instante, número de bloque)
+        self.block_sizes = {} # número de bloque -> transacciones
+        self._redis = r # redis-py cierra el pool al liberar el cliente
+        self._pubsub = r.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe('new_block_channel')
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            message = self._pubsub.get_message(timeout=0.5)
+            if not message:
+                continue
+            received = time.perf_counter()
+            block = json.loads(message['data'])
+            self.block_sizes[block['block_number']] = len(block['transactions'])
+            for transaction in block['transactions']:
+                self.included.setdefault(transaction.get('signed_data'), (received, block['block_number']))
+
+    def wait_for(self, signatures, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not all(s in self.included for s in signatures):
+            time.sleep(0.1)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._pubsub.close()
+
+
+# --- Microbenchmarks ---
+
+def micro_endpoints(stack, listener, batch_size):
+    # (servicio, nombre, método, url, función i -> argumentos de requests, elementos por petición)
+    ecdsa, stark, validator, gateway = (stack.url(n) for n in ("ecdsa", "szsstark", "popv_validator", "gateway"))
+    session = requests.Session()
+    signed = wire.decode_response(session.post(f"{ecdsa}/sign", **wire.encode_request({"data": "bench"}), timeout=10))
+    proof = wire.decode_response(session.post(f"{stark}/generate_proof", **wire.encode_request(
+        {"signed_tx_data": signed["signed_data"]}), timeout=10))
+    signature_entry = {k: signed[k] for k in ("signed_data", "original_data", "public_key")}
+    proof_entry = {"proof_data": proof, "original_data": signed["original_data"], "signed_tx_data": signed["signed_data"]}
+
+    # Una transacción ya sellada para las consultas por firma
+    response = session.post(f"{gateway}/send_transaction", json={"transaction_data": "sender:micro,recipient:bench,amount:0.01"},
+                            timeout=10)
+    response.raise_for_status()
+    sealed_signature = response.json()["transaction"]["signed_data"]
+    listener.wait_for([sealed_signature], 30)
+
+    endpoints = [
+        ("ecdsa", "POST /sign", "POST", f"{ecdsa}/sign", lambda i: wire.encode_request({"data": f"bench-{i}"}), 1),
+        ("ecdsa", "POST /sign_batch", "POST", f"{ecdsa}/sign_batch",
+         lambda i: wire.encode_request({"data": [f"bench-{i}-{j}" for j in range(batch_size)]}), batch_size),
+        ("ecdsa", "POST /verify", "POST", f"{ecdsa}/verify", lambda i: wire.encode_request(signature_entry), 1),
+        ("ecdsa", "POST /verify_batch", "POST", f"{ecdsa}/verify_batch",
+         lambda i: wire.encode_request({"entries": [signature_entry] * batch_size}), batch_size),
+        ("szsstark", "POST /generate_proof", "POST", f"{stark}/generate_proof",
+         lambda i: wire.encode_request({"signed_tx_data": f"{i:064x}"}), 1),
+        ("szsstark", "POST /generate_proof_batch", "POST", f"{stark}/generate_proof_batch",
+         lambda i: wire.encode_request({"signed_tx_data": [f"{i:032x}{j:032x}" for j in range(batch_size)]}), batch_size),
+        ("szsstark", "POST /verify_proof", "POST", f"{stark}/verify_proof", lambda i: wire.encode_request(proof_entry), 1),
+        ("szsstark", "POST /verify_proof_batch", "POST", f"{stark}/verify_proof_batch",
+         lambda i: wire.encode_request({"entries": [proof_entry] * batch_size}), batch_size),
+        ("popv_validator", "GET /blockchain_status", "GET", f"{validator}/blockchain_status", lambda i: {}, 1),
+        ("popv_validator", "GET /blocks", "GET", f"{validator}/blocks?limit=20", lambda i: {}, 1),
+        ("popv_validator", "GET /chain/stats", "GET", f"{validator}/chain/stats", lambda i: {}, 1),
+        ("popv_validator", "GET /balance/<account>", "GET", f"{validator}/balance/micro", lambda i: {}, 1),
+        ("popv_validator", "GET /metrics", "GET", f"{validator}/metrics", lambda i: {}, 1),
+        # La pasarela recibe JSON, como desde el navegador
+        ("gateway", "POST /send_transaction", "POST", f"{gateway}/send_transaction",
+         lambda i: {"json": {"transaction_data": f"sender:micro{i % 50},recipient:bench,amount:0.01"}}, 1),
+        ("gateway", "POST /send_transactions", "POST", f"{gateway}/send_transactions",
+         lambda i: {"json": [{"sender": f"microbulk{j}", "recipient": "bench", "amount": 0.01} for j in range(batch_size)]},
+         batch_size),
+        ("gateway", "GET /network_status", "GET", f"{gateway}/network_status", lambda i: {}, 1),
+        ("gateway", "GET /metrics", "GET", f"{gateway}/metrics", lambda i: {}, 1),
+    ]
+    if sealed_signature in listener.included:
+        endpoints.insert(12, ("popv_validator", "GET /transactions/<signature>", "GET",
+                              f"{validator}/transactions/{sealed_signature}", lambda i: {}, 1))
+    else:
+        print("Aviso: la transacción de prueba no llegó a un bloque; se omite GET /transactions/<signature>")
+    session.close()
+    return endpoints
+
+
+def run_micro(endpoint, requests_count, concurrency, warmup):
+    service, name, method, url, make_kwargs, items = endpoint
+    latencies, errors = [], collections.Counter()
+    counter = iter(range(warmup + requests_count))
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            kwargs = make_kwargs(i)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=30, **kwargs)
+                response.content
+                status = response.status_code
+            except requests.exceptions.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors[str(status)] += 1
+        session.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "service": service,
+        "endpoint": name,
+        "items_per_request": items,
+        "requests": requests_count,
+        "errors": dict(errors),
+        # El calentamiento entra en el tiempo total pero es pequeño frente a requests_count
+        "requests_per_second": len(latencies) / elapsed,
+        "items_per_second": len(latencies) * items / elapsed,
+        "latency": summarize(latencies),
+    }
+
+
+# --- Carga en lazo abierto ---
+
+def run_load(stack, listener, rate, duration, args):
+    url = f"{stack.url('gateway')}/send_transaction"
+    count = int(rate * duration)
+    records = [None] * count # (programado, respuesta, estado, firma)
+    local = threading.local()
+    prefix = f"load{rate:g}-{int(time.time())}"
+
+    def send(i, scheduled):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        # Muchos emisores: los nonces de un mismo emisor se sellan en orden
+        body = {"transaction_data": f"sender:{prefix}-{i % args.senders},recipient:bench,amount:0.01"}
+        signature = None
+        try:
+            response = local.session.post(url, json=body, timeout=args.request_timeout)
+            status = response.status_code
+            if status == 200:
+                signature = response.json()["transaction"]["signed_data"]
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        records[i] = (scheduled, time.perf_counter(), status, signature)
+
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        start = time.perf_counter() + 0.05
+        for i in range(count):
+            # Se respeta el ritmo aunque las respuestas se retrasen
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    submitted = time.perf_counter()
+
+    signatures = [record[3] for record in records if record[3]]
+    listener.wait_for(signatures, args.drain)
+
+    statuses = collections.Counter(str(record[2]) for record in records)
+    ok = [record for record in records if record[3]]
+    included = [(record, listener.included[record[3]]) for record in ok if record[3] in listener.included]
+    blocks = {block for _, (_, block) in included}
+    last_inclusion = max((arrival for _, (arrival, _) in included), default=start)
+    return {
+        "rate": rate,
+        "duration_s": duration,
+        "offered": count,
+        "responses": dict(statuses),
+        "accepted": len(ok),
+        "accepted_per_second": len(ok) / (submitted - start),
+        "submit_latency": summarize([record[1] - record[0] for record in ok]),
+        "included": len(included),
+        "included_ratio": len(included) / len(ok) if ok else 0.0,
+        "included_per_second": len(included) / (last_inclusion - start) if included else 0.0,
+        "end_to_end_latency": summarize([arrival - record[0] for record, (arrival, _) in included]),
+        "blocks": len(blocks),
+        "mean_block_size": sum(listener.block_sizes[b] for b in blocks) / len(blocks) if blocks else 0.0,
+    }
+
+
+# --- Informe y comparación ---
+
+def flatten(results):
+    # Métrica -> (valor, True si más alto es mejor)
+    metrics = {}
+    for micro in results.get("micro", []):
+        key = f"micro {micro['service']} {micro['endpoint']}"
+        metrics[f"{key} req/s"] = (micro["requests_per_second"], True)
+        for pct in ("p50", "p99"):
+            if f"{pct}_ms" in micro["latency"]:
+                metrics[f"{key} {pct} ms"] = (micro["latency"][f"{pct}_ms"], False)
+    for load in results.get("load", []):
+        key = f"carga {load['rate']:g} tx/s"
+        metrics[f"{key} aceptadas/s"] = (load["accepted_per_second"], True)
+        metrics[f"{key} en bloque/s"] = (load["included_per_second"], True)
+        for name, label in (("submit_latency", "respuesta"), ("end_to_end_latency", "hasta bloque")):
+            for pct in ("p50", "p99"):
+                if f"{pct}_ms" in load[name]:
+                    metrics[f"{key} {label} {pct} ms"] = (load[name][f"{pct}_ms"], False)
+    return metrics
+
+
+def compare(baseline, current, threshold):
+    old, new = flatten(baseline), flatten(current)
+    print(f"\nbase {baseline['meta'].get('commit', '?')[:10]} -> actual {current['meta'].get('commit', '?')[:10]}"
+          f" (se marcan con ! los empeoramientos de más del {threshold:g}%)")
+    width = max((len(k) for k in new if k in old), default=10)
+    for key in new:
+        if key not in old:
+            continue
+        (before, higher_is_better), (after, _) = old[key], new[key]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        mark = "!" if worse > threshold else " "
+        print(f"{mark} {key:<{width}} {before:>12.2f} {after:>12.2f} {change:>+8.1f}%")
+
+
+def print_micro(micro):
+    latency = micro["latency"]
+    errors = f"  errores {micro['errors']}" if micro["errors"] else ""
+    print(f"{micro['service']:<15}{micro['endpoint']:<32}{micro['requests_per_second']:>9.1f} req/s"
+          f"{micro['items_per_second']:>10.1f} el/s   p50 {latency.get('p50_ms', 0):>7.1f} ms"
+          f"   p99 {latency.get('p99_ms', 0):>7.1f} ms{errors}")
+
+
+def print_load(load):
+    submit, e2e = load["submit_latency"], load["end_to_end_latency"]
+    print(f"ritmo {load['rate']:g} tx/s: {load['accepted']}/{load['offered']} aceptadas ({load['responses']}), "
+          f"{load['included']} en {load['blocks']} bloques (media {load['mean_block_size']:.1f} tx/bloque)")
+    print(f"  aceptadas {load['accepted_per_second']:.1f} tx/s, en bloque {load['included_per_second']:.1f} tx/s")
+    if submit["count"]:
+        print(f"  respuesta     p50/p90/p99/max {submit['p50_ms']:.1f} / {submit['p90_ms']:.1f} / "
+              f"{submit['p99_ms']:.1f} / {submit['max_ms']:.1f} ms")
+    if e2e["count"]:
+        print(f"  hasta bloque  p50/p90/p99/max {e2e['p50_ms']:.1f} / {e2e['p90_ms']:.1f} / "
+              f"{e2e['p99_ms']:.1f} / {e2e['max_ms']:.1f} ms")
+
+
+def parse_env(value):
+    if "=" not in value:
+        raise argparse.ArgumentTypeError("se esperaba CLAVE=VALOR")
+    return tuple(value.split("=", 1))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rates', type=float, nargs='*', default=[10, 25, 50],
+                        help="ritmos de envío a /send_transaction (tx/s), uno por etapa")
+    parser.add_argument('--duration', type=float, default=10, help="segundos de carga por ritmo")
+    parser.add_argument('--drain', type=float, default=30,
+                        help="segundos máximos esperando a que las transacciones de una etapa lleguen a un bloque")
+    parser.add_argument('--senders', type=int, default=100, help="emisores distintos en la carga")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="peticiones simultáneas como máximo")
+    parser.add_argument('--request-timeout', type=float, default=30)
+    parser.add_argument('--micro-requests', type=int, default=200, help="peticiones por endpoint (0 para omitirlos)")
+    parser.add_argument('--micro-concurrency', type=int, default=1)
+    parser.add_argument('--micro-warmup', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=100, help="elementos por petición en los endpoints por lotes")
+    parser.add_argument('--redis-host', help="Redis local; sin él se usa fakeredis en este proceso")
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--flush-redis', action='store_true', help="vaciar la base de datos de --redis-host antes de empezar")
+    parser.add_argument('--base-port', type=int, default=15000,
+                        help="puerto de la pasarela; ecdsa, szsstark y el validador usan los tres siguientes")
+    parser.add_argument('--gateway-server', choices=["gunicorn", "flask"],
+                        default="gunicorn" if importlib.util.find_spec("gunicorn") else "flask")
+    parser.add_argument('--processor', default="batch", choices=["single", "batch", "async"],
+                        help="VALIDATOR_PROCESSOR del validador")
+    parser.add_argument('--verifier', default="http", choices=["http", "local", "process"],
+                        help="VERIFIER_BACKEND del validador")
+    parser.add_argument('--log-level', default="INFO")
+    parser.add_argument('--env', type=parse_env, action='append', default=[], metavar="CLAVE=VALOR",
+                        help="variable de entorno adicional para los servicios (repetible)")
+    parser.add_argument('--output', help="fichero de resultados (por defecto e2e-<commit>-<fecha>.json)")
+    parser.add_argument('--baseline', help="resultados anteriores con los que comparar al terminar")
+    parser.add_argument('--threshold', type=float, default=10, help="porcentaje a partir del cual se marca un empeoramiento")
+    parser.add_argument('--compare', nargs=2, metavar=("BASE", "ACTUAL"),
+                        help="solo comparar dos ficheros de resultados, sin ejecutar nada")
+    args = parser.parse_args()
+    args.env = dict(args.env)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new), args.threshold)
+        return
+
+    commit, dirty = git_revision()
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "redis": f"{args.redis_host}:{args.redis_port}" if args.redis_host else "fakeredis",
+            "gateway_server": args.gateway_server,
+            "processor": args.processor,
+            "verifier": args.verifier,
+            "wire_format": args.env.get("WIRE_FORMAT", wire.WIRE_FORMAT),
+            "env": args.env,
+            "args": {k: v for k, v in vars(args).items() if k not in ("env", "compare")},
+        },
+        "micro": [],
+        "load": [],
+    }
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    stack = Stack(args, workdir)
+    listener = None
+    failed = True
+    try:
+        print(f"Levantando los servicios (Redis: {results['meta']['redis']}, pasarela: {args.gateway_server}, "
+              f"validador: {args.processor}/{args.verifier}, logs en {workdir})...")
+        stack.start()
+        listener = BlockListener(stack.redis())
+
+        if args.micro_requests:
+            print(f"\nMicrobenchmarks: {args.micro_requests} peticiones por endpoint, "
+                  f"{args.micro_concurrency} conexiones, lotes de {args.batch_size}")
+            for endpoint in micro_endpoints(stack, listener, args.batch_size):
+                micro = run_micro(endpoint, args.micro_requests, args.micro_concurrency, args.micro_warmup)
+                results["micro"].append(micro)
+                print_micro(micro)
+
+        if args.rates:
+            print(f"\nCarga en lazo abierto sobre /send_transaction: {args.duration:g} s por ritmo, {args.senders} emisores")
+        for rate in args.rates:
+            load = run_load(stack, listener, rate, args.duration, args)
+            results["load"].append(load)
+            print_load(load)
+        failed = False
+    finally:
+        if listener is not None:
+            listener.stop()
+        stack.stop()
+        if failed:
+            print(f"Logs de los servicios en {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or f"e2e-{(commit or 'nogit')[:8]}-{started_at:%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResultados en {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), results, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# common/bench_wire_format.py
+# Compara el formato binario de wire.py con el JSON anterior: tamaño de cada
+# transacción, coste de codificar y decodificar, y coste de los hashes de
+# transacción y de bloque que calcula el validador.
+#
+#   python bench_wire_format.py --count 2000 --block-size 100
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from ecdsa import SigningKey, SECP256k1
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Fuera de Docker szstark_core.py está en el directorio del servicio
+sys.path.insert(0, os.path.join(HERE, '..', 'szsstark'))
+# Las pruebas solo se generan y se miden aquí: cualquier clave sirve
+os.environ.setdefault("STARK_PROOF_KEY", "bench-wire-format")
+
+import szstark_core  # noqa: E402
+import wire  # noqa: E402
+
+
+def make_transactions(count):
+    # Transacciones como las que encola la pasarela: firma real y prueba de un lote
+    sk = SigningKey.generate(curve=SECP256k1)
+    public_key = sk.get_verifying_key().to_string().hex()
+    transactions = []
+    for i in range(count):
+        original_data = json.dumps({"sender": f"user{i % 50}", "recipient": "Bob", "amount": float(i)}, sort_keys=True)
+        transactions.append({
+            "sender": f"user{i % 50}",
+            "recipient": "Bob",
+            "amount": float(i),
+            "original_data": original_data,
+            "signed_data": sk.sign(hashlib.sha256(original_data.encode('utf-8')).digest()).hex(),
+            "public_key": public_key,
+        })
+    proofs = szstark_core.generate_proofs([tx["signed_data"] for tx in transactions])
+    for transaction, proof in zip(transactions, proofs):
+        transaction["stark_proof"] = proof
+    return transactions
+
+
+def per_item_us(fn, items, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def make_block(transactions, number):
+    block = {
+        "timestamp": time.time(),
+        "transactions": transactions,
+        "merkle_root": hashlib.sha256(str(number).encode('utf-8')).hexdigest(),
+        "previous_hash": hashlib.sha256(str(number - 1).encode('utf-8')).hexdigest(),
+        "validator_id": "PoPV-Validator-001",
+        "block_number": number
+    }
+    return block
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000, help="transacciones")
+    parser.add_argument('--block-size', type=int, default=100, help="transacciones por bloque")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    transactions = make_transactions(args.count)
+    json_items = [json.dumps(tx).encode('utf-8') for tx in transactions]
+    wire_items = [wire.encode_transaction(tx) for tx in transactions]
+    assert all(wire.decode_transaction(item) == tx for item, tx in zip(wire_items, transactions))
+
+    json_size = sum(map(len, json_items)) / len(json_items)
+    wire_size = sum(map(len, wire_items)) / len(wire_items)
+    print(f"{args.count} transacciones; bloques de {args.block_size}")
+    print(f"{'':22}{'JSON':>12}{'msgpack':>12}{'ratio':>9}")
+
+    def row(label, json_value, wire_value, unit):
+        print(f"{label:22}{json_value:>9.2f} {unit:<2}{wire_value:>9.2f} {unit:<2}{json_value / wire_value:>8.2f}x")
+
+    row("tamaño por tx", json_size, wire_size, "B")
+    row("codificar tx", per_item_us(json.dumps, transactions, args.repeat),
+        per_item_us(wire.encode_transaction, transactions, args.repeat), "us")
+    row("decodificar tx", per_item_us(json.loads, json_items, args.repeat),
+        per_item_us(wire.decode_transaction, wire_items, args.repeat), "us")
+    row("hash de tx",
+        per_item_us(lambda tx: hashlib.sha256(json.dumps(tx, sort_keys=True).encode('utf-8')).hexdigest(), transactions, args.repeat),
+        per_item_us(wire.transaction_digest, transactions, args.repeat), "us")
+
+    blocks = [make_block(transactions[i:i + args.block_size], n + 1)
+              for n, i in enumerate(range(0, len(transactions), args.block_size))]
+    # Antes se volvía a serializar el bloque entero; ahora solo la cabecera canónica
+    row("hash de bloque",
+        per_item_us(lambda b: hashlib.sha256(json.dumps(b, sort_keys=True).encode('utf-8')).hexdigest(), blocks, args.repeat),
+        per_item_us(wire.block_digest, blocks, args.repeat), "us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+# common/instrumentation.py
+# Instrumentación compartida por los cuatro servicios:
+#
+#   - Métricas en memoria con el formato de texto de Prometheus, servidas en
+#     /metrics: Counter, Gauge, Histogram (API de prometheus_client:
+#     labels(...).inc() / .set() / .observe()) y FunctionMetric, cuyo valor se
+#     calcula al leer /metrics (profundidad de colas, aciertos de cachés...).
+#   - Identificadores de traza: cada petición HTTP toma el de la cabecera
+#     X-Trace-Id o crea uno, lo devuelve en la respuesta y las llamadas
+#     salientes lo propagan (trace_headers / inject_trace).
+#   - Logging por transacción muestreado y filtrado por nivel (log_sampled):
+#     con el nivel desactivado cuesta una comparación.
+#
+# Las métricas viven en el proceso: la pasarela corre un único worker de
+# gunicorn con hilos y los demás servicios un único proceso.
+import bisect
+import contextlib
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import Response, g, request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fracción de transacciones que se registran en los logs por transacción
+TRACE_LOG_SAMPLE_RATE = float(os.getenv("TRACE_LOG_SAMPLE_RATE", 0.01))
+TRACE_HEADER = "X-Trace-Id"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos: de 0.5 ms a 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Transacciones por bloque o por lote
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+# --- Métricas ---
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        # (sufijo, etiquetas, valor) de cada serie
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                yield suffix, dict(labels, **extra), value
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield "", {}, self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # el último es +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield "_bucket", {"le": _format_value(float(bound))}, cumulative
+        yield "_sum", {}, total
+        yield "_count", {}, cumulative
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class FunctionMetric(_Metric):
+    # Valor calculado al leer /metrics. function() devuelve un número (sin
+    # etiquetas) o un diccionario {(valor de etiqueta, ...): número}.
+    def __init__(self, name, documentation, function, labelnames=(), kind="gauge"):
+        self.function = function
+        self.kind = kind
+        super().__init__(name, documentation, labelnames)
+
+    def samples(self):
+        try:
+            values = self.function()
+        except Exception: # Una métrica rota no debe tumbar /metrics
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield "", dict(zip(self.labelnames, (str(k) for k in key))), value
+
+
+class RateMeter:
+    # Eventos por segundo en una ventana deslizante (p. ej. bloques/s)
+    def __init__(self, window=60):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, count=1):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, count))
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._events and self._events[0][0] < now - self.window:
+            self._events.popleft()
+
+    def rate(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return sum(count for _, count in self._events) / self.window
+
+
+def render():
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, labels, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Trazas ---
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextlib.contextmanager
+def trace(trace_id=None):
+    # Para el trabajo que no nace de una petición HTTP (p. ej. un lote del validador)
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def start_trace(trace_id=None):
+    # Para bucles de larga duración (un hilo consumidor): la traza queda
+    # activa en el contexto actual hasta la siguiente llamada
+    trace_id = trace_id or new_trace_id()
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def trace_headers():
+    trace_id = _trace_id.get()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def inject_trace(kwargs):
+    # Añade la cabecera de traza a los argumentos de una llamada requests/aiohttp
+    trace_id = _trace_id.get()
+    if trace_id:
+        kwargs["headers"] = dict(kwargs.get("headers") or {}, **{TRACE_HEADER: trace_id})
+    return kwargs
+
+
+# --- Logging ---
+
+class _TraceFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+def configure_logging(service):
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s")
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, _TraceFilter) for f in handler.filters):
+            handler.addFilter(_TraceFilter())
+    return logging.getLogger(service)
+
+
+def log_sampled(logger, level, message, *args):
+    # Primero el nivel (casi gratis si está desactivado) y después el muestreo;
+    # el mensaje solo se formatea si se registra
+    if logger.isEnabledFor(level) and (TRACE_LOG_SAMPLE_RATE >= 1 or random.random() < TRACE_LOG_SAMPLE_RATE):
+        logger.log(level, message, *args)
+
+
+# --- Flask ---
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Latencia de las peticiones HTTP",
+                            ("service", "method", "endpoint", "status"))
+
+
+def instrument_app(app, service):
+    # Latencia por ruta (la regla, no la URL, para acotar las series), traza
+    # por petición y la ruta /metrics
+    @app.before_request
+    def _start_request():
+        g.instrumentation_start = time.perf_counter()
+        g.instrumentation_token = _trace_id.set(request.headers.get(TRACE_HEADER) or new_trace_id())
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop("instrumentation_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+            REQUEST_LATENCY.labels(service, request.method, endpoint, response.status_code).observe(
+                time.perf_counter() - start)
+        trace_id = _trace_id.get()
+        if trace_id:
+            response.headers[TRACE_HEADER] = trace_id
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop("instrumentation_token", None)
+        if token is not None:
+            try:
+                _trace_id.reset(token)
+            except ValueError: # Respuestas en stream: el final llega en otro contexto
+                _trace_id.set(None)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), content_type=METRICS_CONTENT_TYPE)
+
+    return app
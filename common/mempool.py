@@ -0,0 +1,436 @@
+# common/mempool.py
+# Mempool sobre Redis entre la pasarela y el validador. Sustituye a la lista
+# pending_transactions de WorkQueue como almacén de pendientes; la lista de
+# procesamiento por consumidor, el ack, la recuperación de transacciones en
+# vuelo y la cola de muertos son los de WorkQueue.
+#
+# Admisión (script Lua, atómica):
+#   - Duplicados: un filtro de Bloom (dos generaciones que rotan) descarta en
+#     O(1) casi todas las transacciones nuevas; si dice "vista", se confirma en
+#     el índice exacto por hash (pendientes y en vuelo). El hash es el de la
+#     firma, como en el índice de la cadena del validador: la prueba STARK
+#     cambia con cada lote, así que los bytes de una misma transacción firmada
+#     no son siempre los mismos. Solo se detecta el reenvío de la misma
+#     transacción firmada (la misma firma): el servicio ECDSA firma con un k
+#     aleatorio, así que volver a firmar los mismos datos da otra firma y otra
+#     transacción. Es intencionado: sin nonce del cliente, dos transferencias
+#     iguales y legítimas firman los mismos datos.
+#   - Nonces por emisor: solo es ejecutable la transacción con el siguiente
+#     nonce del emisor; las posteriores esperan a que se tome la anterior. Un
+#     nonce ya usado se rechaza (repetición) y uno pendiente también. A las
+#     transacciones sin nonce se les propone el siguiente libre del emisor y el
+#     script solo lo acepta si sigue siéndolo: un nonce se consume al admitir,
+#     nunca antes, así que los rechazos no dejan huecos.
+#   - Tamaño: con MEMPOOL_MAX_SIZE pendientes, una transacción nueva expulsa a
+#     la de menor fee si paga más que ella; si no, se rechaza. Con la expulsada
+#     salen las posteriores de su emisor (sin ella no podrían ejecutarse) y el
+#     emisor vuelve a su nonce, que ocupará su siguiente transacción sin nonce.
+#
+# Salida: las transacciones ejecutables están en un sorted set ordenado por fee
+# (y por orden de llegada a igual fee); take las pasa a la lista de
+# procesamiento del consumidor y promueve el siguiente nonce del emisor.
+#
+#   mempool:ready               ejecutables (score -fee)
+#   mempool:waiting:<emisor>    esperando nonce (score nonce)
+#   mempool:by_fee              todas las pendientes por fee (para expulsar)
+#   mempool:tx / mempool:meta   entrada -> transacción codificada / "nonce:fee:emisor"
+#   mempool:index               hash -> entrada (pendientes y en vuelo, hasta el ack)
+#   mempool:slots               "emisor:nonce" -> entrada
+#   mempool:nonce               emisor -> siguiente nonce ejecutable
+#   mempool:assigned            emisor -> siguiente nonce sin usar (pendientes incluidas)
+#   mempool:bloom:0|1           filtros de Bloom
+import hashlib
+import os
+
+import wire
+from work_queue import WorkQueue, item_key
+
+MEMPOOL_MAX_SIZE = int(os.getenv("MEMPOOL_MAX_SIZE", 100000))
+MEMPOOL_BLOOM_BITS = int(os.getenv("MEMPOOL_BLOOM_BITS", 2 ** 24))
+MEMPOOL_BLOOM_HASHES = int(os.getenv("MEMPOOL_BLOOM_HASHES", 7))
+# Transacciones por generación del filtro (~1% de falsos positivos con los valores por defecto)
+MEMPOOL_BLOOM_CAPACITY = int(os.getenv("MEMPOOL_BLOOM_CAPACITY", 1000000))
+
+PREFIX = "mempool:"
+SIGNAL_CAP = 64
+# Intentos de admisión de una transacción sin nonce cuando otro productor
+# ocupa antes el nonce propuesto para el mismo emisor
+NONCE_ATTEMPTS = 8
+
+# Resultados de la admisión
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+NONCE_TOO_LOW = "nonce_too_low"
+NONCE_IN_USE = "nonce_in_use"
+NONCE_CONFLICT = "nonce_conflict"
+FULL = "full"
+INVALID = "invalid"
+
+_LUA_COMMON = """
+local p = ARGV[1]
+local function parse_meta(meta)
+    local nonce, fee, sender = string.match(meta, '^(%d+):([^:]+):(.*)$')
+    return tonumber(nonce), tonumber(fee), sender
+end
+local function remove_entry(entry)
+    local meta = redis.call('HGET', p .. 'meta', entry)
+    if not meta then return end
+    local nonce, fee, sender = parse_meta(meta)
+    redis.call('ZREM', p .. 'ready', entry)
+    redis.call('ZREM', p .. 'waiting:' .. sender, entry)
+    redis.call('ZREM', p .. 'by_fee', entry)
+    redis.call('HDEL', p .. 'slots', sender .. ':' .. nonce)
+    redis.call('HDEL', p .. 'tx', entry)
+    redis.call('HDEL', p .. 'meta', entry)
+    return nonce, fee, sender
+end
+local function evict_entry(entry)
+    local nonce, _, sender = remove_entry(entry)
+    redis.call('HDEL', p .. 'index', string.sub(entry, 18))
+    local evicted = 1
+    -- Las posteriores del emisor esperan a esta: sin ella no se ejecutarían nunca
+    local later = redis.call('ZRANGEBYSCORE', p .. 'waiting:' .. sender, '(' .. nonce, '+inf')
+    for _, other in ipairs(later) do
+        remove_entry(other)
+        redis.call('HDEL', p .. 'index', string.sub(other, 18))
+        evicted = evicted + 1
+    end
+    -- El nonce queda libre para la siguiente transacción sin nonce del emisor
+    if tonumber(redis.call('HGET', p .. 'assigned', sender) or '0') > nonce then
+        redis.call('HSET', p .. 'assigned', sender, nonce)
+    end
+    redis.call('INCRBY', p .. 'evicted', evicted)
+end
+local function insert_entry(entry, item, nonce, fee, sender, ready)
+    redis.call('HSET', p .. 'tx', entry, item)
+    redis.call('HSET', p .. 'meta', entry, nonce .. ':' .. fee .. ':' .. sender)
+    redis.call('HSET', p .. 'slots', sender .. ':' .. nonce, entry)
+    redis.call('ZADD', p .. 'by_fee', fee, entry)
+    if ready then
+        redis.call('ZADD', p .. 'ready', -fee, entry)
+    else
+        redis.call('ZADD', p .. 'waiting:' .. sender, nonce, entry)
+    end
+    redis.call('LPUSH', p .. 'signal', 1)
+    redis.call('LTRIM', p .. 'signal', 0, SIGNAL_CAP - 1)
+end
+""".replace("SIGNAL_CAP", str(SIGNAL_CAP))
+
+# ARGV: prefijo, hash, transacción, emisor, nonce, fee, máximo, capacidad del filtro,
+# 1 si el nonce es propuesto (transacción sin nonce), posiciones del filtro...
+_ADD_SCRIPT = _LUA_COMMON + """
+local txid, item, sender = ARGV[2], ARGV[3], ARGV[4]
+local nonce, fee = tonumber(ARGV[5]), tonumber(ARGV[6])
+local max_size, bloom_capacity = tonumber(ARGV[7]), tonumber(ARGV[8])
+local proposed = ARGV[9] == '1'
+
+local gen = tonumber(redis.call('GET', p .. 'bloom:current') or '0')
+local function in_filter(key)
+    for i = 10, #ARGV do
+        if redis.call('GETBIT', key, ARGV[i]) == 0 then return false end
+    end
+    return true
+end
+if (in_filter(p .. 'bloom:' .. gen) or in_filter(p .. 'bloom:' .. (1 - gen)))
+        and redis.call('HEXISTS', p .. 'index', txid) == 1 then
+    return 'duplicate'
+end
+
+local expected = tonumber(redis.call('HGET', p .. 'nonce', sender) or '0')
+local next_free = math.max(expected, tonumber(redis.call('HGET', p .. 'assigned', sender) or '0'))
+-- Otro productor ya ocupó el nonce propuesto: se propone otro
+if proposed and nonce ~= next_free then return 'nonce_conflict' end
+if nonce < expected then return 'nonce_too_low' end
+if redis.call('HEXISTS', p .. 'slots', sender .. ':' .. nonce) == 1 then return 'nonce_in_use' end
+
+if redis.call('ZCARD', p .. 'by_fee') >= max_size then
+    local lowest = redis.call('ZRANGE', p .. 'by_fee', 0, 0, 'WITHSCORES')
+    if fee <= tonumber(lowest[2]) then return 'full' end
+    -- Una transacción no expulsa a una anterior de su emisor: quedaría sin ejecutar
+    local lowest_nonce, _, lowest_sender = parse_meta(redis.call('HGET', p .. 'meta', lowest[1]))
+    if lowest_sender == sender and lowest_nonce < nonce then return 'full' end
+    evict_entry(lowest[1])
+    expected = tonumber(redis.call('HGET', p .. 'nonce', sender) or '0')
+    next_free = math.max(expected, tonumber(redis.call('HGET', p .. 'assigned', sender) or '0'))
+end
+
+local entry = string.format('%016d', redis.call('INCR', p .. 'seq')) .. ':' .. txid
+redis.call('HSET', p .. 'index', txid, entry)
+insert_entry(entry, item, nonce, fee, sender, nonce == expected)
+if nonce == next_free then
+    redis.call('HSET', p .. 'assigned', sender, nonce + 1)
+end
+
+local key = p .. 'bloom:' .. gen
+for i = 10, #ARGV do redis.call('SETBIT', key, ARGV[i], 1) end
+if redis.call('INCR', p .. 'bloom:count') >= bloom_capacity then
+    -- La generación anterior se descarta y pasa a ser la nueva actual
+    redis.call('DEL', p .. 'bloom:' .. (1 - gen))
+    redis.call('SET', p .. 'bloom:current', 1 - gen)
+    redis.call('SET', p .. 'bloom:count', 0)
+end
+return 'queued'
+"""
+
+# ARGV: prefijo, lista de procesamiento, máximo de transacciones
+_TAKE_SCRIPT = _LUA_COMMON + """
+local taken = {}
+for _ = 1, tonumber(ARGV[3]) do
+    local popped = redis.call('ZPOPMIN', p .. 'ready')
+    if #popped == 0 then break end
+    local entry = popped[1]
+    local item = redis.call('HGET', p .. 'tx', entry)
+    local nonce, fee, sender = remove_entry(entry)
+    redis.call('LPUSH', ARGV[2], item)
+    table.insert(taken, item)
+    -- El siguiente nonce del emisor pasa a ser ejecutable
+    local expected = tonumber(redis.call('HGET', p .. 'nonce', sender) or '0')
+    if nonce + 1 > expected then
+        redis.call('HSET', p .. 'nonce', sender, nonce + 1)
+        local nxt = redis.call('ZRANGEBYSCORE', p .. 'waiting:' .. sender, nonce + 1, nonce + 1)
+        if #nxt > 0 then
+            local _, next_fee = parse_meta(redis.call('HGET', p .. 'meta', nxt[1]))
+            redis.call('ZREM', p .. 'waiting:' .. sender, nxt[1])
+            redis.call('ZADD', p .. 'ready', -next_fee, nxt[1])
+        end
+    end
+end
+return taken
+"""
+
+# ARGV: prefijo, emisores... Siguiente nonce sin usar de cada emisor (solo lectura:
+# se consume al admitir la transacción)
+_NEXT_NONCE_SCRIPT = """
+local p = ARGV[1]
+local nonces = {}
+for i = 2, #ARGV do
+    local expected = tonumber(redis.call('HGET', p .. 'nonce', ARGV[i]) or '0')
+    local assigned = tonumber(redis.call('HGET', p .. 'assigned', ARGV[i]) or '0')
+    table.insert(nonces, math.max(expected, assigned))
+end
+return nonces
+"""
+
+# ARGV: prefijo, lista de procesamiento, hash, transacción, emisor, nonce, fee
+_REQUEUE_SCRIPT = _LUA_COMMON + """
+local txid, item, sender = ARGV[3], ARGV[4], ARGV[5]
+local nonce, fee = tonumber(ARGV[6]), tonumber(ARGV[7])
+if redis.call('LREM', ARGV[2], 1, item) == 0 then return 0 end
+-- Vuelve con su entrada original, así que conserva su turno entre las de su fee
+local entry = redis.call('HGET', p .. 'index', txid)
+if not entry then
+    entry = string.format('%016d', redis.call('INCR', p .. 'seq')) .. ':' .. txid
+    redis.call('HSET', p .. 'index', txid, entry)
+end
+insert_entry(entry, item, nonce, fee, sender, true)
+return 1
+"""
+
+
+def transaction_id(transaction, item):
+    # Hash de la firma; sin firma, el de la transacción codificada. Identifica
+    # reenvíos de la misma firma, no de los mismos datos firmados de nuevo
+    signed_data = transaction.get('signed_data') if transaction else None
+    if isinstance(signed_data, str) and signed_data:
+        return hashlib.sha256(signed_data.encode('utf-8')).hexdigest()
+    return hashlib.sha256(item.encode('utf-8') if isinstance(item, str) else item).hexdigest()
+
+
+def describe(item):
+    # (hash, (emisor, nonce, fee) o None) de una transacción codificada
+    try:
+        transaction = wire.loads_transaction(item)
+    except wire.WireFormatError:
+        return transaction_id(None, item), None
+    return transaction_id(transaction, item), admission_fields(transaction)
+
+
+def admission_fields(transaction):
+    # (emisor, nonce, fee) o None si la transacción no los lleva bien formados
+    sender = transaction.get('sender') or transaction.get('public_key')
+    nonce, fee = transaction.get('nonce'), transaction.get('fee', 0)
+    if not isinstance(sender, str) or not sender:
+        return None
+    if isinstance(nonce, bool) or not isinstance(nonce, int) or nonce < 0:
+        return None
+    if isinstance(fee, bool) or not isinstance(fee, (int, float)) or not 0 <= fee < float('inf'):
+        return None
+    return sender, nonce, fee
+
+
+def _bloom_positions(txid):
+    # Doble hashing: k posiciones a partir de dos enteros de 64 bits del hash
+    digest = bytes.fromhex(txid)
+    h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:16], 'big') | 1
+    return [(h1 + i * h2) % MEMPOOL_BLOOM_BITS for i in range(MEMPOOL_BLOOM_HASHES)]
+
+
+class Mempool(WorkQueue):
+    def __init__(self, r, worker_id=None, max_size=MEMPOOL_MAX_SIZE, **kwargs):
+        super().__init__(r, worker_id=worker_id, **kwargs)
+        self.max_size = max_size
+        self._add = r.register_script(_ADD_SCRIPT)
+        self._take_script = r.register_script(_TAKE_SCRIPT)
+        self._requeue_script = r.register_script(_REQUEUE_SCRIPT)
+        self._next_nonce_script = r.register_script(_NEXT_NONCE_SCRIPT)
+
+    # --- Productor ---
+
+    def push(self, items, pipeline=None, proposed=None):
+        # items: transacciones ya codificadas (wire.dumps_transaction). Devuelve
+        # un resultado de admisión por transacción. Con pipeline, las que llegan
+        # a Redis quedan a None y sus resultados son las primeras respuestas de
+        # pipeline.execute(): se combinan con admission_results(). proposed
+        # marca las transacciones cuyo nonce viene de push_transactions.
+        results = []
+        target = pipeline if pipeline is not None else self.r.pipeline(transaction=False)
+        for item, is_proposed in zip(items, proposed or [False] * len(items)):
+            txid, fields = describe(item)
+            if fields is None:
+                results.append(INVALID)
+                continue
+            sender, nonce, fee = fields
+            self._add(args=[PREFIX, txid, item, sender, nonce, fee, self.max_size, MEMPOOL_BLOOM_CAPACITY,
+                            int(is_proposed), *_bloom_positions(txid)], client=target)
+            results.append(None)
+        if pipeline is not None:
+            return results
+        return admission_results(results, target.execute())
+
+    def push_transactions(self, transactions, pipeline=None):
+        # Codifica y admite transacciones. Las que no traen nonce reciben el
+        # siguiente libre de su emisor (consecutivos si el emisor se repite) y
+        # se reintentan con otro si un productor concurrente lo ocupa antes. Con
+        # pipeline, los comandos que ya lleva salen en la misma ida y vuelta que
+        # el primer intento. Devuelve un resultado de admisión por transacción.
+        proposed = [tx.get('nonce') is None for tx in transactions]
+        results = [None] * len(transactions)
+        pending = list(range(len(transactions)))
+        for _ in range(NONCE_ATTEMPTS):
+            self._propose_nonces([transactions[i] for i in pending if proposed[i]])
+            target = pipeline if pipeline is not None else self.r.pipeline(transaction=False)
+            pipeline = None
+            queued = self.push([wire.dumps_transaction(transactions[i]) for i in pending], pipeline=target,
+                               proposed=[proposed[i] for i in pending])
+            replies = target.execute()
+            replies = replies[len(replies) - queued.count(None):]
+            for i, result in zip(pending, admission_results(queued, replies)):
+                results[i] = result
+            pending = [i for i in pending if results[i] == NONCE_CONFLICT]
+            if not pending:
+                break
+        for tx, is_proposed, result in zip(transactions, proposed, results):
+            if is_proposed and result != QUEUED:
+                tx['nonce'] = None
+        return results
+
+    def _propose_nonces(self, transactions):
+        senders = [tx.get('sender') or tx.get('public_key') for tx in transactions]
+        unique = list(dict.fromkeys(s for s in senders if isinstance(s, str) and s))
+        if not unique:
+            return
+        next_nonce = dict(zip(unique, self._next_nonce_script(args=[PREFIX, *unique])))
+        for tx, sender in zip(transactions, senders):
+            if sender in next_nonce:
+                tx['nonce'] = next_nonce[sender]
+                next_nonce[sender] += 1
+
+    def import_legacy(self, chunk=500):
+        # Pendientes que quedaron en la lista de WorkQueue (versiones anteriores,
+        # sin nonce): reciben nonce y pasan al mempool. Las ilegibles y las
+        # rechazadas van a muertos; con el mempool lleno vuelven a la lista, en
+        # el mismo orden, y se reintentan en la siguiente llamada.
+        imported = 0
+        while True:
+            items = self.r.rpop(self.name, chunk)
+            if not items:
+                return imported
+            readable, transactions, rejected, full = [], [], [], []
+            for item in items:
+                try:
+                    transactions.append(wire.loads_transaction(item))
+                    readable.append(item)
+                except wire.WireFormatError:
+                    rejected.append(item)
+            for item, result in zip(readable, self.push_transactions(transactions)):
+                if result == QUEUED:
+                    imported += 1
+                elif result == FULL:
+                    full.append(item)
+                else:
+                    rejected.append(item)
+            pipe = self.r.pipeline(transaction=False)
+            if rejected:
+                pipe.lpush(self.dead_name, *rejected)
+            if full:
+                # Se leen por la derecha: la más antigua queda la última
+                pipe.rpush(self.name, *reversed(full))
+            pipe.execute()
+            if full:
+                return imported
+
+    # --- Consumidor ---
+
+    def pop(self, timeout=5):
+        self.heartbeat()
+        taken = self._take(1)
+        if taken:
+            return taken[0]
+        # Sin ejecutables: se espera a la señal de la siguiente admisión
+        if self.r.blpop(PREFIX + "signal", timeout) is None:
+            return None
+        taken = self._take(1)
+        return taken[0] if taken else None
+
+    def _take(self, count):
+        return self._take_script(args=[PREFIX, self._processing_name(), count]) or []
+
+    def ack(self, *items):
+        if not items:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        for item in items:
+            pipe.lrem(self._processing_name(), 1, item)
+            pipe.hdel(self.deliveries_name, item_key(item))
+            pipe.hdel(PREFIX + "index", describe(item)[0])
+        pipe.execute()
+
+    def dead_letter(self, item, reason=None):
+        super().dead_letter(item, reason)
+        self.r.hdel(PREFIX + "index", describe(item)[0])
+
+    def _requeue(self, processing_name, item):
+        txid, fields = describe(item)
+        deliveries = self.r.hincrby(self.deliveries_name, item_key(item), 1)
+        if fields is None or deliveries >= self.max_deliveries:
+            pipe = self.r.pipeline(transaction=True)
+            pipe.lrem(processing_name, 1, item)
+            pipe.hdel(self.deliveries_name, item_key(item))
+            pipe.hdel(PREFIX + "index", txid)
+            pipe.lpush(self.dead_name, item)
+            pipe.execute()
+            return False
+        sender, nonce, fee = fields
+        # Vuelve directamente a ejecutables: su nonce ya se había tomado
+        self._requeue_script(args=[PREFIX, processing_name, txid, item, sender, nonce, fee])
+        return True
+
+    def stats(self):
+        stats = super().stats()
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zcard(PREFIX + "by_fee")
+        pipe.zcard(PREFIX + "ready")
+        pipe.get(PREFIX + "evicted")
+        pending, ready, evicted = pipe.execute()
+        stats.update(pending=pending, ready=ready, waiting=pending - ready, evicted=int(evicted or 0))
+        return stats
+
+
+def admission_results(results, replies):
+    # Sustituye los None de push(..., pipeline) por las respuestas de los scripts
+    replies = iter(replies)
+    return [result or _text(next(replies)) for result in results]
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
@@ -0,0 +1,221 @@
+# common/wire.py
+# Formato binario compacto (msgpack) para transacciones y bloques, y
+# negociación de contenido JSON/msgpack entre los servicios.
+#
+# Una transacción se codifica con un esquema fijo: una lista msgpack con los
+# campos siempre en el mismo orden y las firmas, claves y hashes como bytes en
+# vez de hex. La codificación es canónica (la misma transacción produce
+# siempre los mismos bytes), así que sirve también para calcular hashes.
+#
+#   [versión, sender, recipient, amount, nonce, fee, original_data, signed_data, public_key, stark_proof, extra]
+#   stark_proof = [proof_id, root, index, size, [hash, ...], valid, extra]
+#
+# extra guarda, con las claves ordenadas, cualquier otro campo, de modo que la
+# decodificación devuelve el mismo diccionario. Un campo ausente y uno a None
+# se codifican igual (y se decodifican como ausente).
+import hashlib
+import json
+import os
+
+import msgpack
+from flask import Response, jsonify
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/x-msgpack"
+# Formato de las transacciones en Redis y de las llamadas entre servicios: "msgpack" o "json"
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "msgpack")
+
+TRANSACTION_SCHEMA_VERSION = 2
+BLOCK_SCHEMA_VERSION = 1
+
+# Campos de cada versión del esquema; la versión 1 no tenía nonce ni fee
+_SCHEMA_FIELDS = {
+    1: ("sender", "recipient", "amount", "original_data", "signed_data", "public_key"),
+    2: ("sender", "recipient", "amount", "nonce", "fee", "original_data", "signed_data", "public_key"),
+}
+_TRANSACTION_FIELDS = _SCHEMA_FIELDS[TRANSACTION_SCHEMA_VERSION]
+_BINARY_FIELDS = {"signed_data", "public_key"}
+_PROOF_FIELDS = ("proof_id", "root", "index", "size", "path", "valid")
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def _pack_hex(value):
+    # Solo se pasa a bytes el hex que bytes.hex() reproduce tal cual (minúsculas,
+    # sin espacios), así que al decodificar se recupera la misma cadena
+    if not isinstance(value, str):
+        return value
+    try:
+        packed = bytes.fromhex(value)
+    except ValueError:
+        return value
+    return packed if packed.hex() == value else value
+
+
+def _unpack_hex(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {k: _canonical(value[k]) for k in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def _extra(obj, known_fields):
+    return _canonical({k: v for k, v in obj.items() if k not in known_fields and v is not None}) or None
+
+
+def _pack_proof(proof):
+    if not isinstance(proof, dict):
+        return proof
+    path = proof.get("path")
+    return [
+        proof.get("proof_id"),
+        _pack_hex(proof.get("root")),
+        proof.get("index"),
+        proof.get("size"),
+        [_pack_hex(h) for h in path] if isinstance(path, list) else path,
+        proof.get("valid"),
+        _extra(proof, _PROOF_FIELDS)
+    ]
+
+
+def _unpack_proof(packed):
+    if not isinstance(packed, list):
+        return packed
+    proof_id, root, index, size, path, valid, extra = packed
+    proof = {
+        "proof_id": proof_id,
+        "root": _unpack_hex(root),
+        "index": index,
+        "size": size,
+        "path": [_unpack_hex(h) for h in path] if isinstance(path, list) else path,
+        "valid": valid
+    }
+    proof = {k: v for k, v in proof.items() if v is not None}
+    proof.update(extra or {})
+    return proof
+
+
+def encode_transaction(transaction):
+    packed = [TRANSACTION_SCHEMA_VERSION]
+    for field in _TRANSACTION_FIELDS:
+        value = transaction.get(field)
+        packed.append(_pack_hex(value) if field in _BINARY_FIELDS else value)
+    packed.append(_pack_proof(transaction.get("stark_proof")))
+    packed.append(_extra(transaction, _TRANSACTION_FIELDS + ("stark_proof",)))
+    return msgpack.packb(packed, use_bin_type=True)
+
+
+def decode_transaction(data):
+    try:
+        packed = msgpack.unpackb(data, raw=False)
+        if not isinstance(packed, list) or not packed:
+            raise WireFormatError("Invalid transaction encoding: unexpected shape")
+        fields = _SCHEMA_FIELDS.get(packed[0])
+        if fields is None:
+            raise WireFormatError(f"Unsupported transaction schema version: {packed[0]}")
+        if len(packed) != len(fields) + 3:
+            raise WireFormatError("Invalid transaction encoding: unexpected shape")
+        *values, proof, extra = packed[1:]
+        transaction = {field: _unpack_hex(value) if field in _BINARY_FIELDS else value
+                       for field, value in zip(fields, values)}
+        transaction["stark_proof"] = _unpack_proof(proof)
+    except WireFormatError:
+        raise
+    except (ValueError, TypeError, IndexError, msgpack.UnpackException) as e:
+        raise WireFormatError(f"Invalid transaction encoding: {e}") from e
+    transaction = {k: v for k, v in transaction.items() if v is not None}
+    transaction.update(extra or {})
+    return transaction
+
+
+def transaction_digest(transaction):
+    return hashlib.sha256(encode_transaction(transaction)).hexdigest()
+
+
+def encode_block_header(block):
+    # La cabecera compromete las transacciones a través de merkle_root
+    return msgpack.packb([
+        BLOCK_SCHEMA_VERSION,
+        block["block_number"],
+        block["timestamp"],
+        _pack_hex(block["previous_hash"]),
+        block["validator_id"],
+        _pack_hex(block["merkle_root"])
+    ], use_bin_type=True)
+
+
+def block_digest(block):
+    return hashlib.sha256(encode_block_header(block)).hexdigest()
+
+
+# --- Transacciones en Redis ---
+
+def dumps_transaction(transaction, wire_format=None):
+    if (wire_format or WIRE_FORMAT) == "msgpack":
+        return encode_transaction(transaction)
+    return json.dumps(transaction)
+
+
+def loads_transaction(item):
+    # Acepta los dos formatos: un objeto JSON empieza siempre por "{"
+    if isinstance(item, str) or item[:1] == b"{":
+        try:
+            return json.loads(item)
+        except json.JSONDecodeError as e:
+            raise WireFormatError(f"Invalid JSON transaction: {e}") from e
+    return decode_transaction(item)
+
+
+# --- Negociación de contenido en HTTP ---
+
+def pack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def decode_body(content_type, data):
+    if content_type and content_type.split(";")[0].strip() == MSGPACK_MIMETYPE:
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def request_payload(request):
+    # Cuerpo de una petición Flask en JSON o msgpack (según Content-Type); None si no se puede leer
+    if request.mimetype == MSGPACK_MIMETYPE:
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except (ValueError, msgpack.UnpackException):
+            return None
+    return request.get_json(silent=True)
+
+
+def wants_msgpack(request):
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+
+
+def respond(request, payload, status=200):
+    # Respuesta en msgpack si el cliente la prefiere (Accept), si no en JSON
+    if wants_msgpack(request):
+        return Response(pack(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    return jsonify(payload), status
+
+
+def encode_request(payload, wire_format=None):
+    # Argumentos para requests/aiohttp: cuerpo y cabeceras en el formato elegido
+    if (wire_format or WIRE_FORMAT) == "msgpack":
+        return {
+            "data": pack(payload),
+            "headers": {"Content-Type": MSGPACK_MIMETYPE, "Accept": MSGPACK_MIMETYPE}
+        }
+    return {"json": payload}
+
+
+def decode_response(response):
+    # Respuesta de requests en el formato que haya elegido el servidor
+    return decode_body(response.headers.get("Content-Type"), response.content)
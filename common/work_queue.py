@@ -0,0 +1,171 @@
+# common/work_queue.py
+# Cola de trabajo fiable sobre Redis, compartida por la pasarela (productor) y
+# el validador (consumidores).
+#
+#   pending_transactions          lista de pendientes (LPUSH al encolar, se consume por la derecha: FIFO)
+#   queue:processing:<worker>     lo que un consumidor tiene en vuelo (BLMOVE atómico desde pendientes)
+#   queue:heartbeat:<worker>      clave con TTL que el consumidor renueva mientras está vivo
+#   queue:workers                 conjunto de consumidores conocidos
+#   queue:deliveries              entregas fallidas por elemento (hash -> contador)
+#   pending_transactions:dead     elementos que han fallado demasiadas veces
+#
+# Un elemento solo sale de su lista de procesamiento con ack() (procesado),
+# nack() (vuelve a pendientes) o dead_letter(). Si un consumidor muere, otro
+# recupera sus elementos con reclaim_stale() cuando caduca su heartbeat.
+import hashlib
+import os
+import socket
+import time
+
+QUEUE_NAME = os.getenv("WORK_QUEUE_NAME", "pending_transactions")
+QUEUE_HEARTBEAT_TTL = int(os.getenv("WORK_QUEUE_HEARTBEAT_TTL", 30))
+QUEUE_MAX_DELIVERIES = int(os.getenv("WORK_QUEUE_MAX_DELIVERIES", 5))
+
+
+def default_worker_id(index=0):
+    # Estable entre reinicios del mismo contenedor, para recuperar lo propio al arrancar
+    return f"{socket.gethostname()}-{index}"
+
+
+def item_key(item):
+    # Los elementos pueden ser texto (JSON) o bytes (formato binario, ver wire.py)
+    return hashlib.sha1(item.encode('utf-8') if isinstance(item, str) else item).hexdigest()
+
+
+class WorkQueue:
+    def __init__(self, r, name=QUEUE_NAME, worker_id=None, heartbeat_ttl=QUEUE_HEARTBEAT_TTL,
+                 max_deliveries=QUEUE_MAX_DELIVERIES):
+        self.r = r
+        self.name = name
+        self.worker_id = worker_id
+        self.heartbeat_ttl = heartbeat_ttl
+        self.max_deliveries = max_deliveries
+        self.dead_name = f"{name}:dead"
+        self.deliveries_name = "queue:deliveries"
+        self.workers_name = "queue:workers"
+        self._last_heartbeat = 0.0
+
+    def _processing_name(self, worker_id=None):
+        return f"queue:processing:{worker_id or self.worker_id}"
+
+    def _heartbeat_name(self, worker_id=None):
+        return f"queue:heartbeat:{worker_id or self.worker_id}"
+
+    # --- Productor ---
+
+    def push(self, items, pipeline=None):
+        # Con pipeline, el LPUSH se añade a las escrituras del llamador (misma ida y vuelta)
+        target = pipeline if pipeline is not None else self.r
+        return target.lpush(self.name, *items)
+
+    # --- Consumidor ---
+
+    def heartbeat(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_heartbeat < self.heartbeat_ttl / 3:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        pipe.sadd(self.workers_name, self.worker_id)
+        pipe.set(self._heartbeat_name(), time.time(), ex=self.heartbeat_ttl)
+        pipe.execute()
+        self._last_heartbeat = now
+
+    def pop(self, timeout=5):
+        # Mueve atómicamente el elemento más antiguo a la lista de procesamiento
+        self.heartbeat()
+        return self.r.blmove(self.name, self._processing_name(), timeout, "RIGHT", "LEFT")
+
+    def pop_batch(self, max_items, max_wait_ms, timeout=5, poll_interval=0.01):
+        # Espera bloqueando al primer elemento y después recoge el resto (hasta
+        # max_items o max_wait_ms) con _take, una ida y vuelta por iteración.
+        first = self.pop(timeout)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + max_wait_ms / 1000.0
+        while len(batch) < max_items:
+            items = self._take(max_items - len(batch))
+            batch.extend(items)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= max_items or remaining <= 0:
+                break
+            if not items:
+                time.sleep(min(poll_interval, remaining))
+        return batch
+
+    def _take(self, count):
+        # Hasta count elementos sin bloquear, en una sola ida y vuelta
+        pipe = self.r.pipeline(transaction=False)
+        for _ in range(count):
+            pipe.lmove(self.name, self._processing_name(), "RIGHT", "LEFT")
+        return [item for item in pipe.execute() if item is not None]
+
+    def ack(self, *items):
+        if not items:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        for item in items:
+            pipe.lrem(self._processing_name(), 1, item)
+            pipe.hdel(self.deliveries_name, item_key(item))
+        pipe.execute()
+
+    def nack(self, *items):
+        # Devuelve los elementos a pendientes para reintentarlos (por el extremo
+        # que se consume, así que son los siguientes) o los manda a la cola de
+        # muertos si ya han fallado max_deliveries veces.
+        for item in items:
+            self._requeue(self._processing_name(), item)
+
+    def dead_letter(self, item, reason=None):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.lrem(self._processing_name(), 1, item)
+        pipe.hdel(self.deliveries_name, item_key(item))
+        pipe.lpush(self.dead_name, item)
+        pipe.execute()
+
+    def _requeue(self, processing_name, item):
+        deliveries = self.r.hincrby(self.deliveries_name, item_key(item), 1)
+        pipe = self.r.pipeline(transaction=True)
+        pipe.lrem(processing_name, 1, item)
+        if deliveries >= self.max_deliveries:
+            pipe.hdel(self.deliveries_name, item_key(item))
+            pipe.lpush(self.dead_name, item)
+        else:
+            pipe.rpush(self.name, item)
+        pipe.execute()
+        return deliveries < self.max_deliveries
+
+    def requeue_own_in_flight(self):
+        # Al arrancar: lo que quedó en vuelo de una ejecución anterior de este consumidor
+        return self._reclaim_worker(self.worker_id)
+
+    def reclaim_stale(self):
+        # Recupera los elementos en vuelo de consumidores cuyo heartbeat ha caducado
+        reclaimed = 0
+        for worker_id in self.r.smembers(self.workers_name):
+            worker_id = worker_id.decode('utf-8') if isinstance(worker_id, bytes) else worker_id
+            if worker_id == self.worker_id or self.r.exists(self._heartbeat_name(worker_id)):
+                continue
+            reclaimed += self._reclaim_worker(worker_id)
+            self.r.srem(self.workers_name, worker_id)
+        return reclaimed
+
+    def _reclaim_worker(self, worker_id):
+        processing_name = self._processing_name(worker_id)
+        items = self.r.lrange(processing_name, 0, -1)
+        for item in items:
+            self._requeue(processing_name, item)
+        return len(items)
+
+    def stats(self):
+        pipe = self.r.pipeline(transaction=False)
+        pipe.llen(self.name)
+        pipe.llen(self.dead_name)
+        pipe.smembers(self.workers_name)
+        pending, dead, workers = pipe.execute()
+        pipe = self.r.pipeline(transaction=False)
+        for worker_id in workers:
+            worker_id = worker_id.decode('utf-8') if isinstance(worker_id, bytes) else worker_id
+            pipe.llen(self._processing_name(worker_id))
+        in_flight = sum(pipe.execute()) if workers else 0
+        return {"pending": pending, "in_flight": in_flight, "dead": dead, "workers": len(workers)}
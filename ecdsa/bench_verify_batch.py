@@ -0,0 +1,85 @@
+# ecdsa/bench_verify_batch.py
+# Compara el throughput de /verify (una firma por petición) con /verify_batch.
+#
+#   python bench_verify_batch.py                       # en proceso, con el test client de Flask
+#   python bench_verify_batch.py --url http://localhost:5001   # contra el servicio levantado
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+from ecdsa import SigningKey, SECP256k1
+
+# Fuera de Docker wire.py (que importa el servicio) está en common/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+
+def make_entries(count, key_count):
+    keys = [SigningKey.generate(curve=SECP256k1) for _ in range(key_count)]
+    entries = []
+    for i in range(count):
+        sk = keys[i % key_count]
+        data = f"sender:Alice,recipient:Bob,amount:{i}"
+        signature = sk.sign(hashlib.sha256(data.encode('utf-8')).digest())
+        entries.append({
+            "signed_data": signature.hex(),
+            "original_data": data,
+            "public_key": sk.get_verifying_key().to_string().hex(),
+        })
+    return entries
+
+
+def make_client(url):
+    if url:
+        import requests
+        session = requests.Session()
+        return lambda path, body: session.post(f"{url}{path}", json=body, timeout=60).json()
+
+    import contextlib
+    import io
+    from ecdsa_service import app
+    client = app.test_client()
+
+    def post(path, body):
+        # El servicio imprime cada verificación; no queremos medir la consola
+        with contextlib.redirect_stdout(io.StringIO()):
+            return client.post(path, json=body).get_json()
+    return post
+
+
+def bench_single(post, entries):
+    start = time.perf_counter()
+    for entry in entries:
+        assert post('/verify', entry)["is_valid"]
+    return time.perf_counter() - start
+
+
+def bench_batch(post, entries, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(entries), batch_size):
+        results = post('/verify_batch', {"entries": entries[i:i + batch_size]})["results"]
+        assert all(res["is_valid"] for res in results)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="URL del servicio ECDSA; si se omite se usa el test client")
+    parser.add_argument('--count', type=int, default=2000, help="número de firmas a verificar")
+    parser.add_argument('--keys', type=int, default=16, help="número de claves públicas distintas")
+    parser.add_argument('--batch-sizes', default="16,128,1024", help="tamaños de lote separados por comas")
+    args = parser.parse_args()
+
+    entries = make_entries(args.count, args.keys)
+    post = make_client(args.url)
+
+    elapsed = bench_single(post, entries)
+    print(f"/verify         {args.count / elapsed:10.1f} firmas/s  ({elapsed:.2f} s)")
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        elapsed = bench_batch(post, entries, batch_size)
+        print(f"/verify_batch {batch_size:5d} {args.count / elapsed:8.1f} firmas/s  ({elapsed:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# ecdsa/ecdsa_core.py
+# Lógica de verificación ECDSA sin dependencias de Flask, para poder usarla
+# desde el servicio, desde un pool de procesos o desde otros servicios.
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from ecdsa import SECP256k1, VerifyingKey
+from ecdsa.ellipticcurve import PointJacobi
+from ecdsa.keys import BadSignatureError
+
+# Número máximo de claves públicas parseadas que se mantienen en memoria (LRU)
+VK_CACHE_SIZE = int(os.getenv("ECDSA_VK_CACHE_SIZE", 1024))
+# A partir de este tamaño un lote se reparte entre varios procesos
+BATCH_POOL_THRESHOLD = int(os.getenv("ECDSA_BATCH_POOL_THRESHOLD", 64))
+BATCH_POOL_WORKERS = int(os.getenv("ECDSA_BATCH_POOL_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+
+
+@lru_cache(maxsize=VK_CACHE_SIZE)
+def load_verifying_key(public_key_hex):
+    # Parsear la clave y precalcular sus tablas es lo más caro de la verificación,
+    # así que se hace una sola vez por clave pública.
+    # from_string no asocia el orden de la curva al punto y precompute() lo
+    # necesita, así que se reconstruye el punto con el orden antes de precalcular.
+    point = VerifyingKey.from_string(bytes.fromhex(public_key_hex), curve=SECP256k1).pubkey.point
+    point = PointJacobi(SECP256k1.curve, point.x(), point.y(), 1, SECP256k1.order, generator=True)
+    vk = VerifyingKey.from_public_point(point, curve=SECP256k1)
+    vk.precompute()
+    return vk
+
+
+def verify_signature(signed_data_hex, original_data, public_key_hex):
+    # Devuelve True/False; las entradas mal formadas lanzan ValueError
+    public_key = load_verifying_key(public_key_hex)
+    signature = bytes.fromhex(signed_data_hex)
+    original_data_hash = hashlib.sha256(original_data.encode('utf-8')).digest()
+    try:
+        return public_key.verify(signature, original_data_hash)
+    except BadSignatureError:
+        return False
+
+
+def verify_entry(entry):
+    signed_data_hex = entry.get('signed_data')
+    original_data = entry.get('original_data')
+    public_key_hex = entry.get('public_key')
+
+    if not all([signed_data_hex, original_data, public_key_hex]):
+        return {"is_valid": False, "error": "Missing data"}
+
+    try:
+        return {"is_valid": verify_signature(signed_data_hex, original_data, public_key_hex)}
+    except Exception as e:
+        return {"is_valid": False, "error": f"Verification failed: {e}"}
+
+
+def _verify_chunk(entries):
+    return [verify_entry(entry) for entry in entries]
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BATCH_POOL_WORKERS)
+    return _pool
+
+
+def verify_batch(entries):
+    # Los lotes pequeños se verifican en el propio proceso; los grandes se
+    # reparten en trozos contiguos entre los procesos del pool y se recombinan
+    # en el mismo orden de entrada.
+    if len(entries) < BATCH_POOL_THRESHOLD or BATCH_POOL_WORKERS <= 1:
+        return _verify_chunk(entries)
+
+    # Agrupar las entradas por clave pública mantiene las cachés de cada proceso calientes
+    order = sorted(range(len(entries)), key=lambda i: entries[i].get('public_key') or '')
+    chunk_size = -(-len(order) // BATCH_POOL_WORKERS)
+    index_chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+    entry_chunks = [[entries[i] for i in chunk] for chunk in index_chunks]
+
+    results = [None] * len(entries)
+    for indexes, chunk_results in zip(index_chunks, _get_pool().map(_verify_chunk, entry_chunks)):
+        for i, result in zip(indexes, chunk_results):
+            results[i] = result
+    return results
+
+
+def cache_info():
+    info = load_verifying_key.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
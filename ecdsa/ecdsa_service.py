@@ -1,55 +1,119 @@
 # ecdsa/ecdsa_service.py
 from flask import Flask, request, jsonify
-from ecdsa import SigningKey, SECP256k1, VerifyingKey
+from ecdsa import SigningKey, SECP256k1
 import hashlib
+import logging
+import os
+from ecdsa_core import verify_signature, verify_batch, cache_info
+from instrumentation import Counter, FunctionMetric, Histogram, SIZE_BUCKETS, log_sampled
+import instrumentation
+import wire
 
 app = Flask(__name__)
+# /metrics, latencia por ruta y X-Trace-Id (ver common/instrumentation.py)
+instrumentation.instrument_app(app, "ecdsa")
+logger = instrumentation.configure_logging("ecdsa")
+
+SIGNATURES = Counter("ecdsa_signatures_total", "Firmas generadas y verificadas por resultado", ("operation", "result"))
+BATCH_SIZE = Histogram("ecdsa_batch_size", "Elementos por petición de lote", ("operation",), buckets=SIZE_BUCKETS)
+FunctionMetric("cache_requests_total", "Consultas a cachés por resultado",
+               lambda: {("verifying_key", "hit"): cache_info()["hits"], ("verifying_key", "miss"): cache_info()["misses"]},
+               ("cache", "result"), kind="counter")
+
+# Tamaño máximo de lote aceptado por /sign_batch y /verify_batch
+MAX_BATCH_SIZE = int(os.getenv("ECDSA_MAX_BATCH_SIZE", 10000))
+# Puerto de escucha con `python ecdsa_service.py`
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 5001))
 
 # Generar una clave de firma para este nodo (para la simulación)
 sk = SigningKey.generate(curve=SECP256k1)
 vk = sk.get_verifying_key()
+public_key_hex = vk.to_string().hex()
 print(f"ECDSA Service: Public Key for this node: {vk.to_string().hex()}")
 
+def sign_string(data):
+    data_hash = hashlib.sha256(data.encode('utf-8')).digest()
+    return {
+        "original_data": data,
+        # k aleatorio: firmar dos veces los mismos datos da firmas distintas, y
+        # el mempool las trata como transacciones distintas (ver mempool.py)
+        "signed_data": sk.sign(data_hash).hex(),
+        "public_key": public_key_hex
+    }
+
+# Los cuerpos de petición y respuesta pueden ser JSON o msgpack (ver wire.py)
+
 @app.route('/sign', methods=['POST'])
 def sign_data():
-    data = request.json.get('data')
+    data = (wire.request_payload(request) or {}).get('data')
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    print(f"ECDSA Service: Recibida petición para firmar: '{data}'")
-    data_hash = hashlib.sha256(data.encode('utf-8')).digest()
-    signature = sk.sign(data_hash)
+    log_sampled(logger, logging.INFO, "Recibida petición para firmar: '%s'", data)
+    SIGNATURES.labels("sign", "ok").inc()
+    return wire.respond(request, sign_string(data))
 
-    return jsonify({
-        "original_data": data,
-        "signed_data": signature.hex(),
-        "public_key": vk.to_string().hex()
-    })
+@app.route('/sign_batch', methods=['POST'])
+def sign_data_batch():
+    # Firma una lista de cadenas con una sola petición; un resultado por cadena
+    data = (wire.request_payload(request) or {}).get('data')
+    if not isinstance(data, list) or not data or not all(isinstance(d, str) and d for d in data):
+        return jsonify({"error": "Expected a non-empty list of strings in 'data'"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE})"}), 400
+
+    logger.debug("Recibida petición para firmar un lote de %d elementos", len(data))
+    BATCH_SIZE.labels("sign").observe(len(data))
+    SIGNATURES.labels("sign", "ok").inc(len(data))
+    return wire.respond(request, {"results": [sign_string(d) for d in data]})
 
 @app.route('/verify', methods=['POST'])
 def verify_data():
-    signed_data_hex = request.json.get('signed_data')
-    original_data = request.json.get('original_data')
-    public_key_hex = request.json.get('public_key')
+    payload = wire.request_payload(request) or {}
+    signed_data_hex = payload.get('signed_data')
+    original_data = payload.get('original_data')
+    public_key_hex = payload.get('public_key')
 
     if not all([signed_data_hex, original_data, public_key_hex]):
         return jsonify({"error": "Missing data"}), 400
 
     try:
-        signature = bytes.fromhex(signed_data_hex)
-        public_key = VerifyingKey.from_string(bytes.fromhex(public_key_hex), curve=SECP256k1)
-        original_data_hash = hashlib.sha256(original_data.encode('utf-8')).digest()
-
-        is_valid = public_key.verify(signature, original_data_hash)
-        print(f"ECDSA Service: Verificación de firma para '{original_data}' con resultado: {is_valid}")
-        return jsonify({"is_valid": is_valid})
+        is_valid = verify_signature(signed_data_hex, original_data, public_key_hex)
+        log_sampled(logger, logging.INFO, "Verificación de firma para '%s' con resultado: %s", original_data, is_valid)
+        SIGNATURES.labels("verify", "valid" if is_valid else "invalid").inc()
+        return wire.respond(request, {"is_valid": is_valid})
     except Exception as e:
-        print(f"ECDSA Service: Error en verificación de firma: {e}")
+        SIGNATURES.labels("verify", "error").inc()
+        logger.warning("Error en verificación de firma: %s", e)
         return jsonify({"error": f"Verification failed: {e}"}), 400
 
+@app.route('/verify_batch', methods=['POST'])
+def verify_data_batch():
+    # Acepta {"entries": [...]} o directamente una lista de entradas con
+    # signed_data, original_data y public_key; devuelve un resultado por entrada.
+    payload = wire.request_payload(request)
+    entries = payload.get('entries') if isinstance(payload, dict) else payload
+
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        return jsonify({"error": "Expected a list of entries"}), 400
+    if len(entries) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE})"}), 400
+
+    results = verify_batch(entries)
+    valid_count = sum(1 for res in results if res["is_valid"])
+    logger.debug("Verificado lote de %d firmas (%d válidas)", len(results), valid_count)
+    BATCH_SIZE.labels("verify").observe(len(results))
+    SIGNATURES.labels("verify", "valid").inc(valid_count)
+    SIGNATURES.labels("verify", "invalid").inc(len(results) - valid_count)
+    return wire.respond(request, {"results": results})
+
+@app.route('/vk_cache', methods=['GET'])
+def vk_cache_status():
+    return jsonify(cache_info()), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "service": "ECDSA"}), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
+    app.run(host='0.0.0.0', port=SERVICE_PORT)
@@ -1,6 +1,17 @@
 # flask/app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import os
+import queue
+import threading
+import time
+import uuid
+from event_stream import EventBroadcaster, format_sse
+from health import HealthAggregator
+from service_clients import CircuitOpenError, ServiceClient, create_redis, enqueue_transaction, enqueue_transactions
+from instrumentation import Counter, FunctionMetric, log_sampled
+import instrumentation
+import mempool
+import wire
 import requests # Necesitarás esta librería para hacer llamadas HTTP a otros servicios
 import json # Para parsear el JSON de la transacción si es necesario
 import redis # Para interactuar con Redis
@@ -14,21 +25,107 @@ REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 SZS_STARK_SERVICE_URL = os.getenv('SZS_STARK_SERVICE_URL', 'http://szsstark:5002')
 VALIDATOR_SERVICE_URL = os.getenv('VALIDATOR_SERVICE_URL', 'http://popv_validator:5003')
+# Cada cuántos segundos se sondea el estado de la red (un único sondeo para todos los clientes)
+STATUS_PROBE_INTERVAL = float(os.getenv('STATUS_PROBE_INTERVAL', 5))
+# Cada cuántos segundos se envía un comentario a los clientes SSE para mantener viva la conexión
+SSE_KEEPALIVE_INTERVAL = float(os.getenv('SSE_KEEPALIVE_INTERVAL', 15))
+# Máximo de clientes de /events a la vez. Cada uno ocupa un hilo de gunicorn
+# (--threads 32 en el Dockerfile), así que debe quedar por debajo del número de
+# hilos; el resto de navegadores vuelve a sondear /network_status.
+SSE_MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS', 16))
+# Timeouts (segundos) de las llamadas a cada servicio desde /send_transaction
+ECDSA_TIMEOUT = float(os.getenv('ECDSA_TIMEOUT', 2))
+SZS_STARK_TIMEOUT = float(os.getenv('SZS_STARK_TIMEOUT', 2))
+# /send_transactions: máximo de transacciones por petición y tamaño de cada
+# tanda que se firma, se prueba y se encola de una vez
+BULK_MAX_TRANSACTIONS = int(os.getenv('BULK_MAX_TRANSACTIONS', 10000))
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 500))
+# Las llamadas por lotes tardan más que las individuales
+BULK_TIMEOUT = float(os.getenv('BULK_TIMEOUT', 30))
+# Puerto de escucha con `python app.py` (en Docker se usa gunicorn)
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', 5000))
 
-# Configuración del logging para Flask (útil para ver los mensajes de print)
+# Configuración del logging para Flask: nivel con LOG_LEVEL; los logs por
+# transacción se muestrean (TRACE_LOG_SAMPLE_RATE, ver common/instrumentation.py)
 import logging
-logging.basicConfig(level=logging.INFO) # Puedes cambiar a logging.DEBUG para más detalles
-app.logger.setLevel(logging.INFO)
+instrumentation.configure_logging("gateway")
+app.logger.setLevel(instrumentation.LOG_LEVEL)
+# /metrics, latencia por ruta y X-Trace-Id (se propaga a ecdsa y szsstark)
+instrumentation.instrument_app(app, "gateway")
 
 # Conexión a Redis
 try:
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    r = create_redis(REDIS_HOST, REDIS_PORT)
     r.ping()
     app.logger.info("Flask: Conectado a Redis con éxito.")
 except Exception as e:
     app.logger.error(f"Flask: Error al conectar a Redis: {e}")
     r = None # Asegúrate de manejar el caso donde Redis no está disponible
 
+# Clientes HTTP con conexiones persistentes, reintentos y circuit breaker (ver service_clients.py)
+ecdsa_client = ServiceClient('ecdsa', ECDSA_SERVICE_URL, timeout=ECDSA_TIMEOUT)
+stark_client = ServiceClient('szsstark', SZS_STARK_SERVICE_URL, timeout=SZS_STARK_TIMEOUT)
+
+MEMPOOL_ADMISSIONS = Counter("gateway_mempool_admissions_total", "Transacciones enviadas al mempool por resultado de la admisión", ("result",))
+FunctionMetric("gateway_circuit_open", "1 si el circuit breaker hacia el servicio no está cerrado",
+               lambda: {(client.name,): int(client.breaker.state != "closed") for client in (ecdsa_client, stark_client)},
+               ("upstream",))
+
+# Resultados de admisión en el mempool que no son "queued" y su código HTTP
+ADMISSION_ERRORS = {
+    mempool.DUPLICATE: (409, "Duplicate transaction"),
+    mempool.NONCE_TOO_LOW: (409, "Nonce already used by this sender"),
+    mempool.NONCE_IN_USE: (409, "Nonce already pending for this sender"),
+    mempool.NONCE_CONFLICT: (409, "Could not assign a nonce, retry"),
+    mempool.FULL: (503, "Mempool full and fee too low to evict"),
+    mempool.INVALID: (400, "Transaction rejected by the mempool"),
+}
+
+def canonical_transaction_data(sender, recipient, amount, fee, nonce=None):
+    # Representación canónica de la transacción: es lo que se firma y lo que verifica el validador.
+    # El nonce solo se firma si lo elige el cliente; si no, se asigna al encolar.
+    data = {"sender": sender, "recipient": recipient, "amount": amount, "fee": fee}
+    if nonce is not None:
+        data["nonce"] = nonce
+    return json.dumps(data, sort_keys=True)
+
+def parse_nonce_fee(nonce, fee):
+    # Campos opcionales: devuelve (nonce o None, fee) o lanza ValueError con el motivo
+    if nonce is not None:
+        if isinstance(nonce, bool) or not isinstance(nonce, (int, str)):
+            raise ValueError("Invalid 'nonce'")
+        try:
+            nonce = int(nonce)
+        except ValueError:
+            raise ValueError("Invalid 'nonce'") from None
+        if nonce < 0:
+            raise ValueError("Invalid 'nonce'")
+    if fee is None:
+        return nonce, 0.0
+    if isinstance(fee, bool) or not isinstance(fee, (int, float, str)):
+        raise ValueError("Invalid 'fee'")
+    try:
+        fee = float(fee)
+    except ValueError:
+        raise ValueError("Invalid 'fee'") from None
+    if not 0 <= fee < float('inf'):
+        raise ValueError("Invalid 'fee'")
+    return nonce, fee
+
+def build_final_transaction(sender, recipient, amount, nonce, fee, signed_transaction, stark_proof):
+    # Combina la transacción con la prueba y la firma (campos que comprueba el validador)
+    return {
+        "sender": sender,
+        "recipient": recipient,
+        "amount": amount,
+        "nonce": nonce,
+        "fee": fee,
+        "original_data": signed_transaction.get("original_data"),
+        "signed_data": signed_transaction.get("signed_data"),
+        "public_key": signed_transaction.get("public_key"),
+        "stark_proof": stark_proof
+    }
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -36,7 +133,7 @@ def index():
 @app.route('/send_transaction', methods=['POST'])
 def send_transaction():
     try:
-        data = request.get_json() # Obtiene los datos JSON enviados desde el JavaScript
+        data = wire.request_payload(request) or {} # JSON desde el JavaScript, o msgpack (ver wire.py)
         transaction_data = data.get('transaction_data')
 
         if not transaction_data:
@@ -48,47 +145,55 @@ def send_transaction():
             # Asume que transaction_data es un string como "sender:Alice,receiver:Bob,amount:10"
             # o podrías enviarlo directamente como JSON desde el frontend para simplificar
             parts = [p.strip().split(':') for p in transaction_data.split(',')]
-            transaction_dict = {k.strip(): v.strip() for k, v in parts if len(p) == 2}
+            transaction_dict = {p[0].strip(): p[1].strip() for p in parts if len(p) == 2}
             sender = transaction_dict.get('sender')
             recipient = transaction_dict.get('recipient')
             amount = transaction_dict.get('amount')
             # Convierte amount a float o int
             try:
                 amount = float(amount)
-            except ValueError:
+            except (TypeError, ValueError):
                 return jsonify({"error": "Invalid amount format"}), 400
 
             # Validar que los campos esenciales estén presentes
             if not all([sender, recipient, amount is not None]):
                 return jsonify({"error": "Missing transaction fields (sender, recipient, amount)"}), 400
 
+            # nonce y fee opcionales, en la cadena de la transacción o en el cuerpo
+            try:
+                nonce, fee = parse_nonce_fee(transaction_dict.get('nonce', data.get('nonce')),
+                                             transaction_dict.get('fee', data.get('fee')))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            original_data = canonical_transaction_data(sender, recipient, amount, fee, nonce)
+
             # 2. Llamar al servicio ECDSA para firmar
-            ecdsa_response = requests.post(f"{ECDSA_SERVICE_URL}/sign", json={"transaction": transaction_dict})
+            ecdsa_response = ecdsa_client.post('/sign', **wire.encode_request({"data": original_data}))
             ecdsa_response.raise_for_status() # Lanza un error para códigos de estado HTTP 4xx/5xx
-            signed_transaction = ecdsa_response.json()
-            app.logger.info(f"Signed transaction from ECDSA: {signed_transaction}")
+            signed_transaction = wire.decode_response(ecdsa_response)
+            log_sampled(app.logger, logging.DEBUG, "Signed transaction from ECDSA: %s", signed_transaction)
 
 
             # 3. Llamar al servicio SZS-STARK para generar la prueba (ejemplo)
-            stark_response = requests.post(f"{SZS_STARK_SERVICE_URL}/generate_proof", json={"data": signed_transaction})
+            stark_response = stark_client.post('/generate_proof', **wire.encode_request({"signed_tx_data": signed_transaction.get("signed_data")}))
             stark_response.raise_for_status()
-            stark_proof = stark_response.json()
-            app.logger.info(f"STARK proof generated: {stark_proof}")
-
-            # Combina la transacción con la prueba y la firma
-            final_transaction = {
-                "sender": sender,
-                "recipient": recipient,
-                "amount": amount,
-                "signature": signed_transaction.get("signature"),
-                "public_key": signed_transaction.get("public_key"),
-                "stark_proof": stark_proof.get("proof")
-            }
-
-            # 4. Almacenar la transacción final en Redis como pendiente
+            stark_proof = wire.decode_response(stark_response)
+            log_sampled(app.logger, logging.DEBUG, "STARK proof generated: %s", stark_proof)
+
+            final_transaction = build_final_transaction(sender, recipient, amount, nonce, fee, signed_transaction, stark_proof)
+
+            # 4. Admitir la transacción final en el mempool (ver common/mempool.py)
             if r:
-                r.lpush('pending_transactions', json.dumps(final_transaction))
-                app.logger.info(f"Transaction added to Redis pending queue: {final_transaction}")
+                admission = enqueue_transaction(r, final_transaction)
+                MEMPOOL_ADMISSIONS.labels(admission).inc()
+                if admission != mempool.QUEUED:
+                    status_code, message = ADMISSION_ERRORS[admission]
+                    log_sampled(app.logger, logging.WARNING, "Transaction rejected by the mempool (%s): %s",
+                                admission, final_transaction.get('signed_data'))
+                    return jsonify({"error": message, "status": admission}), status_code
+                log_sampled(app.logger, logging.INFO, "Transaction added to the mempool: sender %s, nonce %s, signature %s",
+                            sender, final_transaction.get('nonce'), final_transaction.get('signed_data'))
             else:
                 app.logger.error("Redis connection not available.")
                 return jsonify({"error": "Redis not connected"}), 500
@@ -97,10 +202,13 @@ def send_transaction():
             # Si el validador necesita ser notificado, harías otra request POST aquí.
             # requests.post(f"{VALIDATOR_SERVICE_URL}/new_pending_tx")
 
-            return jsonify({"status": "Transaction received and processed", "transaction": final_transaction}), 200
+            return wire.respond(request, {"status": "Transaction received and processed", "transaction": final_transaction})
 
         except json.JSONDecodeError:
             return jsonify({"error": "Invalid JSON format in transaction data"}), 400
+        except CircuitOpenError as circuit_err:
+            app.logger.warning(f"Skipping call to unavailable service: {circuit_err}")
+            return jsonify({"error": f"Service temporarily unavailable: {circuit_err}"}), 503
         except requests.exceptions.RequestException as req_err:
             app.logger.error(f"Error communicating with external service: {req_err}")
             return jsonify({"error": f"Failed to communicate with external service: {req_err}"}), 500
@@ -112,9 +220,147 @@ def send_transaction():
         app.logger.error(f"Error processing transaction POST request: {e}", exc_info=True)
         return jsonify({"error": f"Invalid request or server error: {e}"}), 400
 
-# Añade la ruta para obtener el estado de la red (si no la tienes ya)
-@app.route('/network_status')
-def get_network_status():
+def parse_bulk_transaction(item):
+    # Devuelve (sender, recipient, amount, nonce, fee) o lanza ValueError con el motivo
+    if not isinstance(item, dict):
+        raise ValueError("Transaction must be a JSON object")
+    sender, recipient, amount = item.get('sender'), item.get('recipient'), item.get('amount')
+    if not isinstance(sender, str) or not sender.strip():
+        raise ValueError("Missing or invalid 'sender'")
+    if not isinstance(recipient, str) or not recipient.strip():
+        raise ValueError("Missing or invalid 'recipient'")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        raise ValueError("Missing or invalid 'amount'")
+    try:
+        amount = float(amount)
+    except ValueError:
+        raise ValueError("Invalid amount format") from None
+    if amount != amount or amount in (float('inf'), float('-inf')):
+        raise ValueError("Invalid amount format")
+    return (sender.strip(), recipient.strip(), amount, *parse_nonce_fee(item.get('nonce'), item.get('fee')))
+
+def read_bulk_items():
+    # JSON (lista o {"transactions": [...]}) o NDJSON, un objeto por línea.
+    # Las líneas NDJSON ilegibles se devuelven como errores por elemento.
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"Invalid JSON line: {e}"))
+        return items
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('transactions')
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array, {\"transactions\": [...]} or NDJSON")
+    return payload
+
+def process_bulk_chunk(chunk):
+    # chunk: [(índice, sender, recipient, amount, nonce, fee)]. Una llamada de
+    # firma, una de pruebas y una admisión en el mempool para toda la tanda;
+    # devuelve los resultados por elemento.
+    original_data = [canonical_transaction_data(sender, recipient, amount, fee, nonce)
+                     for _, sender, recipient, amount, nonce, fee in chunk]
+    try:
+        ecdsa_response = ecdsa_client.post('/sign_batch', **wire.encode_request({"data": original_data}),
+                                           timeout=(0.5, BULK_TIMEOUT))
+        ecdsa_response.raise_for_status()
+        signed_transactions = wire.decode_response(ecdsa_response)['results']
+        # zip() cortaría en silencio una respuesta incompleta y dejaría
+        # transacciones sin resultado: toda la tanda se marca como error
+        if len(signed_transactions) != len(chunk):
+            raise ValueError(f"ECDSA service returned {len(signed_transactions)} signatures for {len(chunk)} transactions")
+
+        stark_response = stark_client.post('/generate_proof_batch', **wire.encode_request({
+            "signed_tx_data": [signed.get("signed_data") for signed in signed_transactions]
+        }), timeout=(0.5, BULK_TIMEOUT))
+        stark_response.raise_for_status()
+        stark_proofs = wire.decode_response(stark_response)['proofs']
+        if len(stark_proofs) != len(chunk):
+            raise ValueError(f"STARK service returned {len(stark_proofs)} proofs for {len(chunk)} transactions")
+
+        final_transactions = [
+            build_final_transaction(sender, recipient, amount, nonce, fee, signed, proof)
+            for (_, sender, recipient, amount, nonce, fee), signed, proof in zip(chunk, signed_transactions, stark_proofs)
+        ]
+        if not r:
+            raise redis.exceptions.ConnectionError("Redis not connected")
+        admissions = enqueue_transactions(r, final_transactions)
+        for admission in admissions:
+            MEMPOOL_ADMISSIONS.labels(admission).inc()
+    except (requests.exceptions.RequestException, redis.exceptions.RedisError, KeyError, ValueError) as e:
+        app.logger.error(f"Error processing bulk chunk of {len(chunk)} transactions: {e}")
+        return [{"index": index, "status": "error", "error": f"Failed to process transaction: {e}"} for index, *_ in chunk]
+
+    return [
+        {"index": index, "status": "queued", "nonce": tx["nonce"], "signed_data": tx["signed_data"]}
+        if admission == mempool.QUEUED else
+        {"index": index, "status": "rejected", "reason": admission, "error": ADMISSION_ERRORS[admission][1]}
+        for (index, *_), tx, admission in zip(chunk, final_transactions, admissions)
+    ]
+
+@app.route('/send_transactions', methods=['POST'])
+def send_transactions():
+    # Envío masivo de transacciones estructuradas ({"sender", "recipient", "amount"}
+    # y, opcionalmente, "nonce" y "fee").
+    # El esquema se valida antes de llamar a ningún servicio y la respuesta es
+    # NDJSON: una línea por transacción, emitida a medida que se encola cada tanda.
+    try:
+        items = read_bulk_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not items:
+        return jsonify({"error": "No transactions provided"}), 400
+    if len(items) > BULK_MAX_TRANSACTIONS:
+        return jsonify({"error": f"Too many transactions (max {BULK_MAX_TRANSACTIONS})"}), 400
+
+    valid, invalid = [], []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            valid.append((index, *parse_bulk_transaction(item)))
+        except ValueError as e:
+            invalid.append({"index": index, "status": "rejected", "error": str(e)})
+    app.logger.info(f"Bulk submission: {len(valid)} valid, {len(invalid)} rejected")
+
+    def stream():
+        for result in invalid:
+            yield json.dumps(result) + "\n"
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            for result in process_bulk_chunk(valid[start:start + BULK_CHUNK_SIZE]):
+                yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+# Salud de los servicios: sondeo en paralelo y con caché (ver health.py)
+health = HealthAggregator({
+    'ecdsa': ECDSA_SERVICE_URL,
+    'szsstark': SZS_STARK_SERVICE_URL,
+    'popv_validator': VALIDATOR_SERVICE_URL
+})
+validator_session = requests.Session()
+FunctionMetric("cache_requests_total", "Consultas a cachés por resultado",
+               lambda: {("health", "hit"): health.hits, ("health", "stale"): health.stale_hits, ("health", "miss"): health.misses},
+               ("cache", "result"), kind="counter")
+
+def fetch_blockchain_status():
+    try:
+        validator_response = validator_session.get(f"{VALIDATOR_SERVICE_URL}/blockchain", timeout=health.timeout)
+        validator_response.raise_for_status()
+        return {'blockchain_status_from_validator': validator_response.json()}
+    except requests.exceptions.RequestException as e:
+        return {'blockchain_status_from_validator_error': f"Error fetching blockchain status from Validator: {e}"}
+
+def collect_network_status(fresh=False):
+    # fresh=True (el sondeo periódico) vuelve a sondear la salud en vez de usar
+    # la caché: con STATUS_PROBE_INTERVAL > HEALTH_CACHE_TTL cada ciclo sería un
+    # acierto obsoleto y publicaría el resultado del ciclo anterior
     status = {}
 
     # Aquí hemos comentado/eliminado las llamadas a batctl porque el contenedor Docker
@@ -125,47 +371,146 @@ def get_network_status():
     status['batman_neighbors_local'] = "N/A (check VM host with 'sudo batctl n')"
 
 
-    # Estado de comunicación entre nodos Docker (esto SÍ debería funcionar)
-    node_comm_status = {}
-    try:
-        response = requests.get(f"{ECDSA_SERVICE_URL}/status", timeout=2)
-        node_comm_status['ecdsa'] = "OK" if response.status_code == 200 else f"Error: {response.status_code}"
-    except requests.exceptions.RequestException:
-        node_comm_status['ecdsa'] = "Unreachable"
+    # El estado de la cadena se pide a la vez que se sondea la salud de los servicios
+    blockchain_future = health.executor.submit(fetch_blockchain_status)
 
-    try:
-        response = requests.get(f"{SZS_STARK_SERVICE_URL}/status", timeout=2)
-        node_comm_status['szsstark'] = "OK" if response.status_code == 200 else f"Error: {response.status_code}"
-    except requests.exceptions.RequestException:
-        node_comm_status['szsstark'] = "Unreachable"
-
-    try:
-        response = requests.get(f"{VALIDATOR_SERVICE_URL}/status", timeout=2)
-        node_comm_status['popv_validator'] = "OK" if response.status_code == 200 else f"Error: {response.status_code}"
-    except requests.exceptions.RequestException:
-        node_comm_status['popv_validator'] = "Unreachable"
-
-    status['node_communication_status'] = node_comm_status
+    # Estado de comunicación entre nodos Docker (esto SÍ debería funcionar)
+    status['node_communication_status'] = health.refresh() if fresh else health.check()
+    status['node_latency_ms'] = health.latency_percentiles()
 
     # Redis Pending Transactions (esto SÍ debería funcionar)
     if r:
         try:
-            pending_tx_count = r.llen('pending_transactions')
-            status['redis_pending_transactions'] = pending_tx_count
+            queue_stats = mempool.Mempool(r).stats()
+            status['redis_pending_transactions'] = queue_stats['pending']
+            status['redis_in_flight_transactions'] = queue_stats['in_flight']
+            status['redis_dead_letter_transactions'] = queue_stats['dead']
+            status['mempool_ready_transactions'] = queue_stats['ready']
+            status['mempool_waiting_transactions'] = queue_stats['waiting']
+            status['mempool_evicted_transactions'] = queue_stats['evicted']
         except Exception as e:
             status['redis_pending_transactions_error'] = f"Error fetching pending transactions from Redis: {e}"
     else:
         status['redis_pending_transactions_error'] = "Redis connection not available"
 
     # Blockchain Status from Validator (esto SÍ debería funcionar)
-    try:
-        validator_response = requests.get(f"{VALIDATOR_SERVICE_URL}/blockchain", timeout=5)
-        validator_response.raise_for_status()
-        status['blockchain_status_from_validator'] = validator_response.json()
-    except requests.exceptions.RequestException as e:
-        status['blockchain_status_from_validator_error'] = f"Error fetching blockchain status from Validator: {e}"
+    status.update(blockchain_future.result())
+
+    status['updated_at'] = time.time()
+    return status
+
+# --- Estado en vivo ---
+# Un único hilo por worker sondea los servicios y, con Redis disponible, solo un
+# worker de todo el despliegue lo hace en cada ciclo (lock con SET NX PX). El
+# resultado se publica en network_status_channel; otro hilo por worker escucha
+# ese canal y new_block_channel y reenvía los eventos a los clientes SSE.
+broadcaster = EventBroadcaster(max_subscribers=SSE_MAX_SUBSCRIBERS)
+FunctionMetric("gateway_sse_subscribers", "Clientes conectados a /events", broadcaster.subscriber_count)
+latest_network_status = None
+_worker_id = uuid.uuid4().hex
+_background_started = False
+_background_lock = threading.Lock()
+
+def _store_network_status(status):
+    global latest_network_status
+    latest_network_status = status
+    broadcaster.publish('status', status)
+
+def probe_network_status_forever():
+    while True:
+        started = time.monotonic()
+        try:
+            if r:
+                if r.set('network_status:probe_lock', _worker_id, nx=True, px=int(STATUS_PROBE_INTERVAL * 1000)):
+                    status = collect_network_status(fresh=True)
+                    status_json = json.dumps(status)
+                    r.set('network_status', status_json)
+                    r.publish('network_status_channel', status_json)
+            else:
+                _store_network_status(collect_network_status(fresh=True))
+        except redis.exceptions.RedisError as e:
+            app.logger.warning(f"Flask: Error publicando el estado de la red en Redis: {e}")
+            _store_network_status(collect_network_status(fresh=True))
+        except Exception as e:
+            app.logger.error(f"Flask: Error inesperado sondeando el estado de la red: {e}", exc_info=True)
+        time.sleep(max(0, STATUS_PROBE_INTERVAL - (time.monotonic() - started)))
+
+def relay_redis_events_forever():
+    while True:
+        if not r:
+            time.sleep(STATUS_PROBE_INTERVAL)
+            continue
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe('new_block_channel', 'network_status_channel')
+            for message in pubsub.listen():
+                data = json.loads(message['data'])
+                if message['channel'] == 'network_status_channel':
+                    _store_network_status(data)
+                else:
+                    # A los navegadores solo les enviamos el resumen del bloque
+                    broadcaster.publish('block', {
+                        "block_number": data.get('block_number'),
+                        "hash": data.get('hash'),
+                        "timestamp": data.get('timestamp'),
+                        "transaction_count": len(data.get('transactions', []))
+                    })
+        except Exception as e:
+            app.logger.warning(f"Flask: Suscripción a Redis interrumpida ({e}); reintentando...")
+            time.sleep(1)
+
+def ensure_background_started():
+    # Los hilos se arrancan en el primer uso, dentro de cada worker de gunicorn
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        threading.Thread(target=probe_network_status_forever, daemon=True).start()
+        threading.Thread(target=relay_redis_events_forever, daemon=True).start()
+        _background_started = True
+
+def current_network_status():
+    ensure_background_started()
+    if latest_network_status and time.time() - latest_network_status.get('updated_at', 0) < 2 * STATUS_PROBE_INTERVAL:
+        return latest_network_status
+    if r:
+        try:
+            cached = r.get('network_status')
+            if cached:
+                return json.loads(cached)
+        except redis.exceptions.RedisError:
+            pass
+    # Primer arranque o Redis caído: sondeo directo
+    return collect_network_status()
+
+# Añade la ruta para obtener el estado de la red (si no la tienes ya)
+@app.route('/network_status')
+def get_network_status():
+    return jsonify(current_network_status())
+
+@app.route('/events')
+def events():
+    # Stream SSE con eventos "status" (estado de la red) y "block" (bloque nuevo)
+    subscriber = broadcaster.subscribe()
+    if subscriber is None:
+        return jsonify({"error": "Too many live event subscribers"}), 503, {"Retry-After": "30"}
+    initial_status = current_network_status()
+
+    def stream():
+        try:
+            yield format_sse('status', initial_status)
+            while True:
+                try:
+                    yield subscriber.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
 
-    return jsonify(status)
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Que nginx no acumule el stream
+    })
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=SERVICE_PORT)
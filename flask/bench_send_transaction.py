@@ -0,0 +1,63 @@
+# flask/bench_send_transaction.py
+# Generador de carga para /send_transaction al estilo de wrk: N conexiones
+# concurrentes en lazo cerrado durante un tiempo fijo, con p50/p99 de latencia.
+#
+#   python bench_send_transaction.py --url http://localhost --connections 16 --duration 30
+#
+# Para comparar dos versiones se lanza el mismo comando contra cada una.
+import argparse
+import threading
+import time
+
+import requests
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def worker(url, deadline, latencies, errors, worker_id):
+    session = requests.Session()
+    i = 0
+    while time.perf_counter() < deadline:
+        body = {"transaction_data": f"sender:bench{worker_id},recipient:Bob,amount:{i}"}
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/send_transaction", json=body, timeout=10)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        (latencies if ok else errors).append(elapsed)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default="http://localhost")
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help="segundos de carga")
+    args = parser.parse_args()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args.url.rstrip('/'), deadline, latencies, errors, i))
+        for i in range(args.connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = len(latencies) + len(errors)
+    print(f"peticiones: {total} ({len(errors)} errores) en {args.duration:.0f} s con {args.connections} conexiones")
+    print(f"throughput: {len(latencies) / args.duration:.1f} req/s")
+    if latencies:
+        print(f"latencia p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms  max {max(latencies) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# flask/event_stream.py
+# Difusión de eventos a los navegadores conectados por Server-Sent Events.
+# Cada cliente tiene una cola acotada; si un cliente lento la llena se
+# descartan sus eventos más antiguos en vez de bloquear al resto.
+#
+# Con gunicorn gthread cada cliente conectado ocupa un hilo del worker durante
+# toda su vida: max_subscribers acota cuántos puede haber para que siempre
+# queden hilos libres para el resto de rutas.
+import json
+import queue
+import threading
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBroadcaster:
+    def __init__(self, max_queue=100, max_subscribers=None):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        # None si ya hay max_subscribers clientes conectados
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        message = format_sse(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
@@ -0,0 +1,90 @@
+# flask/health.py
+# Agregador de salud de los servicios: sondea todos los /health en paralelo con
+# una sesión HTTP persistente por servicio, guarda el resultado durante
+# HEALTH_CACHE_TTL segundos y, pasado ese tiempo, sigue sirviendo el resultado
+# anterior (hasta HEALTH_STALE_TTL) mientras lo refresca en segundo plano.
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', 2))
+HEALTH_STALE_TTL = float(os.getenv('HEALTH_STALE_TTL', 30))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 2))
+HEALTH_LATENCY_WINDOW = int(os.getenv('HEALTH_LATENCY_WINDOW', 200))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class HealthAggregator:
+    def __init__(self, services, ttl=HEALTH_CACHE_TTL, stale_ttl=HEALTH_STALE_TTL, timeout=HEALTH_PROBE_TIMEOUT):
+        self.services = dict(services) # nombre -> URL base del servicio
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        # Un hilo y una sesión por servicio: como mucho hay un sondeo en vuelo por servicio
+        self.executor = ThreadPoolExecutor(max_workers=len(self.services) + 2, thread_name_prefix="health")
+        self._sessions = {name: requests.Session() for name in self.services}
+        self._latencies = {name: deque(maxlen=HEALTH_LATENCY_WINDOW) for name in self.services}
+        self._result = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.hits = 0 # Resultado en caché y vigente
+        self.stale_hits = 0 # Resultado en caché ya caducado (se refresca en segundo plano)
+        self.misses = 0
+
+    def _probe(self, name):
+        start = time.perf_counter()
+        try:
+            response = self._sessions[name].get(f"{self.services[name]}/health", timeout=self.timeout)
+            status = "OK" if response.status_code == 200 else f"Error: {response.status_code}"
+        except requests.exceptions.RequestException:
+            status = "Unreachable"
+        self._latencies[name].append((time.perf_counter() - start) * 1000)
+        return status
+
+    def refresh(self):
+        # Sondea todos los servicios a la vez: el coste es el del más lento, no la suma
+        with self._refresh_lock:
+            futures = {name: self.executor.submit(self._probe, name) for name in self.services}
+            wait(futures.values())
+            self._result = {name: future.result() for name, future in futures.items()}
+            self._checked_at = time.monotonic()
+            return self._result
+
+    def _refresh_in_background(self):
+        if self._refresh_lock.locked():
+            return # Ya hay un refresco en curso
+        self.executor.submit(self.refresh)
+
+    def check(self):
+        age = time.monotonic() - self._checked_at
+        if self._result is not None and age < self.ttl:
+            self.hits += 1
+            return self._result
+        if self._result is not None and age < self.ttl + self.stale_ttl:
+            # stale-while-revalidate: respuesta inmediata con el último resultado
+            self.stale_hits += 1
+            self._refresh_in_background()
+            return self._result
+        self.misses += 1
+        return self.refresh()
+
+    def latency_percentiles(self):
+        stats = {}
+        for name, samples in self._latencies.items():
+            samples = list(samples)
+            if samples:
+                stats[name] = {
+                    "p50": round(percentile(samples, 50), 2),
+                    "p90": round(percentile(samples, 90), 2),
+                    "p99": round(percentile(samples, 99), 2),
+                    "samples": len(samples)
+                }
+        return stats
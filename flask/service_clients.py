@@ -0,0 +1,167 @@
+# flask/service_clients.py
+# Clientes compartidos de la pasarela hacia los demás servicios.
+#
+# ServiceClient: una sesión HTTP keep-alive por worker y servicio, con timeouts
+# propios, reintentos con backoff exponencial y jitter, y un circuit breaker
+# que corta las llamadas a un servicio caído en vez de esperar sus timeouts.
+#
+# create_redis / enqueue_transaction: conexión a Redis con pool y escrituras
+# agrupadas en un pipeline (una sola ida y vuelta). Las pendientes van al
+# mempool compartido con el validador (common/mempool.py).
+import os
+import random
+import threading
+import time
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import Histogram, inject_trace
+from mempool import Mempool
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 32))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.05))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 10))
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', 64))
+
+RETRY_STATUS_CODES = {502, 503, 504}
+
+UPSTREAM_LATENCY = Histogram("gateway_upstream_request_duration_seconds",
+                             "Latencia de las llamadas de la pasarela a otros servicios (con reintentos)",
+                             ("upstream", "path", "outcome"))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    # Subclase de RequestException para que los manejadores existentes la traten
+    # como cualquier otro fallo de comunicación.
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow_request(self):
+        # Abierto: se rechaza todo hasta reset_timeout. Semiabierto: pasa una
+        # única llamada de prueba; si sale bien el circuito se cierra.
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ServiceClient:
+    def __init__(self, name, base_url, timeout=2.0, connect_timeout=0.5, retries=HTTP_RETRIES,
+                 backoff=HTTP_RETRY_BACKOFF, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # Un pool de conexiones por worker, del tamaño del número de hilos
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, **kwargs):
+        # La traza de la petición en curso viaja en la cabecera X-Trace-Id
+        kwargs.setdefault('timeout', self.timeout)
+        inject_trace(kwargs)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self._request_with_retries(method, path, **kwargs)
+            outcome = "ok"
+            return response
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(self.name, path, outcome).observe(time.perf_counter() - start)
+
+    def _request_with_retries(self, method, path, **kwargs):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(f"{self.name}: circuit open, skipping {method} {path}")
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {self.name}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except BaseException:
+                # Cualquier otro error (p. ej. ChunkedEncodingError) también es un
+                # resultado: sin él, una llamada de prueba en semiabierto dejaría
+                # _trial_in_flight a True y el circuito abierto para siempre
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_failure()
+            if attempt < self.retries:
+                # Backoff exponencial con jitter completo para no sincronizar los reintentos
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+        raise error
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+
+def create_redis(host, port, db=0):
+    pool = redis.ConnectionPool(host=host, port=port, db=db, decode_responses=True,
+                                max_connections=REDIS_POOL_SIZE, socket_connect_timeout=1,
+                                socket_timeout=2, health_check_interval=30)
+    return redis.Redis(connection_pool=pool)
+
+
+def enqueue_transactions(r, transactions):
+    # Las transacciones sin nonce reciben el siguiente de su emisor al encolarse
+    # (después de firmar y probar); el nonce solo se consume si el mempool las
+    # admite. Los contadores de la pasarela van en la misma ida y vuelta que la
+    # admisión; devuelve el resultado de admisión de cada transacción.
+    pipe = r.pipeline(transaction=False)
+    pipe.incrby('gateway:transactions_received', len(transactions))
+    pipe.set('gateway:last_transaction_at', time.time())
+    return Mempool(r).push_transactions(transactions, pipeline=pipe)
+
+
+def enqueue_transaction(r, transaction):
+    return enqueue_transactions(r, [transaction])[0]
@@ -0,0 +1,272 @@
+# popv_validator/account_state.py
+# Saldos de las cuentas (cuenta -> saldo) en memoria, actualizados bloque a
+# bloque como los índices de chain_index.py: sync() solo aplica los bloques
+# añadidos desde la última llamada.
+#
+# Cada transferencia (sender, recipient, amount, fee) resta amount + fee al
+# emisor, suma amount al destinatario y el fee al validador del bloque. Los
+# campos se leen de original_data, que es lo que cubre la firma; una
+# transacción cuyos campos sueltos no coinciden con los firmados se rechaza.
+# Las transacciones sin emisor, destinatario o importe no cambian ningún saldo.
+#
+# El dinero solo sale del génesis (ACCOUNT_GENESIS, objeto JSON cuenta ->
+# saldo). Las demás cuentas empiezan con ACCOUNT_INITIAL_BALANCE, 0 salvo que
+# se configure otro (p. ej. en bancos de pruebas).
+#
+# Los saldos son enteros en unidades mínimas (10^-ACCOUNT_DECIMALS): sumar y
+# restar floats bloque a bloque acumularía error de redondeo. Un importe con
+# más decimales de los que admite se rechaza.
+#
+# Cada ACCOUNT_SNAPSHOT_INTERVAL bloques se escribe una instantánea compacta
+# (msgpack) en segundo plano:
+#
+#   snapshot-<altura>.msgpack   {"version", "height", "block_hash", "balances" (unidades mínimas)}
+#
+# Al arrancar se carga la instantánea más reciente que coincide con la cadena
+# (mismo hash de bloque a su altura) y se aplican solo los bloques posteriores.
+import json
+import os
+import threading
+from decimal import Decimal, InvalidOperation
+
+import msgpack
+
+ACCOUNT_STATE_DIR = os.getenv("ACCOUNT_STATE_DIR", "data/state")
+ACCOUNT_SNAPSHOT_INTERVAL = int(os.getenv("ACCOUNT_SNAPSHOT_INTERVAL", 1000))
+ACCOUNT_SNAPSHOT_KEEP = int(os.getenv("ACCOUNT_SNAPSHOT_KEEP", 3))
+ACCOUNT_INITIAL_BALANCE = float(os.getenv("ACCOUNT_INITIAL_BALANCE", 0))
+ACCOUNT_GENESIS = json.loads(os.getenv("ACCOUNT_GENESIS") or "{}")
+ACCOUNT_DECIMALS = int(os.getenv("ACCOUNT_DECIMALS", 8))
+
+# La versión 1 guardaba los saldos como floats
+SNAPSHOT_VERSION = 2
+
+# Motivos de rechazo de check()
+INSUFFICIENT_FUNDS = "insufficient_funds"
+INVALID_AMOUNT = "invalid_amount"
+UNSIGNED_FIELDS = "unsigned_fields"
+
+
+def to_units(amount):
+    # Importe -> entero de unidades mínimas, o None si no es un importe
+    # representable. Se parte del texto del número (lo que se firmó), no de su
+    # valor binario: 0.1 son exactamente 10^(ACCOUNT_DECIMALS - 1) unidades.
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return None
+    try:
+        units = Decimal(str(amount)).scaleb(ACCOUNT_DECIMALS)
+    except InvalidOperation:
+        return None
+    if not units.is_finite() or units != units.to_integral_value():
+        return None
+    return int(units)
+
+
+def from_units(units):
+    return units / 10 ** ACCOUNT_DECIMALS
+
+
+def _transfer_fields(data):
+    sender, recipient = data.get('sender'), data.get('recipient')
+    amount, fee = data.get('amount'), data.get('fee', 0)
+    if not isinstance(sender, str) or not isinstance(recipient, str) or not sender or not recipient:
+        return None
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return None
+    if isinstance(fee, bool) or not isinstance(fee, (int, float)):
+        fee = 0
+    return sender, recipient, amount, fee
+
+
+def _signed_data(transaction):
+    # original_data como objeto JSON (la representación canónica que firma la
+    # pasarela) o None si no lo es
+    try:
+        data = json.loads(transaction.get('original_data'))
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def transfer_of(transaction):
+    # (emisor, destinatario, importe, fee) firmados o None si la transacción no es una transferencia
+    data = _signed_data(transaction)
+    return _transfer_fields(data) if data is not None else None
+
+
+def matches_signed_data(transaction):
+    # Los campos sueltos de la transacción (los que usan el mempool y los
+    # clientes) tienen que ser los firmados, nonce incluido si se firmó
+    data = _signed_data(transaction) or {}
+    if _transfer_fields(transaction) != (_transfer_fields(data) if data else None):
+        return False
+    return 'nonce' not in data or data['nonce'] == transaction.get('nonce')
+
+
+class AccountState:
+    def __init__(self, directory=ACCOUNT_STATE_DIR, snapshot_interval=ACCOUNT_SNAPSHOT_INTERVAL,
+                 keep=ACCOUNT_SNAPSHOT_KEEP, initial_balance=ACCOUNT_INITIAL_BALANCE, genesis=ACCOUNT_GENESIS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.keep = keep
+        self.initial_balance = self._genesis_units("ACCOUNT_INITIAL_BALANCE", initial_balance)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._snapshot_thread = None
+        self.height = 0
+        self.ready = False # True tras la primera puesta al día completa
+        # Al cargar una instantánea se sustituye por sus saldos
+        self.balances = {account: self._genesis_units(account, amount) for account, amount in genesis.items()}
+        self.snapshot_height = 0 # Altura de la última instantánea cargada o escrita
+
+    @staticmethod
+    def _genesis_units(name, amount):
+        units = to_units(amount)
+        if units is None or units < 0:
+            raise ValueError(f"Saldo inicial no válido para {name}: {amount!r}")
+        return units
+
+    def units(self, account):
+        return self.balances.get(account, self.initial_balance)
+
+    def balance(self, account):
+        return from_units(self.units(account))
+
+    # --- Validación ---
+
+    def check(self, transactions):
+        # Separa las transacciones de un bloque candidato en aceptadas y
+        # rechazadas [(transacción, motivo)], aplicándolas en orden sobre los
+        # saldos actuales: una transferencia puede gastar lo recibido antes en
+        # el mismo bloque. Se llama con la cadena ya sincronizada (block_lock).
+        accepted, rejected, pending = [], [], {}
+        for transaction in transactions:
+            if not matches_signed_data(transaction):
+                rejected.append((transaction, UNSIGNED_FIELDS))
+                continue
+            transfer = transfer_of(transaction)
+            if transfer is None:
+                accepted.append(transaction)
+                continue
+            sender, recipient, amount, fee = transfer
+            amount, fee = to_units(amount), to_units(fee)
+            if amount is None or fee is None or amount < 0 or fee < 0:
+                rejected.append((transaction, INVALID_AMOUNT))
+                continue
+            available = pending.get(sender, self.units(sender))
+            if available < amount + fee:
+                rejected.append((transaction, INSUFFICIENT_FUNDS))
+                continue
+            pending[sender] = available - amount - fee
+            pending[recipient] = pending.get(recipient, self.units(recipient)) + amount
+            accepted.append(transaction)
+        return accepted, rejected
+
+    # --- Puesta al día ---
+
+    def _apply_block(self, block):
+        balances, initial = self.balances, self.initial_balance
+        validator_id = block.get('validator_id')
+        for transaction in block.get('transactions', []):
+            transfer = transfer_of(transaction)
+            if transfer is None:
+                continue
+            sender, recipient, amount, fee = transfer
+            amount, fee = to_units(amount), to_units(fee)
+            if amount is None or fee is None:
+                # check() no las deja entrar en un bloque
+                continue
+            balances[sender] = balances.get(sender, initial) - amount - fee
+            balances[recipient] = balances.get(recipient, initial) + amount
+            if fee and validator_id:
+                balances[validator_id] = balances.get(validator_id, initial) + fee
+        self.height = block['block_number']
+
+    def sync(self, store, blocking=True):
+        # Devuelve True si los saldos quedan al día con el almacén. Con
+        # blocking=False no espera si otro hilo ya está aplicando bloques.
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            if not self._loaded:
+                self._load_snapshot(store)
+                self._loaded = True
+            for block in store.iter_range(self.height + 1, len(store)):
+                self._apply_block(block)
+                if self.height - self.snapshot_height >= self.snapshot_interval:
+                    self._start_snapshot(block['hash'])
+            if self.height == len(store):
+                self.ready = True
+            return self.height == len(store)
+        finally:
+            self._lock.release()
+
+    # --- Instantáneas ---
+
+    def _snapshot_path(self, height):
+        return os.path.join(self.directory, f"snapshot-{height:012d}.msgpack")
+
+    def _snapshot_heights(self):
+        heights = []
+        for name in os.listdir(self.directory):
+            if name.startswith("snapshot-") and name.endswith(".msgpack"):
+                try:
+                    heights.append(int(name[len("snapshot-"):-len(".msgpack")]))
+                except ValueError:
+                    continue
+        return sorted(heights, reverse=True)
+
+    def _load_snapshot(self, store):
+        # La más reciente que siga siendo un prefijo de la cadena; las que no
+        # (cadena truncada al recuperarse de una caída) o las ilegibles se ignoran
+        for height in self._snapshot_heights():
+            if height > len(store):
+                continue
+            try:
+                with open(self._snapshot_path(height), "rb") as f:
+                    snapshot = msgpack.unpackb(f.read(), raw=False)
+            except (OSError, ValueError, msgpack.UnpackException) as e:
+                print(f"Validator: Instantánea de saldos ilegible a la altura {height}: {e}")
+                continue
+            if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("block_hash") != store.block_hash(height):
+                continue
+            self.balances = snapshot["balances"]
+            self.height = self.snapshot_height = height
+            print(f"Validator: Saldos cargados de la instantánea a la altura {height} ({len(self.balances)} cuentas).")
+            return
+
+    def _start_snapshot(self, block_hash):
+        # La copia de los saldos se hace aquí, con el lock tomado; la escritura
+        # va en otro hilo. Si la anterior no ha terminado, se espera a la siguiente.
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self.snapshot_height = self.height
+        self._snapshot_thread = threading.Thread(
+            target=self.write_snapshot, args=(self.height, block_hash, dict(self.balances)), daemon=True)
+        self._snapshot_thread.start()
+
+    def write_snapshot(self, height, block_hash, balances):
+        path = self._snapshot_path(height)
+        payload = msgpack.packb({
+            "version": SNAPSHOT_VERSION,
+            "height": height,
+            "block_hash": block_hash,
+            "balances": balances
+        }, use_bin_type=True)
+        # Escritura atómica: una caída a mitad deja, como mucho, un .tmp huérfano
+        with open(path + ".tmp", "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for old in self._snapshot_heights()[self.keep:]:
+            try:
+                os.remove(self._snapshot_path(old))
+            except OSError:
+                pass
+        return len(payload)
+
+    def wait_for_snapshot(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
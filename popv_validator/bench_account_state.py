@@ -0,0 +1,123 @@
+# popv_validator/bench_account_state.py
+# Rendimiento del estado de saldos: transferencias aplicadas por segundo,
+# coste de comprobar descubiertos, tamaño y coste de una instantánea, y tiempo
+# de recuperación al arrancar (instantánea + bloques posteriores frente a
+# aplicar la cadena entera) a medida que crece la cadena.
+#   python bench_account_state.py --blocks 1000 10000 50000 --block-size 20 --accounts 10000
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from account_state import AccountState
+from block_store import BlockStore
+
+
+def make_block(number, previous_hash, block_size, accounts, rng):
+    transactions = []
+    for i in range(block_size):
+        sender, recipient = rng.sample(accounts, 2)
+        transfer = {"sender": sender, "recipient": recipient, "amount": round(rng.uniform(0, 1), 2), "fee": 0.01}
+        transactions.append(dict(
+            transfer,
+            # Los saldos salen de lo firmado, como en la pasarela
+            original_data=json.dumps(transfer, sort_keys=True),
+            signed_data=f"{number:08x}{i:08x}",
+        ))
+    block = {
+        "timestamp": time.time(),
+        "transactions": transactions,
+        "merkle_root": "00" * 32,
+        "previous_hash": previous_hash,
+        "validator_id": "PoPV-Validator-001",
+        "block_number": number,
+    }
+    block["hash"] = hashlib.sha256(f"{number}:{previous_hash}".encode('utf-8')).hexdigest()
+    return block
+
+
+def grow(store, blocks, block_size, accounts, rng):
+    previous_hash = store.tip['hash'] if store.tip else "0"
+    for number in range(len(store) + 1, blocks + 1):
+        block = make_block(number, previous_hash, block_size, accounts, rng)
+        store.append(block)
+        previous_hash = block["hash"]
+
+
+def recover(directory, state_dir, genesis):
+    # Arranque del validador: reabrir el almacén y poner los saldos al día
+    start = time.perf_counter()
+    store = BlockStore(directory)
+    state = AccountState(state_dir, genesis=genesis)
+    state.sync(store)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blocks', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="alturas de la cadena a medir (en orden creciente)")
+    parser.add_argument('--block-size', type=int, default=20, help="transferencias por bloque")
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--snapshot-interval', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    accounts = [f"account{i}" for i in range(args.accounts)]
+    genesis = {account: 1000.0 for account in accounts}
+    directory = tempfile.mkdtemp(prefix="account_state_bench_")
+    blocks_dir = os.path.join(directory, "blocks")
+    try:
+        store = BlockStore(blocks_dir)
+        print(f"{args.block_size} transferencias por bloque, {args.accounts} cuentas, "
+              f"instantánea cada {args.snapshot_interval} bloques")
+        print(f"{'bloques':>9}{'aplicar tx/s':>15}{'check tx/s':>13}{'instantánea':>13}"
+              f"{'escribir':>11}{'arranque con inst.':>21}{'arranque sin inst.':>21}")
+        for height in args.blocks:
+            grow(store, height, args.block_size, accounts, rng)
+            transactions = height * args.block_size
+
+            # Aplicar la cadena entera (sin instantáneas)
+            state = AccountState(os.path.join(directory, f"full-{height}"), snapshot_interval=height + 1, genesis=genesis)
+            start = time.perf_counter()
+            state.sync(store)
+            apply_rate = transactions / (time.perf_counter() - start)
+
+            # Comprobar descubiertos de un bloque candidato
+            candidate = make_block(height + 1, "0", args.block_size, accounts, rng)["transactions"]
+            repeat = max(1, 20000 // args.block_size)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                state.check(candidate)
+            check_rate = repeat * args.block_size / (time.perf_counter() - start)
+
+            # Instantánea (escritura síncrona para medirla)
+            state_dir = os.path.join(directory, f"state-{height}")
+            snapshots = AccountState(state_dir, snapshot_interval=args.snapshot_interval, genesis=genesis)
+            snapshots.sync(store)
+            snapshots.wait_for_snapshot()
+            start = time.perf_counter()
+            size = snapshots.write_snapshot(state.height, store.block_hash(state.height), dict(state.balances))
+            write_ms = (time.perf_counter() - start) * 1000
+
+            # Arranque: la última instantánea periódica + los bloques posteriores
+            os.remove(snapshots._snapshot_path(state.height))
+            with_snapshot, recovered = recover(blocks_dir, state_dir, genesis)
+            assert recovered.balances == state.balances
+            without_snapshot, _ = recover(blocks_dir, os.path.join(directory, f"empty-{height}"), genesis)
+
+            print(f"{height:>9}{apply_rate:>15,.0f}{check_rate:>13,.0f}{size / 1024:>10.0f} KB"
+                  f"{write_ms:>8.1f} ms{with_snapshot * 1000:>18.1f} ms{without_snapshot * 1000:>18.1f} ms")
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# popv_validator/bench_block_production.py
+# Prueba de carga de la producción de bloques: admite transacciones firmadas en
+# el mempool y escucha new_block_channel para medir las tx/s sostenidas y la
+# latencia desde que se encola una transacción hasta que entra en un bloque.
+# Con --duplicates, una parte de los envíos repite transacciones ya enviadas
+# (carga de spam) que el mempool debe rechazar sin llegar al validador.
+#
+# Necesita el stack levantado (redis, ecdsa, szsstark y popv_validator), p. ej.
+#   VALIDATOR_PROCESSOR=batch BATCH_MAX_TRANSACTIONS=200 docker compose up
+#   python bench_block_production.py --redis-host localhost --count 5000 --rate 1000
+# Las pruebas STARK se generan aquí con szstark_core con el STARK_PROOF_KEY del
+# entorno o, si no está definido, el de docker-compose.yml por defecto.
+import argparse
+import collections
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import redis
+from ecdsa import SigningKey, SECP256k1
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Fuera de Docker los módulos compartidos están en common/ y szsstark/
+sys.path[:0] = [os.path.join(HERE, '..', 'szsstark'), os.path.join(HERE, '..', 'common')]
+os.environ.setdefault("STARK_PROOF_KEY", "popv-demo-proof-key")
+
+import szstark_core  # noqa: E402
+import wire  # noqa: E402
+from mempool import Mempool  # noqa: E402
+
+SENDERS = 50
+
+
+def make_transactions(count):
+    sk = SigningKey.generate(curve=SECP256k1)
+    public_key = sk.get_verifying_key().to_string().hex()
+    transactions = []
+    for i in range(count):
+        data = f"bench-{i}"
+        transactions.append({
+            "sender": f"bench{i % SENDERS}",
+            "nonce": i // SENDERS,
+            "fee": float(i % 10),
+            "original_data": data,
+            "signed_data": sk.sign(hashlib.sha256(data.encode('utf-8')).digest()).hex(),
+            "public_key": public_key,
+        })
+    proofs = szstark_core.generate_proofs([tx["signed_data"] for tx in transactions])
+    for transaction, proof in zip(transactions, proofs):
+        transaction["stark_proof"] = proof
+    return transactions
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--redis-host', default='localhost')
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--count', type=int, default=2000, help="transacciones a encolar")
+    parser.add_argument('--rate', type=float, default=500, help="transacciones por segundo a encolar")
+    parser.add_argument('--timeout', type=float, default=120, help="segundos máximos esperando bloques")
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help="fracción de envíos adicionales que repiten una transacción ya enviada")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=args.redis_host, port=args.redis_port, decode_responses=True)
+    mempool = Mempool(r)
+    transactions = make_transactions(args.count)
+    # Cada emisor empieza en el siguiente nonce que espera el mempool (ejecuciones anteriores)
+    senders = [f"bench{i}" for i in range(SENDERS)]
+    base_nonces = dict(zip(senders, r.hmget('mempool:nonce', senders)))
+    for tx in transactions:
+        tx['nonce'] += int(base_nonces[tx['sender']] or 0)
+    encoded = [wire.dumps_transaction(tx) for tx in transactions]
+    # Orden de envío: cada transacción una vez, más las repeticiones de spam
+    # (siempre de una ya enviada)
+    schedule = list(range(args.count))
+    for _ in range(int(args.count * args.duplicates)):
+        position = random.randrange(1, len(schedule) + 1)
+        schedule.insert(position, schedule[random.randrange(position)])
+    admissions = collections.Counter()
+    submitted_at = {}
+    latencies = []
+    block_sizes = []
+    done = threading.Event()
+
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe('new_block_channel')
+
+    def listen():
+        deadline = time.monotonic() + args.timeout
+        while len(latencies) < args.count and time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1)
+            if not message:
+                continue
+            received = time.perf_counter()
+            block = json.loads(message['data'])
+            block_sizes.append(len(block['transactions']))
+            for tx in block['transactions']:
+                sent = submitted_at.pop(tx.get('original_data'), None)
+                if sent is not None:
+                    latencies.append(received - sent)
+        done.set()
+
+    listener = threading.Thread(target=listen, daemon=True)
+    listener.start()
+
+    start = time.perf_counter()
+    interval = 1.0 / args.rate
+    for i, index in enumerate(schedule):
+        # Carga en lazo abierto: se respeta el ritmo aunque el validador se retrase
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        submitted_at.setdefault(transactions[index]['original_data'], time.perf_counter())
+        admissions[mempool.push([encoded[index]])[0]] += 1
+
+    done.wait()
+    elapsed = time.perf_counter() - start
+    if not latencies:
+        print("No se recibió ningún bloque; ¿está el validador en marcha?")
+        return
+
+    print(f"admisión en el mempool:  {dict(admissions)}")
+    print(f"transacciones en bloque: {len(latencies)}/{args.count}")
+    print(f"throughput sostenido:    {len(latencies) / elapsed:.1f} tx/s")
+    print(f"bloques:                 {len(block_sizes)} (media {statistics.mean(block_sizes):.1f} tx/bloque)")
+    print(f"latencia p50/p99/max:    {percentile(latencies, 50) * 1000:.1f} / "
+          f"{percentile(latencies, 99) * 1000:.1f} / {max(latencies) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# popv_validator/bench_block_store.py
+# Tiempo de arranque del almacén de bloques con una cadena grande, y coste de
+# las lecturas por número y por hash.
+#   python bench_block_store.py --blocks 1000000
+import argparse
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+
+from block_store import BlockStore
+
+
+def make_block(number, previous_hash):
+    block = {
+        "timestamp": time.time(),
+        "transactions": [{"original_data": f"bench-{number}", "signed_data": "00" * 64, "public_key": "00" * 64}],
+        "merkle_root": "00" * 32,
+        "previous_hash": previous_hash,
+        "validator_id": "PoPV-Validator-001",
+        "block_number": number,
+    }
+    block["hash"] = hashlib.sha256(f"{number}:{previous_hash}".encode('utf-8')).hexdigest()
+    return block
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:32s} {elapsed * 1000:10.3f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blocks', type=int, default=1000000)
+    parser.add_argument('--dir', help="directorio del almacén (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="block_store_bench_")
+    try:
+        store = BlockStore(directory)
+        previous_hash = store.tip['hash'] if store.tip else "0"
+        start = time.perf_counter()
+        for number in range(len(store) + 1, args.blocks + 1):
+            block = make_block(number, previous_hash)
+            store.append(block)
+            previous_hash = block["hash"]
+        elapsed = time.perf_counter() - start
+        print(f"escritura de {args.blocks} bloques        {elapsed:10.2f} s")
+        store.close()
+
+        store = timed("arranque (reabrir el almacén)", lambda: BlockStore(directory))
+        print(f"altura tras el arranque          {len(store):10d}")
+        numbers = [random.randint(1, args.blocks) for _ in range(1000)]
+        timed("lectura por número (1000)", lambda: [store.get(n) for n in numbers])
+        timed("primer get_by_hash (índice)", lambda: store.get_by_hash(store.tip['hash']))
+        hashes = [store.get(n)['hash'] for n in numbers]
+        timed("lectura por hash (1000)", lambda: [store.get_by_hash(h) for h in hashes])
+        store.close()
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
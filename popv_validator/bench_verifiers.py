@@ -0,0 +1,101 @@
+# popv_validator/bench_verifiers.py
+# Latencia de verificación por transacción (firma ECDSA + prueba STARK) con
+# cada backend de verifiers.py.
+#
+# Por defecto levanta ecdsa y szsstark en hilos locales para el backend "http";
+# con --ecdsa-url/--stark-url se mide contra servicios ya desplegados: exporta
+# su STARK_PROOF_KEY, porque las pruebas se generan en este proceso.
+#   python bench_verifiers.py --count 500
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Fuera de Docker los módulos compartidos están en los directorios hermanos
+sys.path[:0] = [os.path.join(HERE, '..', 'ecdsa'), os.path.join(HERE, '..', 'szsstark'), os.path.join(HERE, '..', 'common')]
+# Con los servicios en hilos locales la clave es la de este proceso
+os.environ.setdefault("STARK_PROOF_KEY", "bench-verifiers")
+
+from ecdsa import SigningKey, SECP256k1  # noqa: E402
+
+import szstark_core  # noqa: E402
+import verifiers  # noqa: E402
+
+
+def make_transactions(count):
+    sk = SigningKey.generate(curve=SECP256k1)
+    public_key = sk.get_verifying_key().to_string().hex()
+    transactions = []
+    for i in range(count):
+        data = f"bench-{i}"
+        transactions.append({
+            "original_data": data,
+            "signed_data": sk.sign(hashlib.sha256(data.encode('utf-8')).digest()).hex(),
+            "public_key": public_key,
+        })
+    proofs = szstark_core.generate_proofs([tx["signed_data"] for tx in transactions])
+    for transaction, proof in zip(transactions, proofs):
+        transaction["stark_proof"] = proof
+    return transactions
+
+
+def start_local_services():
+    from werkzeug.serving import make_server
+    import ecdsa_service
+    import szstark_service
+    urls = []
+    for app in (ecdsa_service.app, szstark_service.app):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        urls.append(f"http://127.0.0.1:{server.server_port}")
+    return urls
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench(verifier, transactions):
+    latencies = []
+    for transaction in transactions:
+        start = time.perf_counter()
+        assert verifier.verify_signature(transaction) and verifier.verify_proof(transaction)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=500, help="transacciones a verificar por backend")
+    parser.add_argument('--ecdsa-url')
+    parser.add_argument('--stark-url')
+    parser.add_argument('--backends', default="http,local,process")
+    args = parser.parse_args()
+
+    transactions = make_transactions(args.count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ecdsa_url, stark_url = (args.ecdsa_url, args.stark_url) if args.ecdsa_url else start_local_services()
+
+    for backend in args.backends.split(','):
+        if backend == "http":
+            verifier = verifiers.HttpVerifier(ecdsa_url, stark_url)
+        else:
+            verifier = verifiers.get_verifier(backend)
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Las claves se cachean; la primera transacción no es representativa
+            bench(verifier, transactions[:1])
+            latencies = bench(verifier, transactions)
+        verifier.close()
+        print(f"{backend:8s} p50 {percentile(latencies, 50) * 1000:7.3f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:7.3f} ms  "
+              f"{len(latencies) / sum(latencies):8.1f} tx/s")
+
+
+if __name__ == '__main__':
+    main()
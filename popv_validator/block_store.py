@@ -0,0 +1,169 @@
+# popv_validator/block_store.py
+# Almacén persistente de bloques, solo de escritura al final (append-only).
+#
+#   blocks.dat  registros [longitud u32 big-endian][bloque en JSON]
+#   blocks.idx  un registro de tamaño fijo por bloque: [offset u64][longitud u32][hash 32 bytes]
+#
+# El bloque N ocupa la posición N-1 del índice, así que buscar por número es
+# O(1) y reconstruir la punta de la cadena al arrancar solo lee el último
+# registro. Las lecturas van por mmap y en RAM solo se guarda una cola con los
+# bloques más recientes.
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+
+BLOCK_STORE_DIR = os.getenv("BLOCK_STORE_DIR", "data/blocks")
+BLOCK_STORE_TAIL = int(os.getenv("BLOCK_STORE_TAIL", 128))
+BLOCK_STORE_FSYNC = os.getenv("BLOCK_STORE_FSYNC", "0") == "1"
+
+_LENGTH = struct.Struct(">I")
+_INDEX_ENTRY = struct.Struct(">QI32s")
+
+
+class BlockStore:
+    def __init__(self, directory=BLOCK_STORE_DIR, tail_size=BLOCK_STORE_TAIL, fsync=BLOCK_STORE_FSYNC):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._data = open(os.path.join(directory, "blocks.dat"), "a+b")
+        self._index = open(os.path.join(directory, "blocks.idx"), "a+b")
+        self._data_map = None
+        self._index_map = None
+        self._hash_index = None # Se construye la primera vez que se busca por hash
+        self._recover()
+        self._tail = deque(maxlen=tail_size)
+        for number in range(max(1, self._height - tail_size + 1), self._height + 1):
+            self._tail.append(self._read(number))
+
+    def _recover(self):
+        # Descarta lo que haya quedado a medias tras una caída: registros de
+        # índice incompletos o que apuntan fuera del fichero de datos, y datos
+        # escritos después del último bloque indexado.
+        data_size = os.fstat(self._data.fileno()).st_size
+        height = os.fstat(self._index.fileno()).st_size // _INDEX_ENTRY.size
+        while height:
+            offset, length, _ = self._index_entry_from_file(height)
+            if offset + _LENGTH.size + length <= data_size:
+                break
+            height -= 1
+        self._index.truncate(height * _INDEX_ENTRY.size)
+        data_end = 0
+        if height:
+            offset, length, _ = self._index_entry_from_file(height)
+            data_end = offset + _LENGTH.size + length
+        self._data.truncate(data_end)
+        self._height = height
+        self._data_end = data_end
+
+    def _index_entry_from_file(self, number):
+        self._index.seek((number - 1) * _INDEX_ENTRY.size)
+        return _INDEX_ENTRY.unpack(self._index.read(_INDEX_ENTRY.size))
+
+    def _remap(self):
+        # mmap tiene tamaño fijo: se vuelve a mapear cuando los ficheros crecen
+        if self._data_map is not None:
+            self._data_map.close()
+            self._index_map.close()
+        self._data.flush()
+        self._index.flush()
+        self._data_map = mmap.mmap(self._data.fileno(), self._data_end, access=mmap.ACCESS_READ)
+        self._index_map = mmap.mmap(self._index.fileno(), self._height * _INDEX_ENTRY.size, access=mmap.ACCESS_READ)
+
+    def _index_entry(self, number):
+        if self._index_map is None or len(self._index_map) < number * _INDEX_ENTRY.size:
+            self._remap()
+        return _INDEX_ENTRY.unpack_from(self._index_map, (number - 1) * _INDEX_ENTRY.size)
+
+    def _read(self, number):
+        offset, length, _ = self._index_entry(number)
+        start = offset + _LENGTH.size
+        return json.loads(self._data_map[start:start + length])
+
+    def __len__(self):
+        return self._height
+
+    @property
+    def tip(self):
+        # Con BLOCK_STORE_TAIL=0 no hay cola en RAM: se lee del disco
+        with self._lock:
+            if self._tail:
+                return self._tail[-1]
+            return self.get(self._height) if self._height else None
+
+    def append(self, block):
+        payload = json.dumps(block, separators=(',', ':')).encode('utf-8')
+        block_hash = bytes.fromhex(block['hash'])
+        with self._lock:
+            offset = self._data_end
+            # Primero los datos y después el índice: si el proceso cae entre las
+            # dos escrituras, _recover() descarta el bloque sin indexar.
+            self._data.write(_LENGTH.pack(len(payload)) + payload)
+            self._data.flush()
+            if self.fsync:
+                os.fsync(self._data.fileno())
+            self._index.write(_INDEX_ENTRY.pack(offset, len(payload), block_hash))
+            self._index.flush()
+            if self.fsync:
+                os.fsync(self._index.fileno())
+            self._data_end = offset + _LENGTH.size + len(payload)
+            self._height += 1
+            if self._hash_index is not None:
+                self._hash_index[block_hash] = self._height
+            self._tail.append(block)
+
+    def get(self, block_number):
+        with self._lock:
+            if block_number < 1 or block_number > self._height:
+                return None
+            tail_start = self._height - len(self._tail) + 1
+            if block_number >= tail_start:
+                return self._tail[block_number - tail_start]
+            return self._read(block_number)
+
+    def block_hash(self, block_number):
+        # Hash de un bloque leído directamente del índice, sin decodificar el bloque
+        with self._lock:
+            if block_number < 1 or block_number > self._height:
+                return None
+            return self._index_entry(block_number)[2].hex()
+
+    def _build_hash_index(self):
+        if not self._height:
+            self._hash_index = {}
+            return
+        if self._index_map is None or len(self._index_map) < self._height * _INDEX_ENTRY.size:
+            self._remap()
+        hash_offset = _INDEX_ENTRY.size - 32
+        index_map = self._index_map
+        self._hash_index = {
+            index_map[pos + hash_offset:pos + _INDEX_ENTRY.size]: number
+            for number, pos in enumerate(range(0, self._height * _INDEX_ENTRY.size, _INDEX_ENTRY.size), start=1)
+        }
+
+    def get_by_hash(self, block_hash):
+        try:
+            key = bytes.fromhex(block_hash)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            if self._hash_index is None:
+                self._build_hash_index()
+            number = self._hash_index.get(key)
+        return self.get(number) if number else None
+
+    def iter_range(self, start, end):
+        # Bloques con número en [start, end], en orden
+        for number in range(max(1, start), min(end, self._height) + 1):
+            yield self.get(number)
+
+    def close(self):
+        with self._lock:
+            if self._data_map is not None:
+                self._data_map.close()
+                self._index_map.close()
+            self._data.close()
+            self._index.close()
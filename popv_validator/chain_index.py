@@ -0,0 +1,153 @@
+# popv_validator/chain_index.py
+# Índices secundarios sobre el almacén de bloques (transacción por firma,
+# transacciones por emisor y estadísticas de la cadena). Se construyen de forma
+# incremental: sync() solo indexa los bloques añadidos desde la última llamada.
+#
+# Los índices viven en SQLite (CHAIN_INDEX_DIR/index.sqlite3), no en RAM: su
+# tamaño no depende de la memoria y, al arrancar, solo hay que indexar los
+# bloques posteriores a la última altura guardada.
+#
+#   signatures   firma -> (número de bloque, posición en el bloque)
+#   senders      (emisor, orden) -> (número de bloque, posición); orden es la
+#                posición de la transacción entre las del emisor
+#   sender_counts emisor -> transacciones
+#   meta         altura indexada, hash de su bloque y estadísticas
+#
+# Si la cadena ya no contiene el último bloque indexado (el almacén descartó
+# bloques a medias tras una caída), el índice se reconstruye desde cero.
+import os
+import sqlite3
+import threading
+
+CHAIN_INDEX_DIR = os.getenv("CHAIN_INDEX_DIR", "data/index")
+CHAIN_INDEX_COMMIT_BLOCKS = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    signature TEXT PRIMARY KEY, block INTEGER NOT NULL, position INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS senders (
+    sender TEXT NOT NULL, seq INTEGER NOT NULL, block INTEGER NOT NULL, position INTEGER NOT NULL,
+    PRIMARY KEY (sender, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sender_counts (sender TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+"""
+_META_FIELDS = ("height", "block_hash", "transaction_count", "sender_count", "first_timestamp", "last_timestamp")
+
+
+class ChainIndex:
+    def __init__(self, directory=CHAIN_INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._loaded = False
+        self.ready = False # True tras la primera puesta al día completa
+        self._load_meta()
+
+    @staticmethod
+    def sender_of(transaction):
+        # Las transacciones de la pasarela llevan "sender"; si no, se usa la clave pública
+        return transaction.get('sender') or transaction.get('public_key')
+
+    def _load_meta(self):
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        self.height = meta.get("height", 0)
+        self.block_hash = meta.get("block_hash")
+        self.transaction_count = meta.get("transaction_count", 0)
+        self.sender_count = meta.get("sender_count", 0)
+        self.first_timestamp = meta.get("first_timestamp")
+        self.last_timestamp = meta.get("last_timestamp")
+
+    def _reset(self):
+        with self._db:
+            for table in ("signatures", "senders", "sender_counts", "meta"):
+                self._db.execute(f"DELETE FROM {table}")
+        self._load_meta()
+
+    def _add_block(self, block):
+        number = block['block_number']
+        transactions = block.get('transactions', [])
+        signatures, senders, counts = [], [], {}
+        for position, transaction in enumerate(transactions):
+            signature = transaction.get('signed_data')
+            if signature:
+                signatures.append((signature, number, position))
+            sender = self.sender_of(transaction)
+            if sender:
+                if sender not in counts:
+                    row = self._db.execute("SELECT count FROM sender_counts WHERE sender = ?", (sender,)).fetchone()
+                    counts[sender] = row[0] if row else 0
+                    if row is None:
+                        self.sender_count += 1
+                senders.append((sender, counts[sender], number, position))
+                counts[sender] += 1
+        self._db.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)", signatures)
+        self._db.executemany("INSERT INTO senders VALUES (?, ?, ?, ?)", senders)
+        self._db.executemany("INSERT OR REPLACE INTO sender_counts VALUES (?, ?)", counts.items())
+        self.transaction_count += len(transactions)
+        if self.first_timestamp is None:
+            self.first_timestamp = block.get('timestamp')
+        self.last_timestamp = block.get('timestamp')
+        self.height = number
+        self.block_hash = block.get('hash')
+
+    def _commit(self):
+        self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                             [(field, getattr(self, field)) for field in _META_FIELDS])
+        self._db.commit()
+
+    def sync(self, store, blocking=True):
+        # Devuelve True si el índice queda al día con el almacén. Con
+        # blocking=False no espera si otro hilo ya está indexando.
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            if not self._loaded:
+                if self.height and (self.height > len(store) or store.block_hash(self.height) != self.block_hash):
+                    print(f"Validator: El índice de la cadena (altura {self.height}) no coincide con el almacén; se reconstruye.")
+                    self._reset()
+                self._loaded = True
+            try:
+                for block in store.iter_range(self.height + 1, len(store)):
+                    self._add_block(block)
+                    # En una reconstrucción larga el progreso se guarda por tramos
+                    if self.height % CHAIN_INDEX_COMMIT_BLOCKS == 0:
+                        self._commit()
+                self._commit()
+            except BaseException:
+                self._db.rollback()
+                self._load_meta()
+                raise
+            if self.height == len(store):
+                self.ready = True
+            return self.height == len(store)
+        finally:
+            self._lock.release()
+
+    # --- Consultas ---
+
+    def locate(self, signature):
+        # (número de bloque, posición) de la transacción con esa firma, o None
+        with self._lock:
+            return self._db.execute("SELECT block, position FROM signatures WHERE signature = ?",
+                                    (signature,)).fetchone()
+
+    def __contains__(self, signature):
+        return self.locate(signature) is not None
+
+    def sender_page(self, sender, cursor, limit):
+        # ([(número de bloque, posición), ...] desde la posición cursor, total del emisor)
+        with self._lock:
+            row = self._db.execute("SELECT count FROM sender_counts WHERE sender = ?", (sender,)).fetchone()
+            page = self._db.execute("SELECT block, position FROM senders WHERE sender = ? AND seq >= ? "
+                                    "ORDER BY seq LIMIT ?", (sender, cursor, limit)).fetchall()
+        return page, row[0] if row else 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -2,27 +2,108 @@
 
 import time
 import json
+import logging
 import redis
-import requests
 import hashlib
 import os
-from threading import Thread, Event
-from flask import Flask, jsonify
+import asyncio
+import aiohttp
+import redis.asyncio as aioredis
+from threading import Event, Lock, Thread
+from verifiers import VerifierUnavailableError, get_verifier
+from mempool import Mempool
+from work_queue import default_worker_id
+import wire
+from account_state import AccountState
+from block_store import BlockStore
+from chain_index import ChainIndex
+from response_cache import ResponseCache
+from flask import Flask, Response, jsonify, request
+from instrumentation import (Counter, FunctionMetric, Histogram, RateMeter, SIZE_BUCKETS, inject_trace,
+                             log_sampled, start_trace)
+import instrumentation
 
 app_flask = Flask(__name__)
+# /metrics, latencia por ruta y X-Trace-Id (ver common/instrumentation.py). Cada
+# transacción o lote abre su propia traza, que se propaga a ecdsa y szsstark.
+instrumentation.instrument_app(app_flask, "popv_validator")
+logger = instrumentation.configure_logging("popv_validator")
 
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 ECDSA_SERVICE_URL = os.getenv("ECDSA_SERVICE_URL")
 SZS_STARK_SERVICE_URL = os.getenv("SZS_STARK_SERVICE_URL")
 
-blockchain = []
+# Procesador de transacciones: "single" (una transacción por bloque), "batch"
+# (varias por bloque) o "async" (validaciones concurrentes, un bloque por transacción)
+VALIDATOR_PROCESSOR = os.getenv("VALIDATOR_PROCESSOR", "single")
+# Consumidores del mempool (hilos); cada uno tiene su propia lista de
+# transacciones en vuelo (ver common/mempool.py y common/work_queue.py)
+VALIDATOR_WORKERS = int(os.getenv("VALIDATOR_WORKERS", 1))
+# Cada cuánto se devuelven a la cola las transacciones de consumidores caídos
+QUEUE_RECLAIM_INTERVAL = float(os.getenv("QUEUE_RECLAIM_INTERVAL", 10))
+# Espera tras devolver una transacción a la cola porque un verificador no responde
+QUEUE_RETRY_DELAY = 1
+# Modo "batch": máximo de transacciones por bloque y espera máxima para completar el lote
+BATCH_MAX_TRANSACTIONS = int(os.getenv("BATCH_MAX_TRANSACTIONS", 100))
+BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", 200))
+BATCH_POLL_INTERVAL = 0.01
+# Modo "async": transacciones en vuelo como máximo (al llegar al límite se deja
+# de leer de Redis) y conexiones HTTP simultáneas por servicio.
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", 64))
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 16))
+ASYNC_REQUEST_TIMEOUT = float(os.getenv("ASYNC_REQUEST_TIMEOUT", 2))
+# API de consulta: tamaño máximo de página y respuestas serializadas en caché
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", 100))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 512))
+# Puerto de la API HTTP
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 5003))
+
+# Backend de verificación según VERIFIER_BACKEND. Va antes que cualquier hilo:
+# el backend "process" hace fork de su pool al crearse.
+verifier = get_verifier()
+print(f"Validator: Backend de verificación: {verifier.name}")
+
+# Cadena persistente en disco; solo los últimos bloques se mantienen en RAM
+blockchain = BlockStore()
+print(f"Validator: Cadena cargada de {blockchain.directory} con {len(blockchain)} bloques.")
+# Índices secundarios en disco; se ponen al día en segundo plano desde la
+# última altura indexada
+chain_index = ChainIndex()
+Thread(target=chain_index.sync, args=(blockchain,), daemon=True).start()
+# Saldos de las cuentas: instantánea más reciente y bloques posteriores, en segundo plano
+account_state = AccountState()
+Thread(target=account_state.sync, args=(blockchain,), daemon=True).start()
+response_cache = ResponseCache(QUERY_CACHE_SIZE)
 r = None # Inicializamos r como global None aquí
 
+# --- Métricas ---
+TRANSACTIONS = Counter("validator_transactions_total", "Transacciones procesadas por resultado", ("result",))
+BLOCKS = Counter("validator_blocks_total", "Bloques sellados")
+BLOCK_SIZE = Histogram("validator_block_transactions", "Transacciones por bloque", buckets=SIZE_BUCKETS)
+VERIFY_LATENCY = Histogram("validator_verify_duration_seconds", "Latencia de verificación por backend",
+                           ("backend", "check", "mode"))
+block_rate = RateMeter(60)
+FunctionMetric("validator_blocks_per_second", "Bloques sellados por segundo (media del último minuto)", block_rate.rate)
+FunctionMetric("validator_chain_height", "Altura de la cadena", lambda: len(blockchain))
+FunctionMetric("validator_accounts", "Cuentas con saldo conocido", lambda: len(account_state.balances))
+FunctionMetric("cache_requests_total", "Consultas a cachés por resultado",
+               lambda: {("response", "hit"): response_cache.hits, ("response", "miss"): response_cache.misses},
+               ("cache", "result"), kind="counter")
+
+def mempool_depth():
+    if r is None:
+        return {}
+    stats = Mempool(r).stats()
+    return {(state,): stats[state] for state in ("ready", "waiting", "in_flight", "dead")}
+
+FunctionMetric("mempool_transactions", "Transacciones del mempool por estado", mempool_depth, ("state",))
+
 def connect_to_redis():
     global r # Declara que vamos a modificar la variable global r
     try:
-        r_temp = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_connect_timeout=1)
+        # Sin decode_responses: las transacciones de la cola pueden venir en binario (ver wire.py)
+        r_temp = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0, socket_connect_timeout=1)
         r_temp.ping()
         r = r_temp # Asigna a la variable global
         print("Validator: Conectado a Redis con éxito.")
@@ -35,133 +116,659 @@ def connect_to_redis():
 connect_to_redis() # Intentar conectar al inicio
 
 stop_event = Event()
+block_lock = Lock()
+
+# Logs por transacción: muestreados y filtrados por nivel (ver common/instrumentation.py)
+
+def verify_ecdsa_signature(transaction):
+    if transaction.get('signed_data') and transaction.get('original_data') and transaction.get('public_key'):
+        with VERIFY_LATENCY.labels(verifier.name, "signature", "single").time():
+            is_valid = verifier.verify_signature(transaction)
+        if not is_valid:
+            log_sampled(logger, logging.INFO, "Firma ECDSA inválida: %s", transaction.get('original_data'))
+            return False
+        return True
+    log_sampled(logger, logging.INFO, "Datos de firma incompletos o ausentes, asumiendo inválida.")
+    return False
+
+def verify_ecdsa_signatures(transactions):
+    # Las transacciones sin datos de firma no llegan al backend
+    has_signature = [bool(tx.get('signed_data') and tx.get('original_data') and tx.get('public_key')) for tx in transactions]
+    complete = [tx for tx, ok in zip(transactions, has_signature) if ok]
+    with VERIFY_LATENCY.labels(verifier.name, "signature", "batch").time():
+        results = iter(verifier.verify_signatures(complete) if complete else [])
+    return [next(results) if ok else False for ok in has_signature]
+
+def verify_stark_proof(transaction):
+    if transaction.get('stark_proof'):
+        with VERIFY_LATENCY.labels(verifier.name, "proof", "single").time():
+            is_valid = verifier.verify_proof(transaction)
+        if not is_valid:
+            log_sampled(logger, logging.INFO, "Prueba STARK inválida: %s", transaction.get('original_data'))
+            return False
+    else:
+        log_sampled(logger, logging.DEBUG, "No hay prueba STARK para verificar.")
+    return True
 
-def validate_and_process_transactions():
+def verify_stark_proofs(transactions):
+    # Las transacciones sin prueba no llegan al backend
+    with_proof = [tx for tx in transactions if tx.get('stark_proof')]
+    with VERIFY_LATENCY.labels(verifier.name, "proof", "batch").time():
+        results = iter(verifier.verify_proofs(with_proof) if with_proof else [])
+    stark_results = []
+    for transaction in transactions:
+        if not transaction.get('stark_proof'):
+            log_sampled(logger, logging.DEBUG, "No hay prueba STARK para verificar.")
+            stark_results.append(True)
+        elif not next(results):
+            log_sampled(logger, logging.INFO, "Prueba STARK inválida: %s", transaction.get('original_data'))
+            stark_results.append(False)
+        else:
+            stark_results.append(True)
+    return stark_results
+
+def check_popv(transaction):
+    # Lógica de consenso PoPV (EJEMPLO SIMPLE: solo acepta números pares)
+    log_sampled(logger, logging.DEBUG, "Aplicando lógica PoPV para '%s'...", transaction.get('original_data'))
+    if transaction.get('original_data') and isinstance(transaction['original_data'], str) and transaction['original_data'].isdigit():
+        if int(transaction['original_data']) % 2 != 0:
+            log_sampled(logger, logging.INFO, "PoPV falló: la transacción contiene un número impar (%s).", transaction['original_data'])
+            return False
+        log_sampled(logger, logging.DEBUG, "PoPV OK: la transacción contiene un número par (%s).", transaction['original_data'])
+    else:
+        log_sampled(logger, logging.DEBUG, "PoPV OK: la transacción no es numérica o no requiere esta validación.")
+    return True
+
+def transaction_hash(transaction):
+    # Hash sobre la codificación canónica de la transacción (ver wire.py)
+    return wire.transaction_digest(transaction)
+
+def merkle_root(tx_hashes):
+    # Raíz de Merkle sobre los hashes de las transacciones (se duplica el último nodo si el nivel es impar)
+    if not tx_hashes:
+        return hashlib.sha256(b"").hexdigest()
+    level = [bytes.fromhex(h) for h in tx_hashes]
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+def create_block(transactions):
+    block_data = {
+        "timestamp": time.time(),
+        "transactions": transactions,
+        "merkle_root": merkle_root([transaction_hash(tx) for tx in transactions]),
+        "previous_hash": blockchain.tip['hash'] if blockchain.tip else "0",
+        "validator_id": "PoPV-Validator-001",
+        "block_number": len(blockchain) + 1
+    }
+    # La cabecera canónica incluye merkle_root, que ya compromete las transacciones
+    block_data['hash'] = wire.block_digest(block_data)
+    blockchain.append(block_data)
+    BLOCKS.inc()
+    BLOCK_SIZE.observe(len(transactions))
+    TRANSACTIONS.labels("sealed").inc(len(transactions))
+    block_rate.mark()
+    # Si el índice se está construyendo en otro hilo, la próxima consulta lo pondrá al día
+    chain_index.sync(blockchain, blocking=False)
+    account_state.sync(blockchain)
+    return block_data
+
+def seal_block(transactions):
+    # Con varios consumidores los bloques se añaden de uno en uno. Una
+    # transacción devuelta a la cola desde un consumidor caído puede estar ya en
+    # la cadena (si murió tras sellarla y antes del ack): se omite. Las que
+    # dejarían al emisor en descubierto se descartan (ver account_state.py).
+    with block_lock:
+        chain_index.sync(blockchain)
+        account_state.sync(blockchain)
+        fresh, seen = [], set()
+        for transaction in transactions:
+            signature = transaction.get('signed_data')
+            if signature and (signature in seen or signature in chain_index):
+                TRANSACTIONS.labels("duplicate").inc()
+                log_sampled(logger, logging.INFO, "Transacción ya incluida en la cadena, se omite: %s", transaction.get('original_data', 'N/A'))
+                continue
+            seen.add(signature)
+            fresh.append(transaction)
+        fresh, rejected = account_state.check(fresh)
+        for transaction, reason in rejected:
+            TRANSACTIONS.labels(reason).inc()
+            log_sampled(logger, logging.INFO, "Transacción rechazada (%s), saldo de %s: %s: %s", reason, transaction.get('sender'),
+                        account_state.balance(transaction.get('sender')), transaction.get('original_data', 'N/A'))
+        return create_block(fresh) if fresh else None
+
+def worker_queue(queue, worker_id):
+    # La conexión global se recrea tras un error de Redis y la cola con ella. Al
+    # (re)crearla, lo que este consumidor tenía en vuelo vuelve a pendientes.
+    if queue is None or queue.r is not r:
+        queue = Mempool(r, worker_id=worker_id)
+        requeued = queue.requeue_own_in_flight()
+        if requeued:
+            print(f"Validator: {requeued} transacciones en vuelo de {worker_id} devueltas a la cola.")
+    return queue
+
+def publish_block(block_data):
+    if r:
+        r.publish('new_block_channel', json.dumps(block_data)) # Opcional: notificar otros servicios
+
+def validate_and_process_transactions(worker_index=0):
     global r # ¡Añade esta línea! Declara que vamos a usar y posiblemente modificar la variable global r
-    print("Validator: Iniciando procesador de transacciones...")
+    worker_id = default_worker_id(worker_index)
+    queue = None
+    print(f"Validator: Iniciando procesador de transacciones ({worker_id})...")
     while not stop_event.is_set():
         if r is None: # Comprueba si r es None
             if not connect_to_redis(): # Si r es None, intenta conectar
                 time.sleep(1) # Espera un poco antes de reintentar si la conexión falla
                 continue # Vuelve al inicio del bucle
 
+        queue_item = None
         try:
             # Ahora que r debería estar conectado, intentamos usarlo
-            item = r.blpop('pending_transactions', timeout=5)
-            if item:
-                queue_name, transaction_json = item
-                transaction = json.loads(transaction_json)
-                print(f"\nValidator: Recibida transacción de Redis: {transaction.get('original_data', 'N/A')}")
-
-                is_valid = True # Asume válido hasta que se demuestre lo contrario
-
-                # 1. Verificar firma ECDSA
-                # ... (resto de tu lógica de validación) ...
-                if transaction.get('signed_data') and transaction.get('original_data') and transaction.get('public_key'):
-                    try:
-                        verify_response = requests.post(
-                            f"{ECDSA_SERVICE_URL}/verify",
-                            json={
-                                'signed_data': transaction['signed_data'],
-                                'original_data': transaction['original_data'],
-                                'public_key': transaction['public_key']
-                            },
-                            timeout=2
-                        )
-                        verify_response.raise_for_status()
-                        ecdsa_valid = verify_response.json().get('is_valid')
-                        if not ecdsa_valid:
-                            is_valid = False
-                            print("Validator: Firma ECDSA inválida.")
-                    except requests.exceptions.RequestException as e:
-                        print(f"Validator: Error al verificar firma ECDSA ({ECDSA_SERVICE_URL}): {e}")
-                        is_valid = False
-                else:
-                    print("Validator: Datos de firma incompletos o ausentes, asumiendo inválida.")
-                    is_valid = False
-
-                # 2. Verificar prueba STARK (si existe)
-                if transaction.get('stark_proof'):
-                    try:
-                        verify_stark_response = requests.post(
-                            f"{SZS_STARK_SERVICE_URL}/verify_proof",
-                            json={
-                                'proof_data': transaction['stark_proof'],
-                                'original_data': transaction['original_data']
-                            },
-                            timeout=2
-                        )
-                        verify_stark_response.raise_for_status()
-                        stark_valid = verify_stark_response.json().get('is_valid')
-                        if not stark_valid:
-                            is_valid = False
-                            print("Validator: Prueba STARK inválida.")
-                    except requests.exceptions.RequestException as e:
-                        print(f"Validator: Error al verificar prueba STARK ({SZS_STARK_SERVICE_URL}): {e}")
-                        is_valid = False
-                else:
-                    print("Validator: No hay prueba STARK para verificar.")
-
-                # 3. Aplicar lógica de consenso PoPV (EJEMPLO SIMPLE: solo acepta números pares)
-                print(f"Validator: Aplicando lógica PoPV para '{transaction.get('original_data')}'...")
-                if transaction.get('original_data') and isinstance(transaction['original_data'], str) and transaction['original_data'].isdigit():
-                    if int(transaction['original_data']) % 2 != 0:
-                        is_valid = False
-                        print(f"Validator: PoPV falló: la transacción contiene un número impar ({transaction['original_data']}).")
-                    else:
-                        print(f"Validator: PoPV OK: la transacción contiene un número par ({transaction['original_data']}).")
-                else:
-                    print("Validator: PoPV OK: la transacción no es numérica o no requiere esta validación.")
+            queue = worker_queue(queue, worker_id)
+            queue_item = queue.pop(timeout=5)
+            if queue_item:
+                start_trace()
+                try:
+                    transaction = wire.loads_transaction(queue_item)
+                except wire.WireFormatError as e:
+                    logger.warning("Error al decodificar transacción de Redis: %s. Mensaje enviado a la cola de muertos.", e)
+                    TRANSACTIONS.labels("dead_letter").inc()
+                    queue.dead_letter(queue_item)
+                    continue
+                log_sampled(logger, logging.INFO, "Recibida transacción de Redis: %s", transaction.get('original_data', 'N/A'))
 
+                try:
+                    # 1. Verificar firma ECDSA
+                    is_valid = verify_ecdsa_signature(transaction)
+                    # 2. Verificar prueba STARK (si existe)
+                    is_valid = verify_stark_proof(transaction) and is_valid
+                except VerifierUnavailableError as e:
+                    logger.warning("%s. La transacción vuelve a la cola.", e)
+                    TRANSACTIONS.labels("retried").inc()
+                    queue.nack(queue_item)
+                    time.sleep(QUEUE_RETRY_DELAY)
+                    continue
+                # 3. Aplicar lógica de consenso PoPV
+                is_valid = check_popv(transaction) and is_valid
 
                 # --- Proceso de Bloqueo ---
                 if is_valid:
-                    block_data = {
-                        "timestamp": time.time(),
-                        "transactions": [transaction], # Un bloque simple con 1 trans
-                        "previous_hash": blockchain[-1]['hash'] if blockchain else "0",
-                        "validator_id": "PoPV-Validator-001",
-                        "block_number": len(blockchain) + 1
-                    }
-                    block_hash = hashlib.sha256(json.dumps(block_data, sort_keys=True).encode('utf-8')).hexdigest()
-                    block_data['hash'] = block_hash
-                    blockchain.append(block_data)
-                    print(f"Validator: Transacción validada y añadida al bloque #{block_data['block_number']}: {block_hash}")
-                    if r:
-                        r.publish('new_block_channel', json.dumps(block_data)) # Opcional: notificar otros servicios
+                    block_data = seal_block([transaction]) # Un bloque simple con 1 trans
+                    if block_data:
+                        publish_block(block_data)
+                        log_sampled(logger, logging.INFO, "Transacción validada y añadida al bloque #%s: %s",
+                                    block_data['block_number'], block_data['hash'])
                 else:
-                    print(f"Validator: Transacción inválida, descartada: {transaction.get('original_data', 'N/A')}")
+                    TRANSACTIONS.labels("invalid").inc()
+                    log_sampled(logger, logging.INFO, "Transacción inválida, descartada: %s", transaction.get('original_data', 'N/A'))
+                # Solo ahora sale de la lista de transacciones en vuelo
+                queue.ack(queue_item)
         except redis.exceptions.ConnectionError:
             print("Validator: Error de conexión con Redis. Reintentando en 1 segundo...")
             r = None # Marcar como desconectado
             time.sleep(1)
-        except json.JSONDecodeError as e:
-            print(f"Validator: Error al decodificar JSON de Redis: {e}. Descartando mensaje.")
         except Exception as e:
             print(f"Validator: Error inesperado en el procesador de transacciones: {e}")
+            if queue_item:
+                # Se reintenta; tras WORK_QUEUE_MAX_DELIVERIES fallos va a la cola de muertos
+                queue.nack(queue_item)
 
         time.sleep(0.5)
 
+def validate_and_process_transaction_batches(worker_index=0):
+    global r
+    worker_id = default_worker_id(worker_index)
+    queue = None
+    print(f"Validator: Iniciando procesador por lotes ({worker_id}, máx {BATCH_MAX_TRANSACTIONS} tx, espera {BATCH_MAX_WAIT_MS} ms)...")
+    while not stop_event.is_set():
+        if r is None:
+            if not connect_to_redis():
+                time.sleep(1)
+                continue
+
+        batch_items = []
+        try:
+            queue = worker_queue(queue, worker_id)
+            transactions = []
+            for queue_item in queue.pop_batch(BATCH_MAX_TRANSACTIONS, BATCH_MAX_WAIT_MS, poll_interval=BATCH_POLL_INTERVAL):
+                try:
+                    transactions.append(wire.loads_transaction(queue_item))
+                    batch_items.append(queue_item)
+                except wire.WireFormatError as e:
+                    logger.warning("Error al decodificar transacción de Redis: %s. Mensaje enviado a la cola de muertos.", e)
+                    TRANSACTIONS.labels("dead_letter").inc()
+                    queue.dead_letter(queue_item)
+            if not transactions:
+                continue
+            start_trace()
+            logger.debug("Recibido lote de %d transacciones de Redis", len(transactions))
+
+            try:
+                ecdsa_results = verify_ecdsa_signatures(transactions)
+                stark_results = verify_stark_proofs(transactions)
+            except VerifierUnavailableError as e:
+                logger.warning("%s. El lote vuelve a la cola.", e)
+                TRANSACTIONS.labels("retried").inc(len(batch_items))
+                queue.nack(*batch_items)
+                time.sleep(QUEUE_RETRY_DELAY)
+                continue
+            valid_transactions = []
+            for transaction, ecdsa_valid, stark_valid in zip(transactions, ecdsa_results, stark_results):
+                is_valid = ecdsa_valid and stark_valid
+                is_valid = check_popv(transaction) and is_valid
+                if is_valid:
+                    valid_transactions.append(transaction)
+                else:
+                    TRANSACTIONS.labels("invalid").inc()
+                    log_sampled(logger, logging.INFO, "Transacción inválida, descartada: %s", transaction.get('original_data', 'N/A'))
+
+            block_data = seal_block(valid_transactions) if valid_transactions else None
+            if block_data:
+                publish_block(block_data)
+                logger.info("%d transacciones añadidas al bloque #%s: %s", len(block_data['transactions']),
+                            block_data['block_number'], block_data['hash'])
+            queue.ack(*batch_items)
+        except redis.exceptions.ConnectionError:
+            print("Validator: Error de conexión con Redis. Reintentando en 1 segundo...")
+            r = None
+            time.sleep(1)
+        except Exception as e:
+            print(f"Validator: Error inesperado en el procesador por lotes: {e}")
+            if batch_items:
+                queue.nack(*batch_items)
+
+async def verify_ecdsa_signature_async(session, transaction):
+    if not (transaction.get('signed_data') and transaction.get('original_data') and transaction.get('public_key')):
+        log_sampled(logger, logging.INFO, "Datos de firma incompletos o ausentes, asumiendo inválida.")
+        return False
+    start = time.perf_counter()
+    try:
+        async with session.post(
+            f"{ECDSA_SERVICE_URL}/verify",
+            **inject_trace(wire.encode_request({
+                'signed_data': transaction['signed_data'],
+                'original_data': transaction['original_data'],
+                'public_key': transaction['public_key']
+            }))
+        ) as verify_response:
+            verify_response.raise_for_status()
+            ecdsa_valid = wire.decode_body(verify_response.content_type, await verify_response.read()).get('is_valid')
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise VerifierUnavailableError(f"Error al verificar firma ECDSA ({ECDSA_SERVICE_URL}): {e!r}") from e
+    finally:
+        VERIFY_LATENCY.labels(verifier.name, "signature", "async").observe(time.perf_counter() - start)
+    if not ecdsa_valid:
+        log_sampled(logger, logging.INFO, "Firma ECDSA inválida: %s", transaction.get('original_data'))
+        return False
+    return True
+
+async def verify_stark_proof_async(session, transaction):
+    if not transaction.get('stark_proof'):
+        log_sampled(logger, logging.DEBUG, "No hay prueba STARK para verificar.")
+        return True
+    start = time.perf_counter()
+    try:
+        async with session.post(
+            f"{SZS_STARK_SERVICE_URL}/verify_proof",
+            **inject_trace(wire.encode_request({
+                'proof_data': transaction['stark_proof'],
+                'original_data': transaction['original_data'],
+                'signed_tx_data': transaction.get('signed_data')
+            }))
+        ) as verify_stark_response:
+            verify_stark_response.raise_for_status()
+            stark_valid = wire.decode_body(verify_stark_response.content_type, await verify_stark_response.read()).get('is_valid')
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise VerifierUnavailableError(f"Error al verificar prueba STARK ({SZS_STARK_SERVICE_URL}): {e!r}") from e
+    finally:
+        VERIFY_LATENCY.labels(verifier.name, "proof", "async").observe(time.perf_counter() - start)
+    if not stark_valid:
+        log_sampled(logger, logging.INFO, "Prueba STARK inválida: %s", transaction.get('original_data'))
+        return False
+    return True
+
+async def validate_transaction_async(session, transaction):
+    # La firma y la prueba se comprueban a la vez
+    if verifier.name == "http":
+        ecdsa_valid, stark_valid = await asyncio.gather(
+            verify_ecdsa_signature_async(session, transaction),
+            verify_stark_proof_async(session, transaction)
+        )
+    else:
+        # Los backends locales son CPU puro: se ejecutan fuera del bucle de eventos
+        loop = asyncio.get_running_loop()
+        ecdsa_valid, stark_valid = await asyncio.gather(
+            loop.run_in_executor(None, verify_ecdsa_signature, transaction),
+            loop.run_in_executor(None, verify_stark_proof, transaction)
+        )
+    return check_popv(transaction) and ecdsa_valid and stark_valid
+
+async def _queue_call(method, *args):
+    # Mempool usa el cliente síncrono de Redis: sus llamadas van al executor
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+async def _nack_quietly(queue, queue_item):
+    # Devuelve la transacción a la cola; si Redis no responde, sigue en la
+    # lista de transacciones en vuelo y se recupera al reiniciar
+    try:
+        await _queue_call(queue.nack, queue_item)
+    except redis.exceptions.ConnectionError as e:
+        print(f"Validator: No se pudo devolver la transacción a la cola: {e}")
+
+async def _read_pending_transactions(queue, session, in_flight):
+    # Lee de Redis y lanza la validación de cada transacción. La cola in_flight
+    # está acotada: cuando se llena, put() bloquea y se deja de leer de Redis.
+    recovered = False
+    while not stop_event.is_set():
+        queue_item = None
+        try:
+            if not recovered:
+                requeued = await _queue_call(queue.requeue_own_in_flight)
+                if requeued:
+                    print(f"Validator: {requeued} transacciones en vuelo de {queue.worker_id} devueltas a la cola.")
+                recovered = True
+            queue_item = await _queue_call(queue.pop, 1)
+            if not queue_item:
+                continue
+            try:
+                transaction = wire.loads_transaction(queue_item)
+            except wire.WireFormatError as e:
+                logger.warning("Error al decodificar transacción de Redis: %s. Mensaje enviado a la cola de muertos.", e)
+                TRANSACTIONS.labels("dead_letter").inc()
+                await _queue_call(queue.dead_letter, queue_item)
+                continue
+        except redis.exceptions.ConnectionError:
+            print("Validator: Error de conexión con Redis. Reintentando en 1 segundo...")
+            await asyncio.sleep(1)
+            continue
+        except Exception as e:
+            # Un error inesperado no puede parar el lector: sin él el procesador
+            # deja de consumir sin avisar
+            logger.exception("Error inesperado leyendo transacciones de Redis: %s", e)
+            if queue_item:
+                await _nack_quietly(queue, queue_item)
+            await asyncio.sleep(QUEUE_RETRY_DELAY)
+            continue
+        # La tarea copia el contexto al crearse: cada transacción lleva su propia traza
+        start_trace()
+        log_sampled(logger, logging.INFO, "Recibida transacción de Redis: %s", transaction.get('original_data', 'N/A'))
+        task = asyncio.ensure_future(validate_transaction_async(session, transaction))
+        await in_flight.put((queue_item, transaction, task))
+    await in_flight.put(None)
+
+async def _seal_validated_transactions(queue, redis_async, in_flight):
+    # Espera los resultados en el mismo orden en que se leyeron de la cola,
+    # de modo que los bloques se añaden en orden aunque las validaciones
+    # terminen desordenadas.
+    last_backoff = 0.0
+    while True:
+        entry = await in_flight.get()
+        if entry is None:
+            return
+        queue_item, transaction, task = entry
+        try:
+            try:
+                is_valid = await task
+            except Exception as e:
+                # Verificador caído o error inesperado: se reintenta; tras
+                # WORK_QUEUE_MAX_DELIVERIES fallos va a la cola de muertos
+                logger.warning("Error validando transacción: %s. La transacción vuelve a la cola.", e)
+                TRANSACTIONS.labels("retried").inc()
+                await _queue_call(queue.nack, queue_item)
+                # Una pausa por caída, no una por transacción: las que fallaron
+                # durante la pausa se devuelven a la cola sin esperar más
+                if time.monotonic() - last_backoff >= QUEUE_RETRY_DELAY:
+                    await asyncio.sleep(QUEUE_RETRY_DELAY)
+                    last_backoff = time.monotonic()
+                continue
+            if not is_valid:
+                TRANSACTIONS.labels("invalid").inc()
+                log_sampled(logger, logging.INFO, "Transacción inválida, descartada: %s", transaction.get('original_data', 'N/A'))
+                await _queue_call(queue.ack, queue_item)
+                continue
+            # seal_block escribe en disco y espera a block_lock (y, tras un
+            # reinicio, a la puesta al día de índices y saldos): fuera del bucle
+            block_data = await asyncio.get_running_loop().run_in_executor(None, seal_block, [transaction])
+            if block_data:
+                log_sampled(logger, logging.INFO, "Transacción validada y añadida al bloque #%s: %s",
+                            block_data['block_number'], block_data['hash'])
+                try:
+                    await redis_async.publish('new_block_channel', json.dumps(block_data))
+                except redis.exceptions.ConnectionError as e:
+                    print(f"Validator: No se pudo notificar el bloque #{block_data['block_number']}: {e}")
+            await _queue_call(queue.ack, queue_item)
+        except redis.exceptions.ConnectionError as e:
+            # Queda en la lista de transacciones en vuelo; se recupera al reiniciar
+            print(f"Validator: Error de conexión con Redis al confirmar una transacción: {e}")
+        except Exception as e:
+            # Error inesperado al sellar (disco, saldos...): como en los otros
+            # procesadores, la transacción se reintenta y el sellador sigue vivo
+            logger.exception("Error inesperado sellando transacción: %s", e)
+            TRANSACTIONS.labels("retried").inc()
+            await _nack_quietly(queue, queue_item)
+
+async def process_transactions_async(worker_index=0):
+    redis_async = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_connect_timeout=1)
+    queue = Mempool(redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0, socket_connect_timeout=1),
+                    worker_id=default_worker_id(worker_index))
+    connector = aiohttp.TCPConnector(limit_per_host=ASYNC_MAX_CONNECTIONS, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=ASYNC_REQUEST_TIMEOUT)
+    in_flight = asyncio.Queue(maxsize=ASYNC_MAX_IN_FLIGHT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        try:
+            await asyncio.gather(
+                _read_pending_transactions(queue, session, in_flight),
+                _seal_validated_transactions(queue, redis_async, in_flight)
+            )
+        finally:
+            await redis_async.aclose()
+
+def validate_and_process_transactions_async(worker_index=0):
+    print(f"Validator: Iniciando procesador asíncrono ({default_worker_id(worker_index)}, máx {ASYNC_MAX_IN_FLIGHT} en vuelo, {ASYNC_MAX_CONNECTIONS} conexiones por servicio)...")
+    asyncio.run(process_transactions_async(worker_index))
+
+def reclaim_stale_transactions_forever():
+    # Devuelve a la cola lo que tenían en vuelo los consumidores que han dejado
+    # de renovar su heartbeat (un validador caído o un hilo colgado) y pasa al
+    # mempool lo que quede en la lista de pendientes de versiones anteriores
+    reclaimer = None
+    while not stop_event.wait(QUEUE_RECLAIM_INTERVAL):
+        if r is None:
+            continue
+        try:
+            if reclaimer is None or reclaimer.r is not r:
+                reclaimer = Mempool(r, worker_id=default_worker_id("reclaimer"))
+            reclaimed = reclaimer.reclaim_stale()
+            if reclaimed:
+                print(f"Validator: {reclaimed} transacciones de consumidores caídos devueltas a la cola.")
+            imported = reclaimer.import_legacy()
+            if imported:
+                print(f"Validator: {imported} transacciones de la lista de pendientes anterior pasadas al mempool.")
+        except redis.exceptions.ConnectionError as e:
+            print(f"Validator: Error de conexión con Redis al recuperar transacciones en vuelo: {e}")
+
 @app_flask.route('/blockchain_status', methods=['GET'])
 def blockchain_status():
     return jsonify({
         "status": "ok",
         "chain_length": len(blockchain),
-        "last_block": blockchain[-1] if blockchain else "No blocks yet",
+        "last_block": blockchain.tip or "No blocks yet",
         # "all_blocks": blockchain # Descomenta para ver todos los bloques, puede ser largo
     }), 200
 
+def cached_response(version, build_body):
+    # version identifica el contenido de la respuesta: si no cambia, el cliente
+    # recibe un 304 y, si lo hace otro cliente, el cuerpo sale de la caché.
+    # El cuerpo va en JSON o en msgpack según la cabecera Accept (ver wire.py).
+    mimetype = wire.MSGPACK_MIMETYPE if wire.wants_msgpack(request) else wire.JSON_MIMETYPE
+    etag = hashlib.sha1(f"{request.full_path}|{version}|{mimetype}".encode('utf-8')).hexdigest()
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    body = response_cache.get(etag)
+    if body is None:
+        payload = build_body()
+        body = wire.pack(payload) if mimetype == wire.MSGPACK_MIMETYPE else json.dumps(payload)
+        response_cache.put(etag, body)
+    return Response(body, mimetype=mimetype, headers=headers)
+
+def page_arguments():
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = min(int(request.args.get('limit', 20)), QUERY_MAX_PAGE_SIZE)
+    except ValueError:
+        return None, None
+    if cursor < 0 or limit < 1:
+        return None, None
+    return cursor, limit
+
+def index_not_ready():
+    # Mientras el índice se pone al día tras un arranque no se puede responder;
+    # después, ponerlo al día cuesta como mucho unos pocos bloques.
+    if chain_index.sync(blockchain, blocking=chain_index.ready):
+        return None
+    return jsonify({"error": "Chain index is still being built"}), 503, {"Retry-After": "1"}
+
+@app_flask.route('/blocks', methods=['GET'])
+def list_blocks():
+    # Paginación por cursor: el cursor es el número de bloque por el que empezar.
+    # order=desc recorre la cadena desde la punta (cursor=0 significa la punta).
+    cursor, limit = page_arguments()
+    order = request.args.get('order', 'asc')
+    if cursor is None or order not in ('asc', 'desc'):
+        return jsonify({"error": "Invalid cursor, limit or order"}), 400
+
+    height = len(blockchain)
+    if order == 'asc':
+        first = max(cursor, 1)
+        numbers = list(range(first, min(first + limit - 1, height) + 1))
+        next_cursor = numbers[-1] + 1 if numbers and numbers[-1] < height else None
+    else:
+        first = min(cursor or height, height)
+        numbers = list(range(first, max(first - limit, 0), -1))
+        next_cursor = numbers[-1] - 1 if numbers and numbers[-1] > 1 else None
+
+    # Los bloques de la página no cambian, pero el cuerpo lleva chain_length:
+    # la versión incluye la altura actual para que una página antigua no se
+    # sirva (ni valide un ETag) con una altura obsoleta.
+    version = ",".join(blockchain.block_hash(n) for n in (numbers[:1] + numbers[-1:])) + f"|{next_cursor}|{height}"
+    return cached_response(version, lambda: {
+        "blocks": [blockchain.get(n) for n in numbers],
+        "next_cursor": next_cursor,
+        "chain_length": height
+    })
+
+@app_flask.route('/blocks/<int:block_number>', methods=['GET'])
+def get_block(block_number):
+    block_hash = blockchain.block_hash(block_number)
+    if block_hash is None:
+        return jsonify({"error": "Block not found"}), 404
+    return cached_response(block_hash, lambda: blockchain.get(block_number))
+
+@app_flask.route('/blocks/hash/<block_hash>', methods=['GET'])
+def get_block_by_hash(block_hash):
+    block = blockchain.get_by_hash(block_hash)
+    if block is None:
+        return jsonify({"error": "Block not found"}), 404
+    return cached_response(block['hash'], lambda: block)
+
+@app_flask.route('/transactions/<signature>', methods=['GET'])
+def get_transaction(signature):
+    not_ready = index_not_ready()
+    if not_ready:
+        return not_ready
+    location = chain_index.locate(signature)
+    if location is None:
+        return jsonify({"error": "Transaction not found"}), 404
+    block_number, position = location
+    return cached_response(blockchain.block_hash(block_number), lambda: {
+        "block_number": block_number,
+        "block_hash": blockchain.block_hash(block_number),
+        "transaction": blockchain.get(block_number)['transactions'][position]
+    })
+
+@app_flask.route('/transactions', methods=['GET'])
+def list_transactions_by_sender():
+    sender = request.args.get('sender')
+    cursor, limit = page_arguments()
+    if not sender or cursor is None:
+        return jsonify({"error": "Missing sender or invalid cursor/limit"}), 400
+    not_ready = index_not_ready()
+    if not_ready:
+        return not_ready
+
+    # El cursor es la posición dentro de la lista de transacciones del emisor
+    page, total = chain_index.sender_page(sender, cursor, limit)
+    next_cursor = cursor + len(page) if cursor + len(page) < total else None
+    return cached_response(f"{total}", lambda: {
+        "sender": sender,
+        "transactions": [
+            dict(blockchain.get(number)['transactions'][position], block_number=number)
+            for number, position in page
+        ],
+        "next_cursor": next_cursor,
+        "total": total
+    })
+
+@app_flask.route('/chain/stats', methods=['GET'])
+@app_flask.route('/blockchain', methods=['GET'])
+def chain_stats():
+    not_ready = index_not_ready()
+    if not_ready:
+        return not_ready
+    height = chain_index.height
+    return cached_response(f"{height}", lambda: {
+        "status": "ok",
+        "chain_length": height,
+        "transaction_count": chain_index.transaction_count,
+        "sender_count": chain_index.sender_count,
+        "average_transactions_per_block": chain_index.transaction_count / height if height else 0,
+        "first_block_timestamp": chain_index.first_timestamp,
+        "last_block_timestamp": chain_index.last_timestamp,
+        "last_block_hash": blockchain.block_hash(height) if height else None
+    })
+
+@app_flask.route('/balance/<account>', methods=['GET'])
+def get_balance(account):
+    if not account_state.sync(blockchain, blocking=account_state.ready):
+        return jsonify({"error": "Account state is still being rebuilt"}), 503, {"Retry-After": "1"}
+    return wire.respond(request, {
+        "account": account,
+        "balance": account_state.balance(account),
+        "known": account in account_state.balances,
+        "height": account_state.height
+    })
+
 @app_flask.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "service": "PoPV Validator"}), 200
 
 def run_flask_api():
-    app_flask.run(host='0.0.0.0', port=5003, debug=False, use_reloader=False)
+    app_flask.run(host='0.0.0.0', port=SERVICE_PORT, debug=False, use_reloader=False)
 
 if __name__ == '__main__':
-    processor_thread = Thread(target=validate_and_process_transactions)
-    processor_thread.daemon = True
-    processor_thread.start()
+    processors = {
+        "single": validate_and_process_transactions,
+        "batch": validate_and_process_transaction_batches,
+        "async": validate_and_process_transactions_async,
+    }
+    processor = processors.get(VALIDATOR_PROCESSOR, validate_and_process_transactions)
+    processor_threads = [Thread(target=processor, args=(i,), daemon=True) for i in range(VALIDATOR_WORKERS)]
+
+    def start_processors():
+        # Los procesadores arrancan con el índice y los saldos ya al día, para
+        # que la puesta al día tras un arranque no ocurra con block_lock tomado
+        chain_index.sync(blockchain)
+        account_state.sync(blockchain)
+        print(f"Validator: Índice y saldos al día a la altura {len(blockchain)}; arrancan los procesadores.")
+        for processor_thread in processor_threads:
+            processor_thread.start()
+
+    Thread(target=start_processors, daemon=True).start()
+    Thread(target=reclaim_stale_transactions_forever, daemon=True).start()
 
     run_flask_api()
 
@@ -171,5 +778,9 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         print("Validator: Shutting down...")
         stop_event.set()
-        processor_thread.join(timeout=5)
+        for processor_thread in processor_threads:
+            if processor_thread.is_alive():
+                processor_thread.join(timeout=5)
+        chain_index.close()
+        blockchain.close()
         print("Validator: Shutdown complete.")
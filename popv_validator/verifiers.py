@@ -0,0 +1,209 @@
+# popv_validator/verifiers.py
+# Backends de verificación de firmas ECDSA y pruebas STARK para el validador.
+#
+#   http    -> llama a los servicios ecdsa (/verify, /verify_batch) y szsstark (/verify_proof, /verify_proof_batch)
+#   local   -> importa ecdsa_core y szstark_core y verifica dentro del propio proceso
+#   process -> como "local", pero en un pool de procesos para no competir con el GIL
+#
+# Se elige con la variable de entorno VERIFIER_BACKEND.
+#
+# Si un servicio de verificación no responde se lanza VerifierUnavailableError
+# en vez de dar la transacción por inválida: el validador la devuelve a la cola.
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import wire
+from instrumentation import inject_trace, log_sampled
+
+ECDSA_SERVICE_URL = os.getenv("ECDSA_SERVICE_URL")
+SZS_STARK_SERVICE_URL = os.getenv("SZS_STARK_SERVICE_URL")
+VERIFIER_BACKEND = os.getenv("VERIFIER_BACKEND", "http")
+VERIFIER_POOL_WORKERS = int(os.getenv("VERIFIER_POOL_WORKERS", os.cpu_count() or 1))
+
+logger = logging.getLogger("popv_validator.verifiers")
+
+
+class VerifierUnavailableError(Exception):
+    pass
+
+
+def _proof_entry(transaction):
+    return {
+        'proof_data': transaction.get('stark_proof'),
+        'signed_tx_data': transaction.get('signed_data')
+    }
+
+
+def _signature_entry(transaction):
+    return {
+        'signed_data': transaction.get('signed_data'),
+        'original_data': transaction.get('original_data'),
+        'public_key': transaction.get('public_key')
+    }
+
+
+class HttpVerifier:
+    name = "http"
+
+    def __init__(self, ecdsa_url=None, stark_url=None):
+        self.ecdsa_url = ecdsa_url or ECDSA_SERVICE_URL
+        self.stark_url = stark_url or SZS_STARK_SERVICE_URL
+        self.session = requests.Session() # Reutiliza las conexiones con ecdsa y szsstark
+
+    def verify_signature(self, transaction):
+        try:
+            verify_response = self.session.post(f"{self.ecdsa_url}/verify", **inject_trace(wire.encode_request(_signature_entry(transaction))), timeout=2)
+            verify_response.raise_for_status()
+            return bool(wire.decode_response(verify_response).get('is_valid'))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise VerifierUnavailableError(f"Error al verificar firma ECDSA ({self.ecdsa_url}): {e}") from e
+
+    def verify_signatures(self, transactions):
+        # Verifica todas las firmas de un lote con una sola llamada a /verify_batch
+        entries = [_signature_entry(transaction) for transaction in transactions]
+        try:
+            verify_response = self.session.post(f"{self.ecdsa_url}/verify_batch", **inject_trace(wire.encode_request({'entries': entries})), timeout=10)
+            verify_response.raise_for_status()
+            results = wire.decode_response(verify_response).get('results', [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise VerifierUnavailableError(f"Error al verificar lote de firmas ECDSA ({self.ecdsa_url}): {e}") from e
+        if len(results) != len(transactions):
+            raise VerifierUnavailableError("Respuesta de /verify_batch con un número de resultados inesperado.")
+        return [bool(res.get('is_valid')) for res in results]
+
+    def verify_proof(self, transaction):
+        try:
+            verify_stark_response = self.session.post(
+                f"{self.stark_url}/verify_proof",
+                **inject_trace(wire.encode_request({
+                    'proof_data': transaction['stark_proof'],
+                    'original_data': transaction['original_data'],
+                    'signed_tx_data': transaction.get('signed_data')
+                })),
+                timeout=2
+            )
+            verify_stark_response.raise_for_status()
+            return bool(wire.decode_response(verify_stark_response).get('is_valid'))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise VerifierUnavailableError(f"Error al verificar prueba STARK ({self.stark_url}): {e}") from e
+
+    def verify_proofs(self, transactions):
+        # Verifica todas las pruebas de un lote con una sola llamada a /verify_proof_batch
+        entries = [_proof_entry(transaction) for transaction in transactions]
+        try:
+            verify_stark_response = self.session.post(f"{self.stark_url}/verify_proof_batch", **inject_trace(wire.encode_request({'entries': entries})), timeout=10)
+            verify_stark_response.raise_for_status()
+            results = wire.decode_response(verify_stark_response).get('results', [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise VerifierUnavailableError(f"Error al verificar lote de pruebas STARK ({self.stark_url}): {e}") from e
+        if len(results) != len(transactions):
+            raise VerifierUnavailableError("Respuesta de /verify_proof_batch con un número de resultados inesperado.")
+        return [bool(res.get('is_valid')) for res in results]
+
+    def close(self):
+        self.session.close()
+
+
+def _verify_signature_local(entry):
+    import ecdsa_core
+    result = ecdsa_core.verify_entry(entry)
+    if result.get('error'):
+        # Uno por transacción inválida: muestreado, como el resto del camino por transacción
+        log_sampled(logger, logging.WARNING, "Error al verificar firma ECDSA: %s", result['error'])
+    return result['is_valid']
+
+
+def _verify_signatures_local(entries):
+    return [_verify_signature_local(entry) for entry in entries]
+
+
+def _verify_proof_local(proof_data, original_data, signed_tx_data):
+    import szstark_core
+    try:
+        return bool(szstark_core.verify_proof(proof_data, original_data, signed_tx_data))
+    except Exception as e:
+        log_sampled(logger, logging.WARNING, "Error al verificar prueba STARK: %s", e)
+        return False
+
+
+def _verify_proofs_local(entries):
+    import szstark_core
+    return szstark_core.verify_proofs(entries)
+
+
+class LocalVerifier:
+    name = "local"
+
+    def __init__(self):
+        # Falla al arrancar, y no con la primera transacción, si faltan los módulos
+        import ecdsa_core  # noqa: F401
+        import szstark_core  # noqa: F401
+
+    def verify_signature(self, transaction):
+        return _verify_signature_local(_signature_entry(transaction))
+
+    def verify_signatures(self, transactions):
+        return _verify_signatures_local([_signature_entry(transaction) for transaction in transactions])
+
+    def verify_proof(self, transaction):
+        return _verify_proof_local(transaction['stark_proof'], transaction['original_data'], transaction.get('signed_data'))
+
+    def verify_proofs(self, transactions):
+        return _verify_proofs_local([_proof_entry(transaction) for transaction in transactions])
+
+    def close(self):
+        pass
+
+
+class ProcessPoolVerifier(LocalVerifier):
+    name = "process"
+
+    def __init__(self, workers=None):
+        super().__init__()
+        self.workers = workers or VERIFIER_POOL_WORKERS
+        # Con "fork" el pool arranca todos sus procesos en el primer submit; se
+        # fuerza aquí, al importar el validador, antes de que existan los hilos
+        # de puesta al día de índices y saldos, de Flask y del procesador (un
+        # fork con otro hilo dentro de un lock puede bloquear a los hijos).
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        self.pool.submit(int).result()
+
+    def verify_signature(self, transaction):
+        return self.pool.submit(_verify_signature_local, _signature_entry(transaction)).result()
+
+    def verify_signatures(self, transactions):
+        entries = [_signature_entry(transaction) for transaction in transactions]
+        chunk_size = max(1, -(-len(entries) // self.workers))
+        chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+        return [is_valid for results in self.pool.map(_verify_signatures_local, chunks) for is_valid in results]
+
+    def verify_proof(self, transaction):
+        return self.pool.submit(_verify_proof_local, transaction['stark_proof'], transaction['original_data'],
+                                transaction.get('signed_data')).result()
+
+    def verify_proofs(self, transactions):
+        entries = [_proof_entry(transaction) for transaction in transactions]
+        chunk_size = max(1, -(-len(entries) // self.workers))
+        chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+        return [is_valid for results in self.pool.map(_verify_proofs_local, chunks) for is_valid in results]
+
+    def close(self):
+        self.pool.shutdown()
+
+
+VERIFIERS = {
+    "http": HttpVerifier,
+    "local": LocalVerifier,
+    "process": ProcessPoolVerifier,
+}
+
+
+def get_verifier(backend=None):
+    backend = backend or VERIFIER_BACKEND
+    if backend not in VERIFIERS:
+        raise ValueError(f"Unknown verifier backend: {backend} (expected one of {', '.join(VERIFIERS)})")
+    return VERIFIERS[backend]()
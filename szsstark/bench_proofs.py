@@ -0,0 +1,53 @@
+# szsstark/bench_proofs.py
+# Pruebas/s de generación y verificación por tamaño de lote (1 a 10k).
+#
+#   cold: árbol desconocido para el proceso, se recorre el camino de Merkle
+#         reutilizando los nodos internos ya comprobados del lote
+#   warm: árbol generado por este proceso, la verificación compara la hoja
+#
+#   python bench_proofs.py --batch-sizes 1,10,100,1000,10000
+import argparse
+import json
+import os
+import time
+
+import szstark_core
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-sizes', default="1,10,100,1000,10000")
+    parser.add_argument('--min-proofs', type=int, default=20000, help="pruebas mínimas por medida")
+    args = parser.parse_args()
+
+    print(f"{'lote':>6} {'generar/s':>12} {'verificar cold/s':>18} {'verificar warm/s':>18} {'bytes/prueba':>13}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        rounds = max(1, args.min_proofs // batch_size)
+        batches = [[os.urandom(64).hex() for _ in range(batch_size)] for _ in range(rounds)]
+
+        all_proofs, generate_time = timed(lambda: [szstark_core.generate_proofs(b) for b in batches])
+        entries = [
+            [{"proof_data": p, "signed_tx_data": d} for p, d in zip(proofs, batch)]
+            for proofs, batch in zip(all_proofs, batches)
+        ]
+
+        warm, warm_time = timed(lambda: [szstark_core.verify_proofs(e) for e in entries])
+        # Sin la caché de árboles, como un validador que recibe pruebas ajenas
+        szstark_core._trees.clear()
+        cold, cold_time = timed(lambda: [szstark_core.verify_proofs(e) for e in entries])
+        assert all(all(r) for r in warm) and all(all(r) for r in cold)
+
+        total = batch_size * rounds
+        proof_size = len(json.dumps(all_proofs[0][0]))
+        print(f"{batch_size:>6} {total / generate_time:>12.0f} {total / cold_time:>18.0f} "
+              f"{total / warm_time:>18.0f} {proof_size:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# szsstark/szstark_core.py
+# Lógica de generación y verificación de pruebas sin dependencias de Flask,
+# para poder usarla desde el servicio o desde otros servicios.
+#
+# Cada lote de transacciones firmadas se compromete en un árbol de Merkle
+# (SHA-256, con prefijos distintos para hojas y nodos internos). La prueba de
+# cada transacción es la raíz del lote, su posición y el camino de hermanos
+# hasta la raíz: ocupa O(log n) hashes y no incluye los datos de entrada.
+#
+# La raíz y el tamaño del lote van autenticados con un HMAC (root_mac) bajo
+# STARK_PROOF_KEY: sin él cualquiera podría fabricar un árbol propio y
+# presentar una prueba válida.
+# Quien verifique fuera de szsstark (backends "local" y "process" del
+# validador) necesita la misma clave.
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Árboles generados recientemente que se guardan para verificar sus pruebas en O(1)
+TREE_CACHE_SIZE = int(os.getenv("STARK_TREE_CACHE_SIZE", 256))
+# A partir de este tamaño un lote de verificación se reparte entre varios procesos
+VERIFY_POOL_THRESHOLD = int(os.getenv("STARK_VERIFY_POOL_THRESHOLD", 2048))
+VERIFY_POOL_WORKERS = int(os.getenv("STARK_VERIFY_POOL_WORKERS", os.cpu_count() or 1))
+
+# Obligatoria: con una clave distinta en cada arranque, las pruebas que ya
+# esperan en el mempool dejarían de verificar tras reiniciar szsstark
+STARK_PROOF_KEY = os.getenv("STARK_PROOF_KEY", "")
+if not STARK_PROOF_KEY:
+    raise RuntimeError("STARK_PROOF_KEY no está definida: szsstark y el validador necesitan la misma clave")
+_PROOF_KEY = STARK_PROOF_KEY.encode('utf-8')
+
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+_trees = OrderedDict() # raíz (bytes) -> hojas del árbol
+_trees_lock = threading.Lock()
+_pool = None
+
+
+def leaf_hash(signed_tx_data):
+    return hashlib.sha256(_LEAF_PREFIX + signed_tx_data.encode('utf-8')).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def build_tree(leaves):
+    # Devuelve todos los niveles, de las hojas a la raíz. Si un nivel es impar
+    # el último nodo se combina consigo mismo.
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        if len(level) % 2 == 1:
+            level = level + [level[-1]]
+        levels.append([node_hash(level[i], level[i + 1]) for i in range(0, len(level), 2)])
+    return levels
+
+
+def root_mac(root, size):
+    return hmac.new(_PROOF_KEY, root + size.to_bytes(8, 'big'), hashlib.sha256).hexdigest()
+
+
+def tree_depth(size):
+    # Niveles por encima de las hojas en build_tree (longitud de cada camino)
+    return (size - 1).bit_length()
+
+
+def _remember_tree(root, leaves):
+    with _trees_lock:
+        _trees[root] = leaves
+        _trees.move_to_end(root)
+        while len(_trees) > TREE_CACHE_SIZE:
+            _trees.popitem(last=False)
+
+
+def generate_proofs(signed_tx_data):
+    # Un único árbol para todo el lote; una prueba de inclusión por transacción
+    leaves = [leaf_hash(d) for d in signed_tx_data]
+    levels = build_tree(leaves)
+    root = levels[-1][0]
+    _remember_tree(root, leaves)
+    root_hex = root.hex()
+    mac = root_mac(root, len(leaves))
+
+    proofs = []
+    for index in range(len(leaves)):
+        path = []
+        position = index
+        for level in levels[:-1]:
+            sibling = position ^ 1
+            path.append((level[sibling] if sibling < len(level) else level[position]).hex())
+            position //= 2
+        proofs.append({
+            "proof_id": f"STARK-PROOF-{root_hex[:8]}-{index}",
+            "root": root_hex,
+            "index": index,
+            "size": len(leaves),
+            "path": path,
+            "root_mac": mac
+        })
+    return proofs
+
+
+def generate_proof(signed_tx_data):
+    return generate_proofs([signed_tx_data])[0]
+
+
+def _verify_merkle_proof(proof_data, signed_tx_data, known_nodes):
+    # known_nodes: nodos ya comprobados de este árbol, {(nivel, posición): hash}.
+    # Se sube por el camino hasta encontrar un nodo conocido (como mínimo la
+    # raíz) y se comparan; los nodos calculados se añaden a known_nodes, así que
+    # las pruebas de un mismo lote comparten el trabajo de los niveles altos.
+    try:
+        path = [bytes.fromhex(h) for h in proof_data['path']]
+        position = int(proof_data['index'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if position < 0 or position >= 2 ** len(path):
+        return False
+
+    node = leaf_hash(signed_tx_data)
+    computed = []
+    for level, sibling in enumerate(path):
+        known = known_nodes.get((level, position))
+        if known is not None:
+            if known != node:
+                return False
+            break
+        computed.append(((level, position), node))
+        node = node_hash(sibling, node) if position % 2 else node_hash(node, sibling)
+        position //= 2
+    else:
+        if known_nodes.get((len(path), 0)) != node:
+            return False
+    known_nodes.update(computed)
+    return True
+
+
+def _known_nodes_for(root, depth, memo):
+    # Por (raíz, profundidad): la raíz queda en el nivel de la profundidad
+    known_nodes = memo.get((root, depth))
+    if known_nodes is None:
+        known_nodes = {(depth, 0): root}
+        memo[(root, depth)] = known_nodes
+    return known_nodes
+
+
+def _verify_entry(proof_data, signed_tx_data, memo):
+    if not isinstance(proof_data, dict):
+        return False
+    if not signed_tx_data:
+        return False
+    try:
+        root = bytes.fromhex(proof_data['root'])
+        mac = proof_data['root_mac']
+        index = int(proof_data['index'])
+        size = int(proof_data['size'])
+        path = proof_data['path']
+    except (KeyError, TypeError, ValueError):
+        return False
+    if not isinstance(path, list) or not 0 < size < 2 ** 63 or not 0 <= index < size:
+        return False
+    # La raíz se autentica antes de usarla: una raíz no emitida por szsstark no
+    # prueba nada aunque el camino sea coherente con ella
+    if not isinstance(mac, str) or not hmac.compare_digest(mac, root_mac(root, size)):
+        return False
+    # El tamaño autenticado fija la longitud del camino; otra longitud dejaría
+    # la raíz en un nivel equivocado de los nodos compartidos del lote
+    depth = tree_depth(size)
+    if len(path) != depth:
+        return False
+
+    with _trees_lock:
+        leaves = _trees.get(root)
+    if leaves is not None:
+        # Árbol generado por este proceso: basta comparar la hoja
+        return index < len(leaves) and leaves[index] == leaf_hash(signed_tx_data)
+    return _verify_merkle_proof(proof_data, signed_tx_data, _known_nodes_for(root, depth, memo))
+
+
+def verify_proof(proof_data, original_data, signed_tx_data=None):
+    # original_data se mantiene por compatibilidad con la API anterior; la
+    # prueba compromete los datos firmados (signed_tx_data).
+    return _verify_entry(proof_data, signed_tx_data, {})
+
+
+def _verify_chunk(entries):
+    memo = {}
+    return [_verify_entry(e.get('proof_data'), e.get('signed_tx_data'), memo) for e in entries]
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=VERIFY_POOL_WORKERS)
+    return _pool
+
+
+def verify_proofs(entries):
+    # entries: [{"proof_data": ..., "signed_tx_data": ...}] -> [bool]
+    if len(entries) < VERIFY_POOL_THRESHOLD or VERIFY_POOL_WORKERS <= 1:
+        return _verify_chunk(entries)
+
+    # Las entradas del mismo árbol van al mismo proceso para compartir nodos
+    def root_of(i):
+        proof_data = entries[i].get('proof_data')
+        return str(proof_data.get('root', '')) if isinstance(proof_data, dict) else ''
+    order = sorted(range(len(entries)), key=root_of)
+    chunk_size = -(-len(order) // VERIFY_POOL_WORKERS)
+    index_chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+    entry_chunks = [[entries[i] for i in chunk] for chunk in index_chunks]
+
+    results = [False] * len(entries)
+    for indexes, chunk_results in zip(index_chunks, _get_pool().map(_verify_chunk, entry_chunks)):
+        for i, result in zip(indexes, chunk_results):
+            results[i] = result
+    return results
@@ -1,44 +1,88 @@
 # szsstark/szsstark_service.py
 from flask import Flask, request, jsonify
-import hashlib
+import logging
+import os
+import szstark_core
+from instrumentation import Counter, Histogram, SIZE_BUCKETS, log_sampled
+import instrumentation
+import wire
 
 app = Flask(__name__)
+# /metrics, latencia por ruta y X-Trace-Id (ver common/instrumentation.py)
+instrumentation.instrument_app(app, "szsstark")
+logger = instrumentation.configure_logging("szsstark")
+
+PROOFS = Counter("stark_proofs_total", "Pruebas generadas y verificadas por resultado", ("operation", "result"))
+BATCH_SIZE = Histogram("stark_batch_size", "Elementos por petición de lote", ("operation",), buckets=SIZE_BUCKETS)
+
+# Tamaño máximo de lote aceptado por /generate_proof_batch y /verify_proof_batch
+MAX_BATCH_SIZE = int(os.getenv("STARK_MAX_BATCH_SIZE", 10000))
+# Puerto de escucha con `python szstark_service.py`
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 5002))
+
+# Los cuerpos de petición y respuesta pueden ser JSON o msgpack (ver wire.py)
 
 @app.route('/generate_proof', methods=['POST'])
 def generate_proof():
-    signed_tx_data = request.json.get('signed_tx_data')
+    signed_tx_data = (wire.request_payload(request) or {}).get('signed_tx_data')
     if not signed_tx_data:
         return jsonify({"error": "No signed transaction data provided"}), 400
 
-    print(f"SZS-STARK Service: Recibida petición para generar prueba para: '{signed_tx_data}'")
-    # SIMULACIÓN REAL de una prueba STARK
-    proof_hash = hashlib.sha256(signed_tx_data.encode('utf-8') + b"stark_salt").hexdigest()
-    stark_proof = {
-        "proof_id": "STARK-PROOF-" + proof_hash[:8],
-        "message": f"Simulated STARK proof for data: {signed_tx_data}",
-        "valid": True # Siempre válida en esta simulación
-    }
-    print(f"SZS-STARK Service: Prueba generada: {stark_proof}")
-    return jsonify(stark_proof)
+    stark_proof = szstark_core.generate_proof(signed_tx_data)
+    log_sampled(logger, logging.INFO, "Prueba generada para '%s': %s", signed_tx_data, stark_proof['proof_id'])
+    PROOFS.labels("generate", "ok").inc()
+    return wire.respond(request, stark_proof)
+
+@app.route('/generate_proof_batch', methods=['POST'])
+def generate_proof_batch():
+    # Genera las pruebas de una lista de transacciones firmadas en una sola petición
+    signed_tx_data = (wire.request_payload(request) or {}).get('signed_tx_data')
+    if not isinstance(signed_tx_data, list) or not signed_tx_data or not all(isinstance(d, str) and d for d in signed_tx_data):
+        return jsonify({"error": "Expected a non-empty list of signed transaction data"}), 400
+    if len(signed_tx_data) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE})"}), 400
+
+    logger.debug("Recibida petición para generar %d pruebas", len(signed_tx_data))
+    BATCH_SIZE.labels("generate").observe(len(signed_tx_data))
+    PROOFS.labels("generate", "ok").inc(len(signed_tx_data))
+    # Un único árbol de Merkle por lote (ver szstark_core.py)
+    return wire.respond(request, {"proofs": szstark_core.generate_proofs(signed_tx_data)})
 
 @app.route('/verify_proof', methods=['POST'])
 def verify_proof():
-    proof_data = request.json.get('proof_data')
-    original_data = request.json.get('original_data')
+    payload = wire.request_payload(request) or {}
+    proof_data = payload.get('proof_data')
+    original_data = payload.get('original_data')
+    signed_tx_data = payload.get('signed_tx_data')
 
     if not proof_data or not original_data:
         return jsonify({"error": "Missing proof_data or original_data"}), 400
 
-    print(f"SZS-STARK Service: Recibida petición para verificar prueba: {proof_data}")
-    # SIMULACIÓN REAL de la verificación de una prueba STARK
-    # En una implementación real, esto sería un cálculo criptográfico complejo.
-    is_valid = (proof_data.get('valid') == True) # Asumimos la validez de la simulación
-    print(f"SZS-STARK Service: Prueba verificada con resultado: {is_valid}")
-    return jsonify({"is_valid": is_valid})
+    is_valid = szstark_core.verify_proof(proof_data, original_data, signed_tx_data)
+    log_sampled(logger, logging.INFO, "Prueba %s verificada con resultado: %s", proof_data.get('proof_id'), is_valid)
+    PROOFS.labels("verify", "valid" if is_valid else "invalid").inc()
+    return wire.respond(request, {"is_valid": is_valid})
+
+@app.route('/verify_proof_batch', methods=['POST'])
+def verify_proof_batch():
+    # Acepta {"entries": [{"proof_data": ..., "signed_tx_data": ...}, ...]};
+    # devuelve un resultado por entrada.
+    entries = (wire.request_payload(request) or {}).get('entries')
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        return jsonify({"error": "Expected a list of entries"}), 400
+    if len(entries) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE})"}), 400
+
+    results = szstark_core.verify_proofs(entries)
+    logger.debug("Verificado lote de %d pruebas (%d válidas)", len(results), sum(results))
+    BATCH_SIZE.labels("verify").observe(len(results))
+    PROOFS.labels("verify", "valid").inc(sum(results))
+    PROOFS.labels("verify", "invalid").inc(len(results) - sum(results))
+    return wire.respond(request, {"results": [{"is_valid": is_valid} for is_valid in results]})
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "service": "SZS-STARK"}), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002)
+    app.run(host='0.0.0.0', port=SERVICE_PORT)
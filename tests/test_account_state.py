@@ -0,0 +1,126 @@
+# tests/test_account_state.py
+# Pruebas de los saldos (popv_validator/account_state.py) sobre un almacén de
+# bloques en un directorio temporal: validación de bloques candidatos,
+# puesta al día, instantáneas y recuperación desde ellas.
+#   python -m pytest tests
+import hashlib
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'popv_validator'))
+
+import account_state  # noqa: E402
+from account_state import AccountState  # noqa: E402
+from block_store import BlockStore  # noqa: E402
+
+GENESIS = {"Alice": 100, "Bob": 5}
+
+
+def transfer(sender, recipient, amount, fee=0):
+    data = {"sender": sender, "recipient": recipient, "amount": amount, "fee": fee}
+    return dict(data, original_data=json.dumps(data), signed_data=f"{sender}-{recipient}-{amount}")
+
+
+class Chain:
+    def __init__(self, directory, seed=""):
+        self.store = BlockStore(str(directory))
+        self.seed = seed
+
+    def add(self, *transactions):
+        number = len(self.store) + 1
+        self.store.append({"block_number": number, "validator_id": "validator-1",
+                           "hash": hashlib.sha256(f"{self.seed}{number}".encode()).hexdigest(),
+                           "transactions": list(transactions)})
+
+
+@pytest.fixture
+def chain(tmp_path):
+    chain = Chain(tmp_path / "blocks")
+    yield chain
+    chain.store.close()
+
+
+def new_state(tmp_path, **kwargs):
+    return AccountState(str(tmp_path / "state"), genesis=GENESIS, **kwargs)
+
+
+def test_overdraft_is_rejected(tmp_path):
+    state = new_state(tmp_path)
+    ok, overdraft = transfer("Alice", "Bob", 90, fee=5), transfer("Alice", "Carol", 10)
+    accepted, rejected = state.check([ok, overdraft])
+    assert accepted == [ok]
+    assert rejected == [(overdraft, account_state.INSUFFICIENT_FUNDS)]
+    # check() no modifica los saldos
+    assert state.balance("Alice") == 100
+
+
+def test_funds_received_in_the_same_block_can_be_spent(tmp_path):
+    state = new_state(tmp_path)
+    first, second = transfer("Alice", "Carol", 10), transfer("Carol", "Bob", 10)
+    assert state.check([first, second]) == ([first, second], [])
+    assert state.check([second, first]) == ([first], [(second, account_state.INSUFFICIENT_FUNDS)])
+
+
+@pytest.mark.parametrize("transaction, reason", [
+    (transfer("Alice", "Bob", 0.000000001), account_state.INVALID_AMOUNT),  # más decimales de los admitidos
+    (transfer("Alice", "Bob", -1), account_state.INVALID_AMOUNT),
+    ({**transfer("Alice", "Bob", 1), "amount": 50}, account_state.UNSIGNED_FIELDS),  # importe distinto del firmado
+])
+def test_invalid_transfers_are_rejected(tmp_path, transaction, reason):
+    assert new_state(tmp_path).check([transaction]) == ([], [(transaction, reason)])
+
+
+def test_sync_applies_blocks_without_float_drift(tmp_path, chain):
+    for _ in range(10):
+        chain.add(transfer("Alice", "Bob", 0.1, fee=0.01))
+    state = new_state(tmp_path)
+    assert state.sync(chain.store)
+    # Con floats, 10 x 0.1 no da exactamente 1.0
+    assert state.units("Bob") == account_state.to_units(6)
+    assert state.units("Alice") == account_state.to_units(98.9)
+    assert state.units("validator-1") == account_state.to_units(0.1)
+    chain.add(transfer("Bob", "Carol", 6))
+    assert state.sync(chain.store) and state.height == 11
+    assert state.balance("Bob") == 0 and state.balance("Carol") == 6
+
+
+def test_restart_loads_the_latest_snapshot_and_replays_the_rest(tmp_path, chain):
+    state = new_state(tmp_path, snapshot_interval=2)
+    chain.add(transfer("Alice", "Bob", 1))
+    chain.add(transfer("Alice", "Bob", 2))
+    state.sync(chain.store)
+    state.wait_for_snapshot()
+    chain.add(transfer("Bob", "Carol", 4))
+    chain.add(transfer("Alice", "Carol", 8))
+    chain.add(transfer("Carol", "Dave", 3))
+    state.sync(chain.store)
+    state.wait_for_snapshot()
+
+    restarted = new_state(tmp_path, snapshot_interval=2)
+    assert restarted.sync(chain.store)
+    assert restarted.snapshot_height == 4
+    assert restarted.height == 5
+    assert restarted.balances == state.balances
+
+
+def test_snapshot_of_another_chain_is_ignored(tmp_path, chain):
+    state = new_state(tmp_path, snapshot_interval=1)
+    chain.add(transfer("Alice", "Bob", 50))
+    state.sync(chain.store)
+    state.wait_for_snapshot()
+    # Misma altura, otro bloque: la instantánea no es un prefijo de esta cadena
+    other = Chain(tmp_path / "other", seed="other")
+    other.add(transfer("Alice", "Carol", 1))
+    restarted = new_state(tmp_path)
+    assert restarted.sync(other.store)
+    assert restarted.snapshot_height == 0
+    assert (restarted.balance("Alice"), restarted.balance("Bob"), restarted.balance("Carol")) == (99, 5, 1)
+    other.store.close()
+
+
+def test_genesis_rejects_unrepresentable_balances(tmp_path):
+    with pytest.raises(ValueError):
+        AccountState(str(tmp_path / "state"), genesis={"Alice": 0.123456789})
@@ -0,0 +1,81 @@
+# tests/test_block_store.py
+# Pruebas del almacén de bloques (popv_validator/block_store.py) sobre un
+# directorio temporal: reapertura y recuperación tras escrituras a medias.
+#   python -m pytest tests
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'popv_validator'))
+
+from block_store import BlockStore, _INDEX_ENTRY  # noqa: E402
+
+
+def make_block(number):
+    return {"block_number": number, "hash": hashlib.sha256(str(number).encode()).hexdigest(),
+            "transactions": [{"signed_data": f"s{number}"}]}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "blocks")
+
+
+def fill(directory, count, tail_size=2):
+    store = BlockStore(directory, tail_size=tail_size)
+    for number in range(1, count + 1):
+        store.append(make_block(number))
+    return store
+
+
+def test_reopen_keeps_every_block(directory):
+    fill(directory, 5).close()
+    # Cola de 2: los bloques antiguos se leen del disco
+    store = BlockStore(directory, tail_size=2)
+    assert len(store) == 5
+    assert store.tip == make_block(5)
+    assert [b["block_number"] for b in store.iter_range(1, 5)] == [1, 2, 3, 4, 5]
+    assert store.block_hash(3) == make_block(3)["hash"]
+    assert store.get_by_hash(make_block(2)["hash"]) == make_block(2)
+    store.append(make_block(6))
+    assert store.get(6) == make_block(6)
+    store.close()
+
+
+def test_data_without_index_entry_is_discarded(directory):
+    fill(directory, 3).close()
+    # Caída entre la escritura de los datos y la del índice
+    with open(os.path.join(directory, "blocks.dat"), "ab") as f:
+        f.write(b"\x00\x00\x00\x10{\"block_num")
+    store = BlockStore(directory)
+    assert len(store) == 3
+    store.append(make_block(4))
+    store.close()
+    store = BlockStore(directory)
+    assert [b["block_number"] for b in store.iter_range(1, 10)] == [1, 2, 3, 4]
+    store.close()
+
+
+def test_torn_index_entry_is_discarded(directory):
+    fill(directory, 3).close()
+    with open(os.path.join(directory, "blocks.idx"), "ab") as f:
+        f.write(b"\x00" * (_INDEX_ENTRY.size // 2))
+    store = BlockStore(directory)
+    assert len(store) == 3
+    assert os.path.getsize(os.path.join(directory, "blocks.idx")) == 3 * _INDEX_ENTRY.size
+    store.close()
+
+
+def test_index_pointing_past_the_data_is_discarded(directory):
+    fill(directory, 3).close()
+    # Datos del último bloque perdidos (fichero truncado) pero índice intacto
+    data = os.path.join(directory, "blocks.dat")
+    os.truncate(data, os.path.getsize(data) - 5)
+    store = BlockStore(directory)
+    assert len(store) == 2
+    assert store.tip == make_block(2)
+    store.append(make_block(3))
+    assert store.get(3) == make_block(3)
+    store.close()
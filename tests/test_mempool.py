@@ -0,0 +1,155 @@
+# tests/test_mempool.py
+# Pruebas del mempool (common/mempool.py) contra un Redis falso en memoria:
+# fakeredis ejecuta los scripts Lua con lupa.
+#   pip install -r tests/requirements.txt && python -m pytest tests
+import os
+import sys
+
+import pytest
+
+# Fuera de Docker los módulos compartidos están en common/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import mempool  # noqa: E402
+import wire  # noqa: E402
+from mempool import Mempool  # noqa: E402
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis()
+
+
+def make_tx(sender, signature, fee=1.0, nonce=None):
+    return {"sender": sender, "recipient": "bob", "amount": 1.0, "fee": fee, "nonce": nonce,
+            "original_data": signature, "signed_data": signature, "public_key": "pk"}
+
+
+def next_nonce(r, sender):
+    return Mempool(r)._next_nonce_script(args=[mempool.PREFIX, sender])[0]
+
+
+def popped(queue):
+    item = queue.pop(timeout=1)
+    return wire.loads_transaction(item) if item is not None else None
+
+
+def test_auto_nonces_are_consecutive_per_sender(r):
+    txs = [make_tx("alice", "a0"), make_tx("bob", "b0"), make_tx("alice", "a1")]
+    assert Mempool(r).push_transactions(txs) == [mempool.QUEUED] * 3
+    assert [tx["nonce"] for tx in txs] == [0, 0, 1]
+
+
+def test_rejected_transaction_does_not_consume_its_nonce(r):
+    queue = Mempool(r, max_size=1)
+    assert queue.push_transactions([make_tx("alice", "a0", fee=5)]) == [mempool.QUEUED]
+    rejected = make_tx("bob", "b0", fee=1)
+    assert queue.push_transactions([rejected]) == [mempool.FULL]
+    assert rejected["nonce"] is None
+    assert next_nonce(r, "bob") == 0
+
+
+def test_duplicate_in_batch_does_not_leave_a_gap(r):
+    queue = Mempool(r)
+    assert queue.push_transactions([make_tx("alice", "a0")]) == [mempool.QUEUED]
+    # La repetida recibe el nonce 1 en el primer intento y se rechaza; la
+    # siguiente, que había recibido el 2, se reintenta con el 1
+    txs = [make_tx("alice", "a0"), make_tx("alice", "a1")]
+    assert queue.push_transactions(txs) == [mempool.DUPLICATE, mempool.QUEUED]
+    assert txs[1]["nonce"] == 1
+    assert queue.stats()["waiting"] == 1
+
+
+def test_stale_proposed_nonce_is_a_conflict(r):
+    queue = Mempool(r)
+    queue.push_transactions([make_tx("alice", "a0")])
+    stale = wire.dumps_transaction(make_tx("alice", "a1", nonce=0))
+    assert queue.push([stale], proposed=[True]) == [mempool.NONCE_CONFLICT]
+    assert next_nonce(r, "alice") == 1
+
+
+def test_explicit_nonce_advances_auto_assignment(r):
+    queue = Mempool(r)
+    assert queue.push([wire.dumps_transaction(make_tx("alice", "a0", nonce=0))]) == [mempool.QUEUED]
+    tx = make_tx("alice", "a1")
+    assert queue.push_transactions([tx]) == [mempool.QUEUED]
+    assert tx["nonce"] == 1
+
+
+def test_eviction_takes_later_nonces_and_rewinds_the_sender(r):
+    queue = Mempool(r, worker_id="w", max_size=3)
+    queue.push_transactions([make_tx("alice", "a0", fee=1), make_tx("alice", "a1", fee=5), make_tx("bob", "b0", fee=2)])
+    # a0 es la de menor fee: sale con a1, que sin ella no se ejecutaría
+    assert queue.push_transactions([make_tx("carol", "c0", fee=3)]) == [mempool.QUEUED]
+    stats = queue.stats()
+    assert (stats["pending"], stats["waiting"], stats["evicted"]) == (2, 0, 2)
+    # La siguiente de alice ocupa otra vez el nonce 0 y es ejecutable
+    tx = make_tx("alice", "a2", fee=4)
+    assert queue.push_transactions([tx]) == [mempool.QUEUED]
+    assert tx["nonce"] == 0
+    assert popped(queue)["signed_data"] == "a2"
+    # Las expulsadas pueden volver a admitirse
+    assert queue.push_transactions([make_tx("alice", "a0", fee=6)]) == [mempool.QUEUED]
+
+
+def test_no_eviction_of_an_earlier_nonce_of_the_same_sender(r):
+    queue = Mempool(r, max_size=2)
+    queue.push_transactions([make_tx("alice", "a0", fee=1), make_tx("bob", "b0", fee=2)])
+    assert queue.push_transactions([make_tx("alice", "a1", fee=9)]) == [mempool.FULL]
+    assert next_nonce(r, "alice") == 1
+    assert queue.stats()["pending"] == 2
+
+
+def test_requeued_transaction_keeps_its_turn(r):
+    queue = Mempool(r, worker_id="w")
+    queue.push_transactions([make_tx("alice", "a0"), make_tx("alice", "a1"), make_tx("bob", "b0")])
+    first = queue.pop(timeout=1)
+    assert wire.loads_transaction(first)["signed_data"] == "a0"
+    # Al tomar a0 se promueve a1; a0 vuelve con su entrada original, así que a
+    # igual fee sigue por delante de las que llegaron después
+    queue.nack(first)
+    assert [popped(queue)["signed_data"] for _ in range(3)] == ["a0", "a1", "b0"]
+    assert popped(queue) is None
+
+
+def test_requeued_transaction_is_still_a_duplicate(r):
+    queue = Mempool(r, worker_id="w")
+    queue.push_transactions([make_tx("alice", "a0")])
+    queue.nack(queue.pop(timeout=1))
+    assert queue.push_transactions([make_tx("alice", "a0")]) == [mempool.DUPLICATE]
+
+
+def test_bloom_filter_rotation(r, monkeypatch):
+    monkeypatch.setattr(mempool, "MEMPOOL_BLOOM_CAPACITY", 2)
+    queue = Mempool(r)
+    queue.push_transactions([make_tx("alice", "a0"), make_tx("alice", "a1")])
+    assert int(r.get("mempool:bloom:current")) == 1
+    assert int(r.get("mempool:bloom:count")) == 0
+    # La generación anterior se sigue consultando
+    assert queue.push_transactions([make_tx("alice", "a0")]) == [mempool.DUPLICATE]
+    queue.push_transactions([make_tx("bob", "b0"), make_tx("bob", "b1")])
+    # Segunda rotación: la generación 0 se descarta y vuelve a ser la actual
+    assert int(r.get("mempool:bloom:current")) == 0
+    assert not r.exists("mempool:bloom:0")
+    assert queue.push_transactions([make_tx("bob", "b0")]) == [mempool.DUPLICATE]
+
+
+def test_import_legacy_keeps_every_transaction(r):
+    queue = Mempool(r, max_size=2)
+    queue.push_transactions([make_tx("bob", "b0", fee=5)])
+    legacy = [wire.dumps_transaction(tx) for tx in (
+        make_tx("alice", "a0", fee=5),
+        make_tx("bob", "b0", fee=5),
+        make_tx("carol", "c0", fee=1),
+        make_tx("carol", "c1", fee=1),
+    )] + [b"\xc1"]
+    r.lpush(queue.name, *legacy)
+    assert queue.import_legacy() == 1
+    # Mempool lleno: vuelven a la lista en el mismo orden; la repetida y la
+    # ilegible van a muertos
+    assert r.lrange(queue.name, 0, -1) == [legacy[3], legacy[2]]
+    assert sorted(r.lrange(queue.dead_name, 0, -1)) == sorted([legacy[1], legacy[4]])
+    assert queue.import_legacy() == 0
+    assert r.lrange(queue.name, 0, -1) == [legacy[3], legacy[2]]
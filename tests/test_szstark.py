@@ -0,0 +1,64 @@
+# tests/test_szstark.py
+# Pruebas de la verificación por lotes de szsstark/szstark_core.py: una prueba
+# mal formada o manipulada en un lote no puede invalidar las buenas ni hacer
+# pasar otras malas a través de los nodos compartidos del lote.
+#   python -m pytest tests
+import copy
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'szsstark'))
+os.environ.setdefault("STARK_PROOF_KEY", "tests")
+
+import szstark_core  # noqa: E402
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    signed = [f"{i:064x}" for i in range(6)]
+    proofs = szstark_core.generate_proofs(signed)
+    # Sin el árbol en memoria, como en un validador que no generó las pruebas
+    monkeypatch.setattr(szstark_core, "_trees", OrderedDict())
+    return [{"proof_data": proof, "signed_tx_data": data} for proof, data in zip(proofs, signed)]
+
+
+def tampered(entry, **changes):
+    entry = copy.deepcopy(entry)
+    entry["proof_data"].update(changes)
+    return entry
+
+
+def test_valid_batch(batch):
+    assert szstark_core.verify_proofs(batch) == [True] * len(batch)
+
+
+def test_proof_from_another_process_tree_is_verified_by_path(batch):
+    assert szstark_core.verify_proof(batch[3]["proof_data"], None, batch[3]["signed_tx_data"])
+    assert not szstark_core.verify_proof(batch[3]["proof_data"], None, batch[2]["signed_tx_data"])
+
+
+@pytest.mark.parametrize("bad", [
+    lambda e: tampered(e, path=["00" * 32] + e["proof_data"]["path"][1:]),  # hermano cambiado
+    lambda e: tampered(e, path=e["proof_data"]["path"][:-1]),  # camino más corto que el árbol
+    lambda e: tampered(e, path=e["proof_data"]["path"] + ["00" * 32]),  # camino más largo
+    lambda e: tampered(e, size=e["proof_data"]["size"] + 1),  # tamaño distinto del autenticado
+    lambda e: tampered(e, root_mac="00" * 32),  # raíz no emitida por szsstark
+    lambda e: tampered(e, path="not-a-list"),
+    lambda e: tampered(e, index=-1),
+    lambda e: {"proof_data": "not-a-dict", "signed_tx_data": e["signed_tx_data"]},
+    lambda e: {"proof_data": e["proof_data"], "signed_tx_data": "ff" * 32},
+])
+def test_malformed_proof_first_in_a_valid_batch(batch, bad):
+    # La mala va la primera: es la que llega antes a los nodos compartidos
+    entries = [bad(batch[0])] + batch
+    assert szstark_core.verify_proofs(entries) == [False] + [True] * len(batch)
+
+
+def test_tampered_proof_cannot_ride_on_verified_nodes(batch):
+    # Tras verificar las buenas, los nodos del árbol están en la memo del lote;
+    # una hoja ajena con el camino de otra sigue sin verificar
+    forged = {"proof_data": batch[1]["proof_data"], "signed_tx_data": "ee" * 32}
+    assert szstark_core.verify_proofs(batch + [forged]) == [True] * len(batch) + [False]
@@ -0,0 +1,84 @@
+# tests/test_wire.py
+# Pruebas del formato binario de common/wire.py: ida y vuelta de
+# transacciones (con y sin prueba STARK) y rechazo de datos corruptos.
+#   python -m pytest tests
+import json
+import os
+import sys
+
+import msgpack
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import wire  # noqa: E402
+
+
+def make_transaction(**changes):
+    transaction = {
+        "sender": "Alice", "recipient": "Bob", "amount": 10.5, "nonce": 3, "fee": 0.25,
+        "original_data": json.dumps({"sender": "Alice", "recipient": "Bob", "amount": 10.5, "fee": 0.25}),
+        "signed_data": "ab" * 64,
+        "public_key": "cd" * 64,
+        "stark_proof": {
+            "proof_id": "STARK-PROOF-0123abcd-1", "root": "ef" * 32, "index": 1, "size": 3,
+            "path": ["01" * 32, "02" * 32], "root_mac": "03" * 32
+        },
+    }
+    transaction.update(changes)
+    return transaction
+
+
+@pytest.mark.parametrize("transaction", [
+    make_transaction(),
+    # Campos desconocidos, en la transacción y en la prueba, se conservan
+    make_transaction(priority="high", stark_proof={**make_transaction()["stark_proof"], "valid": True, "extra": [1]}),
+    # Hex no canónico (mayúsculas) y firmas que no son hex se guardan como texto
+    make_transaction(signed_data="AB" * 64, public_key="not-hex"),
+    # Sin prueba, sin nonce: los campos ausentes no aparecen al decodificar
+    {k: v for k, v in make_transaction().items() if k not in ("stark_proof", "nonce")},
+    make_transaction(stark_proof="legacy-proof-string"),
+])
+def test_transaction_round_trip(transaction):
+    encoded = wire.encode_transaction(transaction)
+    assert wire.decode_transaction(encoded) == transaction
+    assert wire.loads_transaction(wire.dumps_transaction(transaction, "msgpack")) == transaction
+    assert wire.loads_transaction(wire.dumps_transaction(transaction, "json")) == transaction
+
+
+def test_binary_encoding_is_smaller_than_json():
+    transaction = make_transaction()
+    assert len(wire.encode_transaction(transaction)) < len(json.dumps(transaction))
+
+
+def test_digest_does_not_depend_on_extra_field_order():
+    first = make_transaction(a=1, b={"x": 1, "y": 2})
+    second = dict(reversed(list(make_transaction(b={"y": 2, "x": 1}, a=1).items())))
+    assert wire.transaction_digest(first) == wire.transaction_digest(second)
+
+
+def test_version_1_transactions_still_decode():
+    packed = msgpack.packb([1, "Alice", "Bob", 1.0, "{}", bytes.fromhex("ab" * 4), None, None, None],
+                           use_bin_type=True)
+    assert wire.decode_transaction(packed) == {"sender": "Alice", "recipient": "Bob", "amount": 1.0,
+                                               "original_data": "{}", "signed_data": "ab" * 4}
+
+
+@pytest.mark.parametrize("data", [
+    b"\xc1",  # byte reservado de msgpack
+    msgpack.packb({"sender": "Alice"}),
+    msgpack.packb([99, "Alice"]),  # versión de esquema desconocida
+    msgpack.packb([wire.TRANSACTION_SCHEMA_VERSION, "Alice"]),  # faltan campos
+    wire.encode_transaction(make_transaction())[:-4],  # truncada
+])
+def test_corrupt_transaction_is_a_wire_format_error(data):
+    with pytest.raises(wire.WireFormatError):
+        wire.loads_transaction(data)
+
+
+def test_block_digest_commits_the_header():
+    block = {"block_number": 7, "timestamp": 1700000000.5, "previous_hash": "aa" * 32,
+             "validator_id": "validator-1", "merkle_root": "bb" * 32}
+    digest = wire.block_digest(block)
+    assert digest == wire.block_digest(dict(block))
+    assert digest != wire.block_digest({**block, "merkle_root": "cc" * 32})